@@ -2,36 +2,113 @@
 from fastapi import HTTPException, Header, Depends
 from typing import Optional
 import os
-from app.key_management import check_and_create_secret_key
+from app.key_management import get_keyring
+from app.user_cache import get_user_by_id, get_user_by_username
+from app.models import CurrentUser
+from app.config import ACCESS_TOKEN_TTL, TOKEN_CACHE_SIZE
+from app.instrumentation import timed
+from app.metrics import cache_counters
+from cachetools import TLRUCache
+import hashlib
+import threading
+import time
 import jwt
 import datetime
 
-# Secret key for JWT encoding/decoding
-SECRET_KEY = check_and_create_secret_key()
+# Signing keys are resolved on first use (get_keyring); tokens name theirs in the kid header
 ALGORITHM = "HS256"
 
+# Verified token payloads keyed by token digest. Each entry expires with the
+# token's own exp claim, so a cached token is never accepted past its expiry.
+_token_cache = TLRUCache(maxsize=TOKEN_CACHE_SIZE, ttu=lambda key, payload, now: payload["exp"], timer=time.time)
+_token_cache_lock = threading.Lock()
+_token_cache_stats = {"hits": 0, "misses": 0}
+_token_cache_hits, _token_cache_misses = cache_counters("token")
+# The keyring the cached payloads were verified with; a retired key's tokens must be verified again
+_token_cache_keyring = None
+
 # Generate JWT token
 def create_access_token(data: dict):
-    expiration = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+    expiration = datetime.datetime.utcnow() + datetime.timedelta(seconds=ACCESS_TOKEN_TTL)
     to_encode = data.copy()
     to_encode.update({"exp": expiration})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    kid, secret = get_keyring().signing_key()
+    encoded_jwt = jwt.encode(to_encode, secret, algorithm=ALGORITHM, headers={"kid": kid})
     return encoded_jwt
 
+# Verify a JWT token, using the verified-token cache
+def decode_access_token(token: str) -> dict:
+    """
+    Return the payload of a valid token, verifying the signature only on a cache miss.
+    Raises jwt.PyJWTError if the token is invalid or expired.
+    """
+    global _token_cache_keyring
+    key = hashlib.sha256(token.encode()).digest()
+    keyring = get_keyring()
+
+    with _token_cache_lock:
+        if keyring is not _token_cache_keyring:
+            _token_cache.clear()
+            _token_cache_keyring = keyring
+        payload = _token_cache.get(key)
+        if payload is not None:
+            _token_cache_stats["hits"] += 1
+            _token_cache_hits.inc()
+            return payload
+        _token_cache_stats["misses"] += 1
+        _token_cache_misses.inc()
+
+    secret = keyring.verification_key(jwt.get_unverified_header(token).get("kid"))
+    if secret is None:
+        raise jwt.InvalidTokenError("Unknown signing key")
+    payload = jwt.decode(token, secret, algorithms=[ALGORITHM])
+    if "exp" in payload:
+        with _token_cache_lock:
+            _token_cache[key] = payload
+    return payload
+
+# Verified-token cache statistics
+def get_token_cache_stats() -> dict:
+    with _token_cache_lock:
+        stats = dict(_token_cache_stats)
+        stats["size"] = len(_token_cache)
+    return stats
+
 # Validate and extract user from JWT token
-def get_current_user(authorization: Optional[str] = Header(None)) -> str:
+def get_current_user(authorization: Optional[str] = Header(None)) -> CurrentUser:
     """
     Extract the current user from JWT token in the Authorization header.
+    The user record is served from the user cache, so a warm request does not
+    touch storage.
     """
+    with timed("auth"):
+        return _authenticate(authorization)
+
+def _authenticate(authorization: Optional[str]) -> CurrentUser:
     if not authorization:
         raise HTTPException(status_code=403, detail="Authorization header missing")
 
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token or " " in token:
+        raise HTTPException(status_code=403, detail="Invalid authorization header")
+
     try:
-        token = authorization.split(" ")[1]  # Remove "Bearer "
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        if username is None:
-            raise HTTPException(status_code=404, detail="User not found")
-        return username  # Return the username, not the email
+        payload = decode_access_token(token)
     except jwt.PyJWTError:
         raise HTTPException(status_code=403, detail="Invalid token")
+
+    username = payload.get("sub")
+    user_id = payload.get("uid")
+    if username is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    # Tokens issued before the user ID was embedded only carry the username
+    if user_id is not None:
+        user = get_user_by_id(user_id)
+    else:
+        user = get_user_by_username(username)
+
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    return CurrentUser(id=user["id"], username=user["username"])
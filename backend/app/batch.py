@@ -0,0 +1,129 @@
+#app/batch.py
+from app.database import get_storage
+from app.layout import mirror_writes, owned_repository
+from app.versions import bump_version
+from pydantic import BaseModel, ValidationError
+from typing import List, Optional, Tuple, Type
+import time
+import uuid
+
+# Apply a batch of create/update/delete operations to one collection
+def run_batch(collection: str, model: Type[BaseModel], updatable_fields: set, operations: List, user_id: str,
+              on_changes=None, references: Optional[Tuple[str, str]] = None) -> List[dict]:
+    """
+    Validate and apply a list of operations for the authenticated user.
+    Ownership of every referenced document is checked with a single multi-document
+    read, and all accepted writes are committed in a single transaction.
+    :param collection: The collection ("items" or "submissions").
+    :param model: The Pydantic model that new and updated documents must satisfy.
+    :param updatable_fields: The fields an update may change.
+    :param operations: The BatchOperation list from the request.
+    :param user_id: The ID of the authenticated user.
+    :param on_changes: Optional callback(transaction, changes) run in the same transaction before
+                       the writes, with a (document before, document after) pair per accepted
+                       operation (None before a create and after a delete).
+    :param references: Optional (field, collection) pair: a created document's field must name a
+                       document of the user in that collection (read in the same transaction),
+                       otherwise the create fails with 404.
+    :return: One result per operation, in request order.
+    """
+    repository = owned_repository(collection, user_id)
+
+    # One round trip for every document that is updated or deleted
+    referenced_ids = {operation.id for operation in operations if operation.op != "create" and operation.id}
+
+    # And one for the documents the created ones refer to
+    if references is not None:
+        reference_field, reference_collection = references
+        reference_repository = owned_repository(reference_collection, user_id)
+        reference_ids = {
+            operation.data[reference_field] for operation in operations
+            if operation.op == "create" and isinstance((operation.data or {}).get(reference_field), str)
+        }
+
+    def apply(transaction) -> List[dict]:
+        existing = transaction.get_many(repository, referenced_ids) if referenced_ids else {}
+        owned_references = set()
+        if references is not None and reference_ids:
+            owned_references = {
+                document_id for document_id, document in transaction.get_many(reference_repository, reference_ids).items()
+                if document["user_id"] == user_id
+            }
+        writes = []
+        changes = []
+        results = []
+
+        for operation in operations:
+            if operation.op == "create":
+                try:
+                    document = model(**(operation.data or {})).model_dump()
+                except ValidationError as e:
+                    results.append({"id": None, "status": 400, "detail": e.errors(include_url=False, include_context=False)})
+                    continue
+                if references is not None and document[reference_field] not in owned_references:
+                    results.append({"id": None, "status": 404, "detail": f"{reference_field} not found"})
+                    continue
+
+                document_id = str(uuid.uuid4())
+                document["user_id"] = user_id
+                document["id"] = document_id
+                document["created_at"] = time.time()
+                writes.append((transaction.set, document_id, document))
+                changes.append((None, document))
+                results.append({"id": document_id, "status": 201})
+                continue
+
+            if not operation.id:
+                results.append({"id": None, "status": 400, "detail": "Missing id"})
+                continue
+
+            document = existing.get(operation.id)
+            if document is None:
+                results.append({"id": operation.id, "status": 404, "detail": "Not found"})
+                continue
+
+            # Ensure the document belongs to the user
+            if document["user_id"] != user_id:
+                results.append({"id": operation.id, "status": 403, "detail": "Unauthorized"})
+                continue
+
+            if operation.op == "update":
+                update_data = {k: v for k, v in (operation.data or {}).items() if k in updatable_fields}
+                if not update_data:
+                    results.append({"id": operation.id, "status": 400, "detail": "No updatable fields"})
+                    continue
+                try:
+                    validated = model(**{**document, **update_data}).model_dump()
+                except ValidationError as e:
+                    results.append({"id": operation.id, "status": 400, "detail": e.errors(include_url=False, include_context=False)})
+                    continue
+                update_data = {k: validated[k] for k in update_data}
+
+                writes.append((transaction.update, operation.id, update_data))
+                updated = {**document, **update_data}
+                changes.append((document, updated))
+                existing[operation.id] = updated
+            else:
+                writes.append((transaction.delete, operation.id, None))
+                changes.append((document, None))
+                # Later operations in this batch see the document as gone
+                del existing[operation.id]
+
+            results.append({"id": operation.id, "status": 200})
+
+        if writes and on_changes is not None:
+            on_changes(transaction, changes)
+        for write, document_id, data in writes:
+            if data is None:
+                write(repository, document_id)
+            else:
+                write(repository, document_id, data)
+
+        return results
+
+    results = get_storage().run_transaction(apply)
+    written = [result["id"] for result in results if result["status"] in (200, 201)]
+    if written:
+        mirror_writes(collection, user_id, written)
+        bump_version(user_id, collection)
+    return results
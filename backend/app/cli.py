@@ -0,0 +1,115 @@
+#app/cli.py
+"""
+Maintenance commands.
+
+Usage (from backend/):
+    python -m app.cli sweep-orphans [--dry-run]
+    python -m app.cli resume-jobs
+    python -m app.cli job-status <job_id>
+    python -m app.cli rebuild-ratings
+    python -m app.cli rotate-signing-key [--keep N]
+    python -m app.cli backfill-usernames
+    python -m app.cli migrate-layout [--rate N] [--restart]
+    python -m app.cli verify-layout
+"""
+import argparse
+import json
+import logging
+
+
+def sweep_orphans_command(args):
+    from app.jobs import sweep_orphans
+    found = sweep_orphans(dry_run=args.dry_run)
+    print(json.dumps(found))
+
+
+def resume_jobs_command(args):
+    from app.jobs import resume_unfinished_jobs
+    resumed = resume_unfinished_jobs()
+    print(f"Resumed {resumed} job(s)")
+
+
+def job_status_command(args):
+    from app.jobs import get_job
+    job = get_job(args.job_id)
+    if job is None:
+        raise SystemExit(f"Job {args.job_id} not found")
+    print(json.dumps(job, default=str, indent=2))
+
+
+def rebuild_ratings_command(args):
+    from app.ratings import rebuild_ratings
+    count = rebuild_ratings()
+    print(f"Rebuilt ratings for {count} item(s)")
+
+
+def rotate_signing_key_command(args):
+    from app.config import SIGNING_KEYS_FILE
+    from app.key_management import rotate_signing_key
+    if SIGNING_KEYS_FILE is None:
+        raise SystemExit("Set SIGNING_KEYS_FILE to the keys file shared by the workers")
+    kid = rotate_signing_key(SIGNING_KEYS_FILE, keep=args.keep)
+    print(f"Signing new tokens with key {kid}")
+
+
+def backfill_usernames_command(args):
+    from app.usernames import backfill_username_index
+    print(json.dumps(backfill_username_index()))
+
+
+def migrate_layout_command(args):
+    from app.migration import migrate_layout
+    job = migrate_layout(rate=args.rate, restart=args.restart)
+    print(json.dumps(job, default=str, indent=2))
+    verify_layout_command(args)
+
+
+def verify_layout_command(args):
+    from app.migration import verify_layout
+    result = verify_layout()
+    print(json.dumps(result, indent=2))
+    if result["mismatches"]:
+        raise SystemExit(1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Maintenance commands.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    sweep = subparsers.add_parser("sweep-orphans", help="Delete items and submissions whose owner no longer exists")
+    sweep.add_argument("--dry-run", action="store_true", help="Only count orphans")
+    sweep.set_defaults(func=sweep_orphans_command)
+
+    resume = subparsers.add_parser("resume-jobs", help="Finish interrupted or failed background jobs")
+    resume.set_defaults(func=resume_jobs_command)
+
+    status = subparsers.add_parser("job-status", help="Show the progress of a background job")
+    status.add_argument("job_id")
+    status.set_defaults(func=job_status_command)
+
+    ratings = subparsers.add_parser("rebuild-ratings", help="Recompute every item's rating aggregate from the submissions")
+    ratings.set_defaults(func=rebuild_ratings_command)
+
+    rotate = subparsers.add_parser("rotate-signing-key", help="Sign new tokens with a new key, keeping older keys for verification")
+    rotate.add_argument("--keep", type=int, default=2, help="Keys to keep, including the new one")
+    rotate.set_defaults(func=rotate_signing_key_command)
+
+    usernames = subparsers.add_parser("backfill-usernames", help="Index the usernames of users created before the username index")
+    usernames.set_defaults(func=backfill_usernames_command)
+
+    from app.config import MIGRATION_RATE
+    migrate = subparsers.add_parser("migrate-layout", help="Copy items and submissions to per-user collections (run with DATA_LAYOUT=dual)")
+    migrate.add_argument("--rate", type=float, default=MIGRATION_RATE, help="Documents copied per second (0 for no limit)")
+    migrate.add_argument("--restart", action="store_true", help="Start over instead of resuming")
+    migrate.set_defaults(func=migrate_layout_command)
+
+    verify = subparsers.add_parser("verify-layout", help="Compare each user's document counts in the flat and nested layouts")
+    verify.set_defaults(func=verify_layout_command)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
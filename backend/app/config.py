@@ -0,0 +1,90 @@
+#app/config.py
+import functools
+import os
+from dotenv import load_dotenv
+
+
+# Load environment variables from the .env file, once per process. Variables
+# already set in the environment win over the file.
+@functools.lru_cache(maxsize=None)
+def load_environment() -> bool:
+    return load_dotenv()
+
+# The settings below are plain environment reads, so .env must be loaded first
+load_environment()
+
+# JWT signing keys shared by every worker, with key IDs for rotation (see rotate-signing-key).
+# Unset, SECRET_KEY is the only key, generated into .env on first use if missing.
+SIGNING_KEYS_FILE = os.getenv("SIGNING_KEYS_FILE")
+
+# Lifetimes of access tokens, and of refresh tokens since their last use (POST /tokens/refresh)
+ACCESS_TOKEN_TTL = int(os.getenv("ACCESS_TOKEN_TTL", "3600"))  # seconds
+REFRESH_TOKEN_TTL = int(os.getenv("REFRESH_TOKEN_TTL", str(30 * 24 * 3600)))  # seconds
+
+# User record cache (per process, bounded and time-limited)
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "300"))  # seconds
+
+# Look for a username missing from the username index with a query on the users, and index it.
+# Needed until backfill-usernames has run; "0" saves the query for names nobody holds
+USERNAME_QUERY_FALLBACK = os.getenv("USERNAME_QUERY_FALLBACK", "1") != "0"
+
+# Worker threads for blocking Firestore calls made from request handlers
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "64"))
+
+# Password hashing pool: worker threads, and how many hashes may wait for one
+HASH_POOL_SIZE = int(os.getenv("HASH_POOL_SIZE", str(os.cpu_count() or 2)))
+HASH_QUEUE_SIZE = int(os.getenv("HASH_QUEUE_SIZE", "32"))
+
+# Verified JWT cache (per process); entries never outlive the token's exp claim
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
+
+# Storage backend: "firestore" (default), "sqlite" or "memory"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "firestore")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "app.db")
+
+# Where items and submissions live: "flat" (top-level collections, the default), "nested"
+# (users/{id}/items and users/{id}/submissions) or "dual" (flat, copying every write to
+# nested while migrating; see migrate-layout)
+DATA_LAYOUT = os.getenv("DATA_LAYOUT", "flat")
+# Documents per second copied by migrate-layout
+MIGRATION_RATE = float(os.getenv("MIGRATION_RATE", "500"))
+
+# Documents each item's rating aggregate is split over, so concurrent ratings of one item rarely
+# write the same document; run rebuild-ratings after changing it
+RATING_SHARDS = int(os.getenv("RATING_SHARDS", "16"))
+
+# Per-request timings (Server-Timing header and app.timing log lines); "0" disables
+INSTRUMENTATION = os.getenv("INSTRUMENTATION", "1") != "0"
+
+# Prometheus metrics at /metrics (set PROMETHEUS_MULTIPROC_DIR when running several workers); "0" disables
+METRICS = os.getenv("METRICS", "1") != "0"
+# With several uvicorn/gunicorn workers, an empty directory shared by the workers: each process
+# writes its samples to its own memory-mapped files there, and /metrics sums them
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# Current weather: "file" (a local JSON file, the default) or "openweathermap"
+WEATHER_PROVIDER = os.getenv("WEATHER_PROVIDER", "file")
+WEATHER_FILE = os.getenv("WEATHER_FILE", "weather.json")
+OPENWEATHERMAP_API_KEY = os.getenv("OPENWEATHERMAP_API_KEY")
+# Cached weather per (city, country), shared by all users of the process
+WEATHER_CACHE_SIZE = int(os.getenv("WEATHER_CACHE_SIZE", "4096"))
+WEATHER_CACHE_TTL = int(os.getenv("WEATHER_CACHE_TTL", "600"))  # seconds
+
+# Users whose encoded submission history is kept for recommendations (per process; reloaded
+# whenever their items or submissions change)
+RECOMMENDATION_CACHE_SIZE = int(os.getenv("RECOMMENDATION_CACHE_SIZE", "256"))
+
+# Cached list responses (GET /items/ and GET /submissions/): "memory" (per process, the default),
+# "sqlite" (a file shared by the workers on one host), "redis" (shared by every host) or "none"
+LIST_CACHE_BACKEND = os.getenv("LIST_CACHE_BACKEND", "memory")
+LIST_CACHE_MAX_BYTES = int(os.getenv("LIST_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+LIST_CACHE_PATH = os.getenv("LIST_CACHE_PATH", "list_cache.db")
+LIST_CACHE_REDIS_URL = os.getenv("LIST_CACHE_REDIS_URL", "redis://localhost:6379/0")
+LIST_CACHE_TTL = int(os.getenv("LIST_CACHE_TTL", "3600"))  # seconds, for the shared backends
+
+# Idempotency-Key records of POST /items/ and POST /submissions/: "storage" (the storage backend,
+# shared by every worker; the default) or "memory" (per process, e.g. for tests)
+IDEMPOTENCY_BACKEND = os.getenv("IDEMPOTENCY_BACKEND", "storage")
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", str(24 * 3600)))  # seconds a result is replayed
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))  # records kept by "memory"
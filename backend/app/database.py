@@ -1,5 +1,71 @@
 #app/database.py
-from google.cloud import firestore
+from app.config import STORAGE_BACKEND, SQLITE_PATH, INSTRUMENTATION
+from app.instrumentation import InstrumentedStorage
+from app.storage.base import Storage
+from typing import Optional
+import logging
+import os
+import threading
 
-# Initialize Firestore client
-db = firestore.Client()
+logger = logging.getLogger(__name__)
+
+_storage: Optional[Storage] = None
+_storage_pid: Optional[int] = None
+_lock = threading.Lock()
+
+
+# Create a storage backend by name
+def create_storage(backend: str = STORAGE_BACKEND) -> Storage:
+    """
+    Create the storage backend selected by configuration.
+    :param backend: "firestore", "sqlite" or "memory".
+    :return: A Storage instance.
+    """
+    if backend == "firestore":
+        from app.storage.firestore import FirestoreStorage
+        return FirestoreStorage()
+    if backend == "sqlite":
+        from app.storage.sqlite import SQLiteStorage
+        return SQLiteStorage(SQLITE_PATH)
+    if backend == "memory":
+        from app.storage.memory import MemoryStorage
+        return MemoryStorage()
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend!r}")
+
+# Record per-request storage timings unless instrumentation is disabled
+def _instrument(storage: Optional[Storage]) -> Optional[Storage]:
+    if storage is None or not INSTRUMENTATION or isinstance(storage, InstrumentedStorage):
+        return storage
+    return InstrumentedStorage(storage)
+
+# Get the process-wide storage, creating it on first use
+def get_storage() -> Storage:
+    """
+    Each worker process owns its storage client and connection pool: a storage created
+    before a fork (e.g. gunicorn --preload) is not shared with the children, which create their own.
+    """
+    global _storage, _storage_pid
+    if _storage is None or _storage_pid != os.getpid():
+        with _lock:
+            if _storage is None or _storage_pid != os.getpid():
+                _storage = _instrument(create_storage())
+                _storage_pid = os.getpid()
+    return _storage
+
+# Replace the process-wide storage (tests and benchmarks)
+def set_storage(storage: Optional[Storage]):
+    global _storage, _storage_pid
+    with _lock:
+        _storage = _instrument(storage)
+        _storage_pid = os.getpid()
+
+# Create the storage and open its connections, e.g. while the app starts
+def warm_storage():
+    """
+    Create the process-wide storage and warm it up, so the first request does not pay for it.
+    A failure is logged rather than raised: requests retry the connection as usual.
+    """
+    try:
+        get_storage().warm()
+    except Exception:
+        logger.warning("Could not warm up the %s storage backend", STORAGE_BACKEND, exc_info=True)
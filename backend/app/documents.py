@@ -0,0 +1,142 @@
+#app/documents.py
+from fastapi import HTTPException
+from app.storage.base import DocumentNotFound, PreconditionFailed, Repository
+from typing import Callable, List, Optional, Tuple
+
+# The most documents a single multi-get may ask for
+MAX_MULTI_GET_IDS = 100
+
+PRECONDITION_FAILED = "The document has changed since it was read"
+
+
+# Parse a comma-separated ids parameter
+def parse_ids(ids: str) -> List[str]:
+    """
+    Turn an `ids=a,b,c` query parameter into a list of distinct IDs, in request order.
+    :param ids: The raw parameter.
+    :return: The list of IDs.
+    """
+    requested = list(dict.fromkeys(doc_id.strip() for doc_id in ids.split(",") if doc_id.strip()))
+    if not requested:
+        raise HTTPException(status_code=400, detail="No ids given")
+    if len(requested) > MAX_MULTI_GET_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_MULTI_GET_IDS} ids may be requested at once")
+    return requested
+
+# ETag of a single document, from its version
+def document_etag(version: str) -> str:
+    return f'"{version}"'
+
+# Parse an If-Match header into the versions it allows
+def parse_if_match(if_match: Optional[str]) -> Optional[List[str]]:
+    """
+    :param if_match: The header value: ETags from document responses, or "*".
+    :return: The allowed versions, or None if any version will do (no header, or "*").
+        Weak tags never match, as If-Match uses strong comparison.
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    tags = [tag.strip() for tag in if_match.split(",")]
+    return [tag[1:-1] for tag in tags if len(tag) >= 2 and tag.startswith('"') and tag.endswith('"')]
+
+# Get a document owned by the user
+def get_owned(repository: Repository, doc_id: str, user_id: str, not_found: str) -> Tuple[dict, str]:
+    """
+    Read a document by ID and check its owner, in a single read. In the nested layout the
+    repository is the user's own collection, so another user's document is not found at all.
+    :param repository: The repository holding the document.
+    :param doc_id: The document ID.
+    :param user_id: The ID of the authenticated user.
+    :param not_found: The 404 message, used for missing documents and those of other users alike.
+    :return: A tuple of (document, version), the version for its ETag.
+    """
+    document, version = repository.get_with_version(doc_id)
+    if document is None or document.get("user_id") != user_id:
+        raise HTTPException(status_code=404, detail=not_found)
+    return document, version
+
+# Get several documents owned by the user
+def get_owned_many(repository: Repository, doc_ids: List[str], user_id: str,
+                   fields: Optional[List[str]] = None) -> Tuple[List[dict], List[str]]:
+    """
+    Read documents by ID in one round trip, keeping those the user owns.
+    :param repository: The repository holding the documents.
+    :param doc_ids: The document IDs.
+    :param user_id: The ID of the authenticated user.
+    :param fields: The fields to return (including "id"), or None for whole documents.
+    :return: A tuple of (documents in request order, IDs that are missing or belong to other users).
+    """
+    found = repository.get_many(doc_ids)
+
+    documents = []
+    missing = []
+    for doc_id in doc_ids:
+        document = found.get(doc_id)
+        if document is None or document.get("user_id") != user_id:
+            missing.append(doc_id)
+            continue
+        if fields is not None:
+            document = {field: document[field] for field in fields if field in document}
+        documents.append(document)
+    return documents, missing
+
+# Write a document owned by the user, conditional on the version that was checked
+def write_owned(repository: Repository, doc_id: str, user_id: str, write: Callable[[dict, str], Optional[str]],
+                not_found: str, forbidden: str, if_match: Optional[List[str]] = None) -> Optional[str]:
+    """
+    Read a document, check its owner, then call write(document, version), which must pass
+    the version on to its update or delete. With If-Match, the version is the one read and
+    checked, and an edit of a document that changed in between is refused with 412. Without
+    it, the version is None and the write applies to whatever is current (the last writer
+    wins): the owner never changes, and a document deleted in between is not found.
+    :param repository: The repository holding the document.
+    :param doc_id: The document ID.
+    :param user_id: The ID of the authenticated user.
+    :param write: Performs the write, returning the new version (None for a delete).
+    :param not_found: The 404 message.
+    :param forbidden: The 403 message, for another user's document in the flat layout.
+    :param if_match: The versions the client allows (parse_if_match), or None for any.
+    :return: What write returned.
+    """
+    document, version = repository.get_with_version(doc_id)
+    if document is None:
+        raise HTTPException(status_code=404, detail=not_found)
+
+    # Ensure the document belongs to the user
+    if document.get("user_id") != user_id:
+        raise HTTPException(status_code=403, detail=forbidden)
+
+    if if_match is None:
+        try:
+            return write(document, None)
+        except DocumentNotFound:
+            raise HTTPException(status_code=404, detail=not_found)
+
+    if version not in if_match:
+        raise HTTPException(status_code=412, detail=PRECONDITION_FAILED)
+    try:
+        return write(document, version)
+    except PreconditionFailed:
+        raise HTTPException(status_code=412, detail=PRECONDITION_FAILED)
+
+# Check If-Match before a write made in a transaction
+def read_if_match(repository: Repository, doc_id: str, user_id: str, if_match: Optional[List[str]]) -> Optional[dict]:
+    """
+    Transactions cannot carry a version precondition, so the version is checked against
+    If-Match by a read beforehand; the transaction then compares the document it reads
+    with the one returned here and raises 412 if they differ.
+    :param repository: The repository holding the document.
+    :param doc_id: The document ID.
+    :param user_id: The ID of the authenticated user.
+    :param if_match: The versions the client allows (parse_if_match), or None for any.
+    :return: The document as read, or None if there is nothing to compare (no If-Match, or
+        a missing or foreign document, which the transaction reports itself).
+    """
+    if if_match is None:
+        return None
+    document, version = repository.get_with_version(doc_id)
+    if document is None or document.get("user_id") != user_id:
+        return None
+    if version not in if_match:
+        raise HTTPException(status_code=412, detail=PRECONDITION_FAILED)
+    return document
@@ -0,0 +1,76 @@
+#app/export.py
+from fastapi.responses import StreamingResponse
+from app.storage.base import Repository
+from typing import Iterable, Iterator, List
+import csv
+import io
+import json
+import zlib
+
+EXPORT_PAGE_SIZE = 1000
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+# Stream every document of a query, one page at a time
+def iter_pages(repository: Repository, filters: dict, fields: List[str], page_size: int = EXPORT_PAGE_SIZE) -> Iterator[List[dict]]:
+    """
+    Read a query in pages of document-ID order, so no single storage stream
+    stays open for the whole export and at most one page is held in memory.
+    :param repository: The repository to read.
+    :param filters: The equality filters to apply.
+    :param fields: The fields to project.
+    :param page_size: Documents per page.
+    :return: An iterator of pages (lists of dicts).
+    """
+    last_id = None
+
+    while True:
+        page = list(repository.query(filters, limit=page_size, start_after=last_id, fields=fields))
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        last_id = page[-1]["id"]
+
+def _ndjson_chunks(pages: Iterable[List[dict]], fields: List[str]) -> Iterator[bytes]:
+    for page in pages:
+        yield "".join(json.dumps({field: row.get(field) for field in fields}) + "\n" for row in page).encode()
+
+def _csv_chunks(pages: Iterable[List[dict]], fields: List[str]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore")
+    writer.writeheader()
+    for page in pages:
+        writer.writerows(page)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+def _gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+# Build a streaming export response
+def export_response(pages: Iterable[List[dict]], fields: List[str], format: str, gzip: bool, filename: str) -> StreamingResponse:
+    """
+    Stream pages of documents as NDJSON or CSV, optionally gzip-compressed.
+    :param pages: The pages to export (from iter_pages).
+    :param fields: The columns to write, in order.
+    :param format: "ndjson" or "csv".
+    :param gzip: Compress the body with gzip (sent as Content-Encoding: gzip).
+    :param filename: The file name suggested to the client, without extension.
+    :return: A StreamingResponse.
+    """
+    chunks = _csv_chunks(pages, fields) if format == "csv" else _ndjson_chunks(pages, fields)
+    headers = {"Content-Disposition": f'attachment; filename="{filename}.{format}"'}
+    if gzip:
+        chunks = _gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(chunks, media_type=EXPORT_FORMATS[format], headers=headers)
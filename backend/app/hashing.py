@@ -0,0 +1,94 @@
+#app/hashing.py
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from concurrent.futures import ThreadPoolExecutor
+from app.config import HASH_POOL_SIZE, HASH_QUEUE_SIZE
+from app.instrumentation import timed
+from app.metrics import HASH_IN_FLIGHT, HASH_QUEUE_DEPTH, HASH_REJECTED
+import threading
+import time
+
+# Initialize password hasher
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# bcrypt releases the GIL, so a thread pool gives real parallelism while keeping
+# hashing off the event loop and out of the general request thread pool.
+_executor = ThreadPoolExecutor(max_workers=HASH_POOL_SIZE, thread_name_prefix="bcrypt")
+_lock = threading.Lock()
+_pending = 0  # Hashes queued or running
+_running = 0
+_stats = {
+    "completed": 0,
+    "rejected": 0,
+    "hash_seconds_total": 0.0,
+    "hash_seconds_max": 0.0,
+    "wait_seconds_total": 0.0,
+}
+
+
+def _timed(func, args, submitted_at: float):
+    global _running
+    started_at = time.perf_counter()
+    with _lock:
+        _running += 1
+    HASH_QUEUE_DEPTH.dec()
+    HASH_IN_FLIGHT.inc()
+    try:
+        return func(*args)
+    finally:
+        finished_at = time.perf_counter()
+        HASH_IN_FLIGHT.dec()
+        with _lock:
+            _running -= 1
+            _stats["completed"] += 1
+            _stats["hash_seconds_total"] += finished_at - started_at
+            _stats["hash_seconds_max"] = max(_stats["hash_seconds_max"], finished_at - started_at)
+            _stats["wait_seconds_total"] += started_at - submitted_at
+
+
+def _run(func, *args):
+    """
+    Run a hashing function in the pool and wait for its result.
+    Raises a 503 when the pool and its queue are full, so a login storm is
+    shed instead of piling up behind bcrypt.
+    """
+    global _pending
+    with _lock:
+        if _pending >= HASH_POOL_SIZE + HASH_QUEUE_SIZE:
+            _stats["rejected"] += 1
+            HASH_REJECTED.inc()
+            raise HTTPException(
+                status_code=503,
+                detail="Server busy, please retry",
+                headers={"Retry-After": "1"},
+            )
+        _pending += 1
+    HASH_QUEUE_DEPTH.inc()
+
+    try:
+        with timed("hash"):
+            return _executor.submit(_timed, func, args, time.perf_counter()).result()
+    finally:
+        with _lock:
+            _pending -= 1
+
+# Hash password before storing
+def hash_password(password: str) -> str:
+    return _run(pwd_context.hash, password)
+
+# Verify password during login
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return _run(pwd_context.verify, plain_password, hashed_password)
+
+# Hashing pool statistics
+def get_hash_stats() -> dict:
+    """
+    Snapshot of the hashing pool: queue depth, in-flight hashes and latency totals.
+    """
+    with _lock:
+        stats = dict(_stats)
+        stats["queue_depth"] = _pending - _running
+        stats["in_flight"] = _running
+    stats["pool_size"] = HASH_POOL_SIZE
+    stats["queue_size"] = HASH_QUEUE_SIZE
+    return stats
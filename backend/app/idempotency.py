@@ -0,0 +1,180 @@
+#app/idempotency.py
+from abc import ABC, abstractmethod
+from fastapi import HTTPException
+from app.config import IDEMPOTENCY_BACKEND, IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_TTL
+from app.database import get_storage
+from cachetools import TLRUCache
+from typing import Callable, Optional, Tuple
+import datetime
+import hashlib
+import json
+import threading
+
+# Longest accepted Idempotency-Key
+MAX_KEY_LENGTH = 255
+
+# A request holds its key this long at most; if its worker dies, a retry may run after that
+PENDING_TTL = 60  # seconds
+
+
+class IdempotencyStore(ABC):
+    """
+    Records of requests made with an Idempotency-Key: {"fingerprint", "response", "expires_at"},
+    where response is None while the first request is still running. Records are
+    ignored once expires_at (a UTC datetime) has passed.
+    """
+
+    @abstractmethod
+    def claim(self, record_id: str, fingerprint: str) -> Optional[dict]:
+        """
+        Atomically create a pending record unless a live one exists.
+        :return: None if this request now holds the key, otherwise the existing record.
+        """
+
+    @abstractmethod
+    def complete(self, record_id: str, fingerprint: str, response: dict):
+        """Store the response to replay for IDEMPOTENCY_TTL seconds."""
+
+    @abstractmethod
+    def release(self, record_id: str):
+        """Drop a pending record after the request failed, so a retry runs again."""
+
+
+class MemoryIdempotencyStore(IdempotencyStore):
+    """
+    Per-process records, for tests and single-process development. Bounded by maxsize;
+    each record leaves the cache when it expires.
+    """
+
+    def __init__(self, maxsize: int = IDEMPOTENCY_CACHE_SIZE):
+        self._records = TLRUCache(maxsize=maxsize, ttu=lambda key, record, now: record["expires_at"], timer=_now)
+        self._lock = threading.Lock()
+
+    def claim(self, record_id: str, fingerprint: str) -> Optional[dict]:
+        with self._lock:
+            record = self._records.get(record_id)
+            if record is not None:
+                return dict(record)
+            self._records[record_id] = _record(fingerprint, None, PENDING_TTL)
+            return None
+
+    def complete(self, record_id: str, fingerprint: str, response: dict):
+        with self._lock:
+            self._records[record_id] = _record(fingerprint, response, IDEMPOTENCY_TTL)
+
+    def release(self, record_id: str):
+        with self._lock:
+            self._records.pop(record_id, None)
+
+
+class StorageIdempotencyStore(IdempotencyStore):
+    """
+    Records in the idempotency_keys collection of the storage backend (Firestore in
+    production), shared by every worker. A claim is a transaction, so of concurrent
+    requests with one key only one runs. Expired records are overwritten when their key
+    is used again; on Firestore, a TTL policy on expires_at deletes the others.
+    """
+
+    def claim(self, record_id: str, fingerprint: str) -> Optional[dict]:
+        storage = get_storage()
+
+        def write(transaction):
+            record = transaction.get(storage.idempotency_keys, record_id)
+            if record is not None and not _expired(record):
+                return record
+            transaction.set(storage.idempotency_keys, record_id, _record(fingerprint, None, PENDING_TTL))
+            return None
+
+        return storage.run_transaction(write)
+
+    def complete(self, record_id: str, fingerprint: str, response: dict):
+        get_storage().idempotency_keys.set(record_id, _record(fingerprint, response, IDEMPOTENCY_TTL))
+
+    def release(self, record_id: str):
+        get_storage().idempotency_keys.delete(record_id)
+
+
+def _now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+def _record(fingerprint: str, response: Optional[dict], ttl: int) -> dict:
+    return {"fingerprint": fingerprint, "response": response, "expires_at": _now() + datetime.timedelta(seconds=ttl)}
+
+def _expired(record: dict) -> bool:
+    expires_at = record["expires_at"]
+    # The SQLite backend stores timestamps as ISO 8601 strings
+    if isinstance(expires_at, str):
+        expires_at = datetime.datetime.fromisoformat(expires_at)
+    return expires_at <= _now()
+
+
+# Create an idempotency store by name
+def create_idempotency_store(backend: str = IDEMPOTENCY_BACKEND) -> IdempotencyStore:
+    """
+    Create the idempotency store selected by configuration.
+    :param backend: "storage" or "memory".
+    :return: An IdempotencyStore instance.
+    """
+    if backend == "storage":
+        return StorageIdempotencyStore()
+    if backend == "memory":
+        return MemoryIdempotencyStore()
+    raise ValueError(f"Unknown IDEMPOTENCY_BACKEND: {backend!r}")
+
+
+_store: Optional[IdempotencyStore] = None
+_lock = threading.Lock()
+
+
+# Get the process-wide idempotency store, creating it on first use
+def get_idempotency_store() -> IdempotencyStore:
+    global _store
+    if _store is None:
+        with _lock:
+            if _store is None:
+                _store = create_idempotency_store()
+    return _store
+
+# Replace the idempotency store (tests and benchmarks)
+def set_idempotency_store(store: IdempotencyStore):
+    global _store
+    with _lock:
+        _store = store
+
+# Run a create request at most once per Idempotency-Key
+def run_idempotent(user_id: str, scope: str, key: Optional[str], request_body: dict,
+                   create: Callable[[], dict]) -> Tuple[dict, bool]:
+    """
+    Call create() unless the user already made this request with this key, in which case
+    its original response is returned without writing anything.
+    :param user_id: The ID of the authenticated user; keys are scoped per user.
+    :param scope: Names the endpoint (e.g. "items"), so one key may be used on each.
+    :param key: The Idempotency-Key header, or None to just call create().
+    :param request_body: The request, which must be the same on every retry.
+    :param create: Performs the write and returns the response body.
+    :return: A tuple of (response body, True if it is a replay).
+    """
+    if key is None:
+        return create(), False
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters")
+
+    record_id = hashlib.sha256(f"{user_id}\n{scope}\n{key}".encode()).hexdigest()
+    fingerprint = hashlib.sha256(json.dumps(request_body, sort_keys=True, default=str).encode()).hexdigest()
+    store = get_idempotency_store()
+
+    record = store.claim(record_id, fingerprint)
+    if record is not None:
+        if record["fingerprint"] != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+        if record["response"] is None:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+        return record["response"], True
+
+    try:
+        response = create()
+    except BaseException:
+        store.release(record_id)
+        raise
+    store.complete(record_id, fingerprint, response)
+    return response, False
@@ -0,0 +1,244 @@
+#app/instrumentation.py
+from app.storage.base import Repository, Storage, Transaction, WriteBatch
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+import json
+import logging
+import time
+
+logger = logging.getLogger("app.timing")
+
+T = TypeVar("T")
+
+
+class RequestTimings:
+    """Per-request counts and total durations, keyed by operation name."""
+
+    __slots__ = ("operations",)
+
+    def __init__(self):
+        self.operations: Dict[str, List] = {}
+
+    def add(self, name: str, seconds: float):
+        entry = self.operations.get(name)
+        if entry is None:
+            self.operations[name] = [1, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+
+
+# The timings of the request being handled. Worker threads started with
+# run_in_threadpool copy the context, so they record into the same object.
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+# Called with (name, seconds) for every recorded operation, e.g. to feed metrics
+_observers = []
+
+
+def add_observer(observer):
+    _observers.append(observer)
+
+# Record one operation on the current request
+def record(name: str, seconds: float):
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, seconds)
+    for observer in _observers:
+        observer(name, seconds)
+
+# Time a block of code as one operation
+@contextmanager
+def timed(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+class InstrumentedRepository(Repository):
+    """Times every call to the wrapped repository as a db-<operation> entry."""
+
+    def __init__(self, inner: Repository):
+        self.inner = inner
+        self.name = inner.name
+
+    def get(self, doc_id: str) -> Optional[dict]:
+        with timed("db-get"):
+            return self.inner.get(doc_id)
+
+    def get_with_version(self, doc_id: str) -> Tuple[Optional[dict], Optional[str]]:
+        with timed("db-get"):
+            return self.inner.get_with_version(doc_id)
+
+    def get_many(self, doc_ids: Iterable[str]) -> Dict[str, dict]:
+        with timed("db-get"):
+            return self.inner.get_many(doc_ids)
+
+    def set(self, doc_id: str, data: dict):
+        with timed("db-set"):
+            self.inner.set(doc_id, data)
+
+    def update(self, doc_id: str, data: dict, version: Optional[str] = None) -> str:
+        with timed("db-update"):
+            return self.inner.update(doc_id, data, version)
+
+    def delete(self, doc_id: str, version: Optional[str] = None):
+        with timed("db-delete"):
+            self.inner.delete(doc_id, version)
+
+    def delete_many(self, doc_ids: Iterable[str]):
+        with timed("db-delete"):
+            self.inner.delete_many(doc_ids)
+
+    def increment(self, doc_id: str, field: str, amount: int = 1):
+        with timed("db-update"):
+            self.inner.increment(doc_id, field, amount)
+
+    def query(self, filters: Optional[dict] = None, limit: Optional[int] = None,
+              start_after: Optional[str] = None, fields: Optional[List[str]] = None) -> Iterator[dict]:
+        # Results are streamed, so time is spent while the caller iterates
+        documents = self.inner.query(filters, limit=limit, start_after=start_after, fields=fields)
+        elapsed = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    document = next(documents)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - start
+                yield document
+        finally:
+            record("db-query", elapsed)
+
+
+class InstrumentedWriteBatch(WriteBatch):
+    def __init__(self, inner: WriteBatch):
+        self.inner = inner
+
+    def set(self, repository: InstrumentedRepository, doc_id: str, data: dict):
+        self.inner.set(repository.inner, doc_id, data)
+
+    def update(self, repository: InstrumentedRepository, doc_id: str, data: dict):
+        self.inner.update(repository.inner, doc_id, data)
+
+    def delete(self, repository: InstrumentedRepository, doc_id: str):
+        self.inner.delete(repository.inner, doc_id)
+
+    def commit(self):
+        with timed("db-commit"):
+            self.inner.commit()
+
+
+class InstrumentedTransaction(Transaction):
+    def __init__(self, inner: Transaction):
+        self.inner = inner
+
+    def get(self, repository: InstrumentedRepository, doc_id: str) -> Optional[dict]:
+        with timed("db-get"):
+            return self.inner.get(repository.inner, doc_id)
+
+    def get_many(self, repository: InstrumentedRepository, doc_ids: Iterable[str]) -> Dict[str, dict]:
+        with timed("db-get"):
+            return self.inner.get_many(repository.inner, doc_ids)
+
+    def set(self, repository: InstrumentedRepository, doc_id: str, data: dict):
+        self.inner.set(repository.inner, doc_id, data)
+
+    def update(self, repository: InstrumentedRepository, doc_id: str, data: dict):
+        self.inner.update(repository.inner, doc_id, data)
+
+    def delete(self, repository: InstrumentedRepository, doc_id: str):
+        self.inner.delete(repository.inner, doc_id)
+
+
+class InstrumentedStorage(Storage):
+    """Wraps a storage backend so every round trip is recorded on the current request."""
+
+    def __init__(self, inner: Storage):
+        self.inner = inner
+        self._repositories = {
+            name: InstrumentedRepository(repository) for name, repository in inner._repositories.items()
+        }
+
+    def _create_repository(self, name: str) -> Repository:
+        return InstrumentedRepository(self.inner._create_repository(name))
+
+    def owned(self, name: str, user_id: str) -> Repository:
+        return InstrumentedRepository(self.inner.owned(name, user_id))
+
+    def owners(self, name: str) -> Iterator[str]:
+        return self.inner.owners(name)
+
+    def batch(self) -> WriteBatch:
+        return InstrumentedWriteBatch(self.inner.batch())
+
+    def run_transaction(self, fn: Callable[[Transaction], T]) -> T:
+        # The whole transaction, including its reads and any retries
+        with timed("db-transaction"):
+            return self.inner.run_transaction(lambda transaction: fn(InstrumentedTransaction(transaction)))
+
+    def warm(self):
+        self.inner.warm()
+
+    def close(self):
+        self.inner.close()
+
+
+def _route_path(scope) -> str:
+    # The route template keeps log lines and metrics free of IDs
+    route = scope.get("route")
+    return getattr(route, "path", None) or scope.get("path", "")
+
+def server_timing_header(timings: RequestTimings, total_seconds: float) -> str:
+    entries = [f'{name};desc="x{count}";dur={seconds * 1000:.2f}' for name, (count, seconds) in timings.operations.items()]
+    entries.append(f"app;dur={total_seconds * 1000:.2f}")
+    return ", ".join(entries)
+
+
+class TimingMiddleware:
+    """
+    ASGI middleware that collects the operations recorded during a request,
+    adds them to the response as a Server-Timing header and logs one JSON line.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                header = server_timing_header(timings, time.perf_counter() - start)
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(json.dumps({
+                    "method": scope["method"],
+                    "route": _route_path(scope),
+                    "status": status,
+                    "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+                    "timings": {
+                        name: {"count": count, "ms": round(seconds * 1000, 2)}
+                        for name, (count, seconds) in timings.operations.items()
+                    },
+                }))
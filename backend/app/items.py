@@ -1,147 +1,153 @@
 #app/items.py
-from app.database import db
-from fastapi import HTTPException
 from app.auth import get_current_user
 from app.models import Item
+from app.batch import run_batch
+from app.documents import get_owned, get_owned_many, parse_ids, write_owned
+from app.export import iter_pages
+from app.layout import mirror_writes, owned_repository, owner_filter
+from app.versions import bump_version
+from app.pagination import DEFAULT_PAGE_SIZE, parse_fields, paginate
+from typing import List, Optional
+import time
 import uuid
 
+# Fields clients may request through the fields= parameter
+ITEM_FIELDS = set(Item.model_fields) | {"id", "user_id", "created_at"}
+
+# Columns written by the export, in order
+ITEM_EXPORT_FIELDS = ["id"] + list(Item.model_fields)
+
 # Add a item
-def add_item(item_data: dict, username: str) -> str:
+def add_item(item_data: dict, user_id: str) -> str:
     """
     Add a new item for the authenticated user.
     :param item_data: The item details (name, color).
-    :param username: The username of the authenticated user.
+    :param user_id: The ID of the authenticated user.
     :return: The ID of the newly created item.
     """
-    # Get the user_id from the username (assumes the user exists)
-    user_ref = db.collection("users").where("username", "==", username).stream()
-    user = next(user_ref, None)
-    
-    if user is None:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    user_id = user.id
-
     # Generate a unique item ID
     item_id = str(uuid.uuid4())
 
     # Add the user_id to the clothing data
     item_data["user_id"] = user_id
     item_data["id"] = item_id  # Store the unique item ID
+    item_data["created_at"] = time.time()  # Unix timestamp
 
-    # Save the item in Firestore
-    db.collection("items").document(item_id).set(item_data)
+    # Save the item
+    owned_repository("items", user_id).set(item_id, item_data)
+    mirror_writes("items", user_id, [item_id])
+    bump_version(user_id, "items")
     return item_id
 
 # Get all items for a specific user
-def get_items(user_username: str):
+def get_items(user_id: str, limit: int = DEFAULT_PAGE_SIZE, page_token: Optional[str] = None, fields: Optional[str] = None):
     """
-    Retrieve all items for the authenticated user.
-    :param user_username: The username of the authenticated user.
-    :return: A list of items.
+    Retrieve one page of items for the authenticated user.
+    :param user_id: The ID of the authenticated user.
+    :param limit: The maximum number of items to return.
+    :param page_token: The token returned with the previous page (optional).
+    :param fields: Comma-separated item fields to return (optional).
+    :return: A tuple of (list of items, next page token or None).
     """
-    user_ref = db.collection("users").where("username", "==", user_username).stream()
-    user = next(user_ref, None)
+    projection = parse_fields(fields, ITEM_FIELDS)
 
-    if user is None:
-        raise HTTPException(status_code=404, detail="User not found")
+    # Get one page of items for the user
+    return paginate(owned_repository("items", user_id), owner_filter(user_id), limit, page_token, projection)
 
-    user_id = user.id
+# Build the GET /items/ response body
+def list_items(user_id: str, limit: int = DEFAULT_PAGE_SIZE, page_token: Optional[str] = None,
+               fields: Optional[str] = None, ids: Optional[str] = None) -> dict:
+    """
+    Read one page of the user's items, or the items with the given IDs.
+    :return: {"items", "next_page_token"}, or {"items", "missing"} when ids are given.
+    """
+    if ids is not None:
+        items, missing = get_items_by_id(ids, user_id, fields)
+        return {"items": items, "missing": missing}
 
-    # Get all items for the user
-    items_ref = db.collection("items").where("user_id", "==", user_id).stream()
-    items = [item.to_dict() for item in items_ref]
+    items, next_page_token = get_items(user_id, limit, page_token, fields)
+    return {"items": items, "next_page_token": next_page_token}
 
-    return items
+# Get several items of the authenticated user by ID
+def get_items_by_id(ids: str, user_id: str, fields: Optional[str] = None):
+    """
+    Retrieve several items of the authenticated user in one read.
+    :param ids: Comma-separated item IDs.
+    :param user_id: The ID of the authenticated user.
+    :param fields: Comma-separated item fields to return (optional).
+    :return: A tuple of (items in request order, IDs not found).
+    """
+    projection = parse_fields(fields, ITEM_FIELDS)
+    return get_owned_many(owned_repository("items", user_id), parse_ids(ids), user_id, projection)
+
+# Stream all items for a specific user
+def export_items(user_id: str):
+    """
+    Stream every item of the authenticated user, one page at a time.
+    :param user_id: The ID of the authenticated user.
+    :return: An iterator of pages of items (lists of dicts).
+    """
+    return iter_pages(owned_repository("items", user_id), owner_filter(user_id), ITEM_EXPORT_FIELDS)
 
 # Get a specific item for the authenticated user.
-def get_item(item_id: str, user_username: str):
+def get_item(item_id: str, user_id: str):
     """
     Retrieve a specific item for the authenticated user.
     :param item_id: The ID of the item.
-    :param user_username: The username of the authenticated user.
-    :return: The requested item if found, otherwise raises an HTTPException.
+    :param user_id: The ID of the authenticated user.
+    :return: A tuple of (item, version) if found, otherwise raises an HTTPException.
     """
-    # Retrieve the user from Firestore
-    user_ref = db.collection("users").where("username", "==", user_username).stream()
-    user = next(user_ref, None)
-
-    if user is None:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    user_id = user.id
-
-    # Retrieve the specific item by user_id and item_id
-    item_ref = db.collection("items").where("user_id", "==", user_id).where("id", "==", item_id).stream()
-    item = next(item_ref, None)
-
-    if item is None:
-        raise HTTPException(status_code=404, detail="Item not found")
-
-    return item.to_dict()  # Convert Firestore document to dictionary
+    # Read the item directly and check its owner
+    return get_owned(owned_repository("items", user_id), item_id, user_id, "Item not found")
 
 
 # Update a item
-def update_item(item_id: str, update_data: dict, username: str):
+def update_item(item_id: str, update_data: dict, user_id: str, if_match: Optional[List[str]] = None):
     """
     Update a item for the authenticated user.
     :param item_id: The item ID.
     :param update_data: The data to update.
-    :param username: The username of the authenticated user.
-    :return: A message indicating success.
+    :param user_id: The ID of the authenticated user.
+    :param if_match: The versions the client edited (If-Match), or None to apply the update to any version.
+    :return: A tuple of (message indicating success, the item's new version).
     """
-    user_ref = db.collection("users").where("username", "==", username).stream()
-    user = next(user_ref, None)
-
-    if user is None:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    user_id = user.id
-
-    # Fetch the item
-    item_ref = db.collection("items").document(item_id).get()
+    items = owned_repository("items", user_id)
 
-    if not item_ref.exists:
-        raise HTTPException(status_code=404, detail="Item not found")
+    # Update the item (if it is still the version the client edited, with If-Match)
+    def write(item_data, version):
+        return items.update(item_id, update_data, version=version)
 
-    item_data = item_ref.to_dict()
-
-    # Ensure the item belongs to the user
-    if item_data["user_id"] != user_id:
-        raise HTTPException(status_code=403, detail="Unauthorized to update this item")
-
-    # Update the item
-    db.collection("items").document(item_id).update(update_data)
-    return {"message": "item updated successfully"}
+    version = write_owned(items, item_id, user_id, write, "Item not found", "Unauthorized to update this item", if_match)
+    mirror_writes("items", user_id, [item_id])
+    bump_version(user_id, "items")
+    return {"message": "item updated successfully"}, version
 
 # Delete a item
-def delete_item(item_id: str, username: str):
+def delete_item(item_id: str, user_id: str, if_match: Optional[List[str]] = None):
     """
     Delete a item for the authenticated user.
     :param item_id: The item ID.
-    :param username: The username of the authenticated user.
+    :param user_id: The ID of the authenticated user.
+    :param if_match: The versions the client deletes (If-Match), or None to delete any version.
     :return: A message indicating success.
     """
-    user_ref = db.collection("users").where("username", "==", username).stream()
-    user = next(user_ref, None)
-
-    if user is None:
-        raise HTTPException(status_code=404, detail="User not found")
+    items = owned_repository("items", user_id)
 
-    user_id = user.id
+    # Delete the item (if it is still the version the client read, with If-Match)
+    def write(item_data, version):
+        items.delete(item_id, version=version)
 
-    # Fetch the item
-    item_ref = db.collection("items").document(item_id).get()
-
-    if not item_ref.exists:
-        raise HTTPException(status_code=404, detail="item not found")
-
-    item_data = item_ref.to_dict()
-
-    # Ensure the item belongs to the user
-    if item_data["user_id"] != user_id:
-        raise HTTPException(status_code=403, detail="Unauthorized to delete this item")
-
-    # Delete the item
-    db.collection("items").document(item_id).delete()
+    write_owned(items, item_id, user_id, write, "item not found", "Unauthorized to delete this item", if_match)
+    mirror_writes("items", user_id, [item_id])
+    bump_version(user_id, "items")
     return {"message": "item deleted successfully"}
+
+# Apply a batch of item operations
+def batch_items(operations: list, user_id: str):
+    """
+    Create, update and delete several items in one request.
+    :param operations: The list of operations (op, id, data).
+    :param user_id: The ID of the authenticated user.
+    :return: One result per operation, in request order.
+    """
+    return run_batch("items", Item, set(Item.model_fields), operations, user_id)
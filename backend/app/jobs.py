@@ -0,0 +1,200 @@
+#app/jobs.py
+from app.database import get_storage
+from app.layout import get_data_layout, mirror_writes, owned_repository, owner_filter
+from app.storage.base import MAX_TRANSACTION_WRITES, Repository
+from app.submissions import delete_submission_documents
+from typing import List, Optional
+import datetime
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Collections holding documents owned by a user, deleted in this order
+USER_DATA_COLLECTIONS = ("submissions", "items")
+DELETE_PAGE_SIZE = MAX_TRANSACTION_WRITES
+# A page of submissions is deleted in one transaction that also writes a rating shard per submission
+SUBMISSION_DELETE_PAGE_SIZE = MAX_TRANSACTION_WRITES // 2
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+# Create a job that deletes everything a user owns
+def create_user_data_deletion_job(transaction, user_id: str) -> str:
+    """
+    Record a pending job that deletes every item and submission owned by a user.
+    Written in the transaction that deletes the user, so neither exists without the other.
+    :param transaction: The transaction deleting the user.
+    :param user_id: The ID of the deleted user.
+    :return: The ID of the job.
+    """
+    job_id = str(uuid.uuid4())
+    transaction.set(get_storage().jobs, job_id, {
+        "id": job_id,
+        "type": "delete_user_data",
+        "user_id": user_id,
+        "status": "pending",
+        "deleted": {collection: 0 for collection in USER_DATA_COLLECTIONS},
+        "created_at": _now(),
+        "updated_at": _now(),
+    })
+    return job_id
+
+# Delete one page of documents from a collection
+def _delete_page(collection: str, repository: Repository, doc_ids: List[str]):
+    if collection == "submissions":
+        # Deleted submissions also leave the per-item rating aggregates
+        delete_submission_documents(repository, doc_ids)
+    else:
+        repository.delete_many(doc_ids)
+
+# Delete all documents in a collection matching user_id, one page at a time
+def delete_owned_documents(collection: str, user_id: str, on_page=None) -> int:
+    """
+    Stream a user's documents in pages of IDs and delete each page with the
+    backend's bulk path (a BulkWriter on Firestore), or in one transaction for
+    submissions so the rating aggregates stay correct. Deleted documents drop out
+    of the query, so an interrupted run can simply be started again.
+    :param collection: The collection to clean up.
+    :param user_id: The owner whose documents are deleted.
+    :param on_page: Optional callback receiving the running count after each page.
+    :return: The number of documents deleted.
+    """
+    repository = owned_repository(collection, user_id)
+    page_size = SUBMISSION_DELETE_PAGE_SIZE if collection == "submissions" else DELETE_PAGE_SIZE
+
+    deleted = 0
+    while True:
+        page = [document["id"] for document in repository.query(owner_filter(user_id), limit=page_size, fields=[])]
+        if not page:
+            break
+        _delete_page(collection, repository, page)
+        mirror_writes(collection, user_id, page)
+        deleted += len(page)
+        if on_page is not None:
+            on_page(deleted)
+
+    return deleted
+
+# Run (or resume) a user data deletion job
+def run_user_data_deletion_job(job_id: str):
+    """
+    Delete the data owned by the job's user and record progress on the job document.
+    Safe to call again for a job that failed or was interrupted.
+    :param job_id: The ID of the job.
+    """
+    jobs = get_storage().jobs
+    job = jobs.get(job_id)
+    if job is None or job["status"] in ("done", "cancelled"):
+        return
+
+    # Never delete the data of a user that still exists
+    if get_storage().users.get(job["user_id"]) is not None:
+        logger.error("Job %s cancelled: user %s still exists", job_id, job["user_id"])
+        jobs.update(job_id, {"status": "cancelled", "updated_at": _now()})
+        return
+
+    jobs.update(job_id, {"status": "running", "updated_at": _now()})
+    deleted = dict(job["deleted"])
+
+    try:
+        for collection in USER_DATA_COLLECTIONS:
+            done_before = deleted[collection]
+
+            def report(count, collection=collection, done_before=done_before):
+                deleted[collection] = done_before + count
+                jobs.update(job_id, {"deleted": deleted, "updated_at": _now()})
+                logger.info("Job %s: deleted %d %s", job_id, deleted[collection], collection)
+
+            delete_owned_documents(collection, job["user_id"], on_page=report)
+
+        # The user's collection versions go last
+        get_storage().versions.delete(job["user_id"])
+    except Exception:
+        logger.exception("Job %s failed", job_id)
+        jobs.update(job_id, {"status": "failed", "updated_at": _now()})
+        raise
+
+    jobs.update(job_id, {"status": "done", "updated_at": _now()})
+    logger.info("Job %s done: %s", job_id, deleted)
+
+# Get a job
+def get_job(job_id: str) -> Optional[dict]:
+    return get_storage().jobs.get(job_id)
+
+# Resume every job that has not finished
+def resume_unfinished_jobs() -> int:
+    """
+    Run all pending, running or failed jobs to completion.
+    :return: The number of jobs resumed.
+    """
+    resumed = 0
+    for status in ("pending", "running", "failed"):
+        for job in list(get_storage().jobs.query({"status": status}, fields=["type"])):
+            # Other jobs (e.g. migrate-layout) are resumed by their own command
+            if job.get("type", "delete_user_data") != "delete_user_data":
+                continue
+            run_user_data_deletion_job(job["id"])
+            resumed += 1
+    return resumed
+
+# Delete items and submissions whose owner no longer exists
+def sweep_orphans(dry_run: bool = False) -> dict:
+    """
+    Find documents owned by users that no longer exist and delete them.
+    :param dry_run: Only count orphans, do not delete them.
+    :return: The number of orphans found per collection.
+    """
+    storage = get_storage()
+    user_ids = {user["id"] for user in storage.users.query(fields=[])}
+    missing_user_ids = set()
+
+    def is_orphan(user_id: Optional[str]) -> bool:
+        if not user_id:
+            return True
+        if user_id in user_ids:
+            return False
+        if user_id not in missing_user_ids:
+            # The user may have registered after the scan above
+            if storage.users.get(user_id) is not None:
+                user_ids.add(user_id)
+                return False
+            missing_user_ids.add(user_id)
+        return True
+
+    found = {}
+    for collection in USER_DATA_COLLECTIONS:
+        found[collection] = 0
+
+        if get_data_layout() == "nested":
+            # Every user's documents are a collection of their own, so each owner is checked once
+            for user_id in storage.owners(collection):
+                if not is_orphan(user_id):
+                    continue
+                if dry_run:
+                    found[collection] += sum(1 for _ in storage.owned(collection, user_id).query(fields=[]))
+                else:
+                    found[collection] += delete_owned_documents(collection, user_id)
+            logger.info("%s orphaned %s: %d", "Found" if dry_run else "Deleted", collection, found[collection])
+            continue
+
+        # The nested copies of these orphans (dual layout) are swept once the nested layout is in use
+        repository = storage.repository(collection)
+        orphan_ids = []
+
+        for document in repository.query(fields=["user_id"]):
+            if not is_orphan(document.get("user_id")):
+                continue
+            found[collection] += 1
+            orphan_ids.append(document["id"])
+            if len(orphan_ids) >= DELETE_PAGE_SIZE:
+                if not dry_run:
+                    _delete_page(collection, repository, orphan_ids)
+                orphan_ids = []
+
+        if orphan_ids and not dry_run:
+            _delete_page(collection, repository, orphan_ids)
+        logger.info("%s orphaned %s: %d", "Found" if dry_run else "Deleted", collection, found[collection])
+
+    return found
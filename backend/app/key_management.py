@@ -1,41 +1,216 @@
 #app/key_management.py
+import hashlib
+import json
+import logging
 import os
 import secrets
-import string
-from dotenv import load_dotenv
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+from dotenv import dotenv_values
+from app.config import SIGNING_KEYS_FILE, load_environment
+
+try:
+    import fcntl
+except ImportError:  # Windows: keys are still created, but without a lock between processes
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class Keyring:
+    """
+    The keys tokens are signed and verified with. Every token carries the ID of the key
+    that signed it in its kid header, so older keys keep verifying the tokens they signed
+    while a newer key signs new ones.
+    :param keys: Secrets by key ID.
+    :param current: The ID of the key new tokens are signed with.
+    """
+
+    def __init__(self, keys: Dict[str, str], current: str):
+        if current not in keys:
+            raise ValueError(f"Unknown current signing key: {current!r}")
+        self.keys = dict(keys)
+        self.current = current
+
+    def signing_key(self) -> Tuple[str, str]:
+        """:return: A tuple of (key ID, secret) to sign new tokens with."""
+        return self.current, self.keys[self.current]
+
+    def verification_key(self, kid: Optional[str]) -> Optional[str]:
+        """
+        :param kid: The token's kid header, or None for tokens issued before keys had IDs.
+        :return: The secret to verify the token with, or None if the key is unknown (or retired).
+        """
+        if kid is None:
+            return self.keys[self.current]
+        return self.keys.get(kid)
 
-# Load environment variables from .env file
-load_dotenv()
 
 def generate_secret_key(length=32):
-    """Generate a random secret key of the specified length."""
-    # Generate a random string of uppercase, lowercase, digits, and punctuation characters
-    characters = string.ascii_letters + string.digits + string.punctuation
-    secret_key = ''.join(secrets.choice(characters) for _ in range(length))
-    return secret_key
+    """Generate a random secret key from the specified number of random bytes."""
+    # URL-safe characters only, so the key is written to .env as a plain line every reader parses
+    return secrets.token_urlsafe(length)
+
+# Public ID of a secret, sent in the kid header of the tokens it signs
+def key_id(secret: str) -> str:
+    return hashlib.sha256(secret.encode()).hexdigest()[:12]
+
+# Hold an exclusive lock next to path, so one process at a time creates or changes the file
+@contextmanager
+def _file_lock(path: str):
+    lock_path = path + ".lock"
+    while True:
+        lock_file = open(lock_path, "a")
+        if fcntl is None:
+            break
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        # The holder before us may have removed the file while we waited: lock the current one
+        try:
+            if os.stat(lock_path).st_ino == os.fstat(lock_file.fileno()).st_ino:
+                break
+        except FileNotFoundError:
+            pass
+        lock_file.close()
+
+    try:
+        yield
+    finally:
+        # Removed while still held, so no lock file is left behind
+        try:
+            os.remove(lock_path)
+        except FileNotFoundError:
+            pass
+        lock_file.close()
 
 def check_and_create_secret_key():
     """Check if SECRET_KEY exists in environment variables, if not, generate and store it."""
+    load_environment()
+
     # First, check if the SECRET_KEY is already in the environment variables
     secret_key = os.getenv("SECRET_KEY")
 
     if secret_key is None:
-        print("SECRET_KEY not found, generating a new one...")
+        # Workers started together all get here: the first to take the lock generates the
+        # key, the others find it in .env, so every worker signs with the same key
+        with _file_lock(".env"):
+            if os.path.exists(".env"):
+                secret_key = dotenv_values(".env").get("SECRET_KEY")
 
-        # If SECRET_KEY is not found, generate a new one
-        secret_key = generate_secret_key()  # Generate a new secret key
+            if secret_key is None:
+                # If SECRET_KEY is not found, generate a new one
+                secret_key = generate_secret_key()  # Generate a new secret key
 
-        # Write the generated secret key to a .env file
-        with open(".env", "a") as env_file:
-            env_file.write(f"SECRET_KEY={secret_key}\n")
+                # Write the generated secret key to a .env file
+                with open(".env", "a") as env_file:
+                    env_file.write(f"SECRET_KEY={secret_key}\n")
 
-        # Optionally, set it in the environment temporarily for this session
-        os.environ["SECRET_KEY"] = secret_key
+                logger.warning("SECRET_KEY not found; generated a new one and stored it in .env")
 
-        print(f"Generated and stored SECRET_KEY: {secret_key}")
-    else:
-        print("SECRET_KEY found in environment.")
+        # Set it in the environment for this session
+        os.environ["SECRET_KEY"] = secret_key
 
     return secret_key
 
+def _read_keys_file(path: str) -> Optional[Keyring]:
+    try:
+        with open(path) as keys_file:
+            data = json.load(keys_file)
+    except FileNotFoundError:
+        return None
+    return Keyring(data["keys"], data["current"])
+
+def _write_keys_file(path: str, keyring: Keyring):
+    # Write a new file and rename it over the old one, so readers never see a partial file
+    temporary = f"{path}.{os.getpid()}.tmp"
+    descriptor = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descriptor, "w") as keys_file:
+        json.dump({"current": keyring.current, "keys": keyring.keys}, keys_file, indent=2)
+    os.replace(temporary, path)
+
+# Load a shared keys file, creating it with one key if it does not exist
+def load_keys_file(path: str) -> Keyring:
+    """
+    Read the keyring shared by every worker. If the file does not exist yet, the first
+    worker to take its lock creates it, and the others read that worker's key.
+    :param path: A JSON file: {"current": "<kid>", "keys": {"<kid>": "<secret>", ...}}.
+    :return: The keyring.
+    """
+    keyring = _read_keys_file(path)
+    if keyring is not None:
+        return keyring
+
+    with _file_lock(path):
+        keyring = _read_keys_file(path)
+        if keyring is None:
+            secret = generate_secret_key()
+            keyring = Keyring({key_id(secret): secret}, key_id(secret))
+            _write_keys_file(path, keyring)
+            logger.warning("%s not found; generated a new signing key %s", path, keyring.current)
+    return keyring
+
+# Add a signing key to a keys file and sign with it from now on
+def rotate_signing_key(path: str, keep: int = 2) -> str:
+    """
+    Generate a key and make it the current one. The previous keys keep verifying the tokens
+    they signed until only the newest `keep` keys are left; keep the previous key at least
+    as long as an access token lives. Workers reading the file pick the change up on their
+    next token, without a restart.
+    :param path: The keys file (SIGNING_KEYS_FILE).
+    :param keep: How many keys to keep, including the new one.
+    :return: The ID of the new key.
+    """
+    with _file_lock(path):
+        keyring = _read_keys_file(path)
+        keys = dict(keyring.keys) if keyring is not None else {}
+        secret = generate_secret_key()
+        keys[key_id(secret)] = secret
+        keys = dict(list(keys.items())[-max(keep, 1):])
+        _write_keys_file(path, Keyring(keys, key_id(secret)))
+    return key_id(secret)
+
+
+_keyring: Optional[Keyring] = None
+_keyring_stamp: Optional[Tuple[int, int]] = None
+_keyring_lock = threading.Lock()
+
+
+# Changes whenever the file is written: every write renames a new file (inode) into place
+def _stamp(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+# Get the keys tokens are signed and verified with, resolving them on first use
+def get_keyring() -> Keyring:
+    """
+    With SIGNING_KEYS_FILE set, the keys come from that file, shared by every worker and
+    re-read whenever it changes (e.g. after rotate-signing-key). Otherwise SECRET_KEY is the
+    only key, generated into .env on first use if it is not set. Nothing is read or written
+    when the app is imported.
+    :return: The keyring.
+    """
+    global _keyring, _keyring_stamp
+    if SIGNING_KEYS_FILE is None:
+        if _keyring is None:
+            with _keyring_lock:
+                if _keyring is None:
+                    secret = check_and_create_secret_key()
+                    _keyring = Keyring({key_id(secret): secret}, key_id(secret))
+        return _keyring
+
+    stamp = _stamp(SIGNING_KEYS_FILE)
+    if _keyring is None or stamp is None or stamp != _keyring_stamp:
+        with _keyring_lock:
+            stamp = _stamp(SIGNING_KEYS_FILE)
+            if _keyring is None or stamp is None or stamp != _keyring_stamp:
+                # Stamped before reading, so a change made meanwhile is read again next time
+                _keyring = load_keys_file(SIGNING_KEYS_FILE)
+                _keyring_stamp = stamp
+    return _keyring
 
+# Get the secret new tokens are signed with
+def get_secret_key() -> str:
+    return get_keyring().signing_key()[1]
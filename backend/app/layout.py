@@ -0,0 +1,111 @@
+#app/layout.py
+from app.config import DATA_LAYOUT
+from app.database import get_storage
+from app.export import EXPORT_PAGE_SIZE, iter_pages
+from app.storage.base import Repository
+from typing import Iterator, List
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Where items and submissions are stored:
+# - "flat":   top-level collections; every document carries its owner's user_id, which
+#             reads filter on and writes check;
+# - "nested": each user's own collections, users/{user_id}/items and users/{user_id}/submissions,
+#             so reads scan only that user's documents and ownership is the path itself;
+# - "dual":   the cutover from flat to nested. Reads and writes use flat, and every write
+#             is then copied to nested; migrate-layout copies what was written before.
+LAYOUTS = ("flat", "dual", "nested")
+
+_layout = DATA_LAYOUT
+
+
+# Get the layout in use
+def get_data_layout() -> str:
+    return _layout
+
+# Switch the layout (tests and the migration)
+def set_data_layout(layout: str):
+    global _layout
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown DATA_LAYOUT: {layout!r}")
+    _layout = layout
+
+# Get the repository holding a user's documents of a collection
+def owned_repository(collection: str, user_id: str) -> Repository:
+    """
+    :param collection: "items" or "submissions".
+    :param user_id: The owner.
+    :return: The user's own collection in the nested layout, otherwise the shared flat one
+        (to be queried with owner_filter).
+    """
+    storage = get_storage()
+    if _layout == "nested":
+        return storage.owned(collection, user_id)
+    return storage.repository(collection)
+
+# Query filters that select a user's documents in owned_repository
+def owner_filter(user_id: str) -> dict:
+    return {} if _layout == "nested" else {"user_id": user_id}
+
+# Stream every document of a collection, of all users
+def iter_all_pages(collection: str, fields: List[str], page_size: int = EXPORT_PAGE_SIZE) -> Iterator[List[dict]]:
+    """
+    Read a whole collection in pages, one user at a time in the nested layout.
+    :param collection: "items" or "submissions".
+    :param fields: The fields to project.
+    :param page_size: Documents per page.
+    :return: An iterator of pages (lists of dicts).
+    """
+    storage = get_storage()
+    if _layout != "nested":
+        yield from iter_pages(storage.repository(collection), {}, fields, page_size)
+        return
+    for user_id in storage.owners(collection):
+        yield from iter_pages(storage.owned(collection, user_id), {}, fields, page_size)
+
+# Copy documents from the flat layout to the nested one
+def copy_documents(collection: str, user_id: str, doc_ids: List[str]) -> int:
+    """
+    Make the user's nested copies of the documents match the flat ones: copied if they
+    exist, deleted if not. The flat documents are read in the same transaction, so a
+    concurrent write to them makes it retry instead of leaving an older copy behind.
+    :param collection: "items" or "submissions".
+    :param user_id: The owner.
+    :param doc_ids: The IDs of the documents.
+    :return: The number of documents copied (the others were deleted).
+    """
+    storage = get_storage()
+    flat = storage.repository(collection)
+    nested = storage.owned(collection, user_id)
+
+    def copy(transaction) -> int:
+        documents = transaction.get_many(flat, doc_ids)
+        copied = 0
+        for doc_id in doc_ids:
+            document = documents.get(doc_id)
+            if document is not None and document.get("user_id") == user_id:
+                transaction.set(nested, doc_id, document)
+                copied += 1
+            else:
+                transaction.delete(nested, doc_id)
+        return copied
+
+    return storage.run_transaction(copy)
+
+# Copy the documents a request wrote to the nested layout, during the cutover
+def mirror_writes(collection: str, user_id: str, doc_ids: List[str]):
+    """
+    In the dual layout, call after every committed write of a user's documents. A copy that
+    fails is logged rather than failing the request, whose write did succeed; run
+    migrate-layout --restart before switching to nested if any were logged.
+    :param collection: "items" or "submissions".
+    :param user_id: The owner.
+    :param doc_ids: The IDs of the documents created, updated or deleted.
+    """
+    if _layout != "dual" or not doc_ids:
+        return
+    try:
+        copy_documents(collection, user_id, doc_ids)
+    except Exception:
+        logger.exception("Could not copy %s %s of user %s to the nested layout", collection, doc_ids, user_id)
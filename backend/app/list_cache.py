@@ -0,0 +1,346 @@
+#app/list_cache.py
+from abc import ABC, abstractmethod
+from app.config import LIST_CACHE_BACKEND, LIST_CACHE_MAX_BYTES, LIST_CACHE_PATH, LIST_CACHE_REDIS_URL, LIST_CACHE_TTL
+from app.metrics import CACHE_EVICTIONS, cache_counters
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Set, Tuple
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Approximate bytes held per entry besides the body (key strings, dict and LRU links)
+ENTRY_OVERHEAD = 256
+
+_evictions = CACHE_EVICTIONS.labels("lists")
+
+
+class ListCache(ABC):
+    """
+    Serialized list responses of one user's collection, keyed by a string naming the
+    request. Callers put the collection version in that key, so an entry can never be
+    served after a write; invalidate() frees a user's entries as soon as they go stale.
+    """
+
+    @abstractmethod
+    def get(self, user_id: str, collection: str, key: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def set(self, user_id: str, collection: str, key: str, body: bytes):
+        pass
+
+    @abstractmethod
+    def invalidate(self, user_id: str, collection: str):
+        """Drop every entry of one user's collection, leaving other users and collections alone."""
+
+    @abstractmethod
+    def stats(self) -> dict:
+        """Backend counters, e.g. entries, bytes and evictions."""
+
+    def clear(self):
+        """Drop every entry (tests and benchmarks)."""
+
+
+class MemoryListCache(ListCache):
+    """
+    Per-process LRU cache bounded by the approximate memory its entries hold.
+    :param max_bytes: Least recently used entries are evicted beyond this size.
+    """
+
+    def __init__(self, max_bytes: int = LIST_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._entries: "OrderedDict[Tuple[str, str, str], bytes]" = OrderedDict()
+        self._keys: Dict[Tuple[str, str], Set[str]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str, collection: str, key: str) -> Optional[bytes]:
+        entry = (user_id, collection, key)
+        with self._lock:
+            body = self._entries.get(entry)
+            if body is not None:
+                self._entries.move_to_end(entry)
+            return body
+
+    def set(self, user_id: str, collection: str, key: str, body: bytes):
+        if _size(body) > self.max_bytes:
+            return
+        entry = (user_id, collection, key)
+        with self._lock:
+            self._remove(entry)
+            self._entries[entry] = body
+            self._keys.setdefault((user_id, collection), set()).add(key)
+            self._bytes += _size(body)
+
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+                _evictions.inc()
+
+    def invalidate(self, user_id: str, collection: str):
+        with self._lock:
+            for key in list(self._keys.get((user_id, collection), ())):
+                self._remove((user_id, collection, key))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "evictions": self.evictions}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys.clear()
+            self._bytes = 0
+
+    # Callers hold the lock
+    def _remove(self, entry: Tuple[str, str, str]):
+        body = self._entries.pop(entry, None)
+        if body is None:
+            return
+        self._bytes -= _size(body)
+        keys = self._keys[entry[:2]]
+        keys.discard(entry[2])
+        if not keys:
+            del self._keys[entry[:2]]
+
+
+class SQLiteListCache(ListCache):
+    """
+    A SQLite file shared by the workers on one host, a local stand-in for a shared
+    cache server. Bounded by the total size of the bodies, evicting by last use.
+    :param path: The cache file.
+    :param max_bytes: Least recently used entries are evicted beyond this size.
+    :param ttl: Seconds after which an entry is no longer served.
+    """
+
+    def __init__(self, path: str = LIST_CACHE_PATH, max_bytes: int = LIST_CACHE_MAX_BYTES, ttl: int = LIST_CACHE_TTL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.evictions = 0
+        self._local = threading.local()
+        with self._transaction() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS lists (user_id TEXT NOT NULL, collection TEXT NOT NULL, key TEXT NOT NULL, "
+                "body BLOB NOT NULL, size INTEGER NOT NULL, created REAL NOT NULL, used REAL NOT NULL, "
+                "PRIMARY KEY (user_id, collection, key))"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS lists_used ON lists (used)")
+
+    def get(self, user_id: str, collection: str, key: str) -> Optional[bytes]:
+        now = time.time()
+        with self._transaction() as connection:
+            row = connection.execute(
+                "SELECT body FROM lists WHERE user_id = ? AND collection = ? AND key = ? AND created > ?",
+                (user_id, collection, key, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "UPDATE lists SET used = ? WHERE user_id = ? AND collection = ? AND key = ?", (now, user_id, collection, key)
+            )
+        return row[0]
+
+    def set(self, user_id: str, collection: str, key: str, body: bytes):
+        if _size(body) > self.max_bytes:
+            return
+        now = time.time()
+        with self._transaction() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO lists (user_id, collection, key, body, size, created, used) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (user_id, collection, key, body, _size(body), now, now)
+            )
+            excess = connection.execute("SELECT total(size) FROM lists").fetchone()[0] - self.max_bytes
+            if excess <= 0:
+                return
+
+            # Evict the least recently used entries until the rest fits
+            evicted = []
+            for row in connection.execute("SELECT rowid, size FROM lists ORDER BY used"):
+                if excess <= 0:
+                    break
+                evicted.append((row[0],))
+                excess -= row[1]
+            connection.executemany("DELETE FROM lists WHERE rowid = ?", evicted)
+        self.evictions += len(evicted)
+        _evictions.inc(len(evicted))
+
+    def invalidate(self, user_id: str, collection: str):
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM lists WHERE user_id = ? AND collection = ?", (user_id, collection))
+
+    def stats(self) -> dict:
+        entries, size = self._connection().execute("SELECT count(*), total(size) FROM lists").fetchone()
+        return {"entries": entries, "bytes": int(size), "evictions": self.evictions}
+
+    def clear(self):
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM lists")
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")  # A cache can lose writes on a crash
+            connection.execute("PRAGMA busy_timeout=5000")
+            self._local.connection = connection
+        return connection
+
+    @contextmanager
+    def _transaction(self):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+
+class RedisListCache(ListCache):
+    """
+    Redis, shared by every worker on every host. Configure the server with maxmemory and
+    maxmemory-policy allkeys-lru to bound it; entries also expire after ttl seconds.
+    :param url: The Redis URL.
+    :param ttl: Seconds an entry is kept.
+    """
+
+    def __init__(self, url: str = LIST_CACHE_REDIS_URL, ttl: int = LIST_CACHE_TTL):
+        import redis
+        self._client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def get(self, user_id: str, collection: str, key: str) -> Optional[bytes]:
+        return self._client.get(self._name(user_id, collection, key))
+
+    def set(self, user_id: str, collection: str, key: str, body: bytes):
+        # A set per user collection lists its entries, for invalidation
+        index = self._name(user_id, collection)
+        name = self._name(user_id, collection, key)
+        pipeline = self._client.pipeline()
+        pipeline.set(name, body, ex=self.ttl)
+        pipeline.sadd(index, name)
+        pipeline.expire(index, self.ttl)
+        pipeline.execute()
+
+    def invalidate(self, user_id: str, collection: str):
+        index = self._name(user_id, collection)
+        names = self._client.smembers(index)
+        self._client.delete(index, *names)
+
+    def stats(self) -> dict:
+        return {"evictions": self._client.info("stats").get("evicted_keys", 0)}
+
+    def clear(self):
+        for name in self._client.scan_iter("lists:*"):
+            self._client.delete(name)
+
+    @staticmethod
+    def _name(*parts: str) -> str:
+        return "lists:" + ":".join(parts)
+
+
+def _size(body: bytes) -> int:
+    return len(body) + ENTRY_OVERHEAD
+
+
+# Create a list cache by name
+def create_list_cache(backend: str = LIST_CACHE_BACKEND) -> Optional[ListCache]:
+    """
+    Create the list cache selected by configuration.
+    :param backend: "memory", "sqlite", "redis" or "none".
+    :return: A ListCache instance, or None when caching is disabled.
+    """
+    if backend == "memory":
+        return MemoryListCache()
+    if backend == "sqlite":
+        return SQLiteListCache()
+    if backend == "redis":
+        return RedisListCache()
+    if backend == "none":
+        return None
+    raise ValueError(f"Unknown LIST_CACHE_BACKEND: {backend!r}")
+
+
+_cache: Optional[ListCache] = None
+_created_pid: Optional[int] = None
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+_hits, _misses = cache_counters("lists")
+
+
+# Get the process-wide list cache, creating it on first use (and again in a forked worker)
+def get_list_cache() -> Optional[ListCache]:
+    global _cache, _created_pid
+    if _created_pid != os.getpid():
+        with _lock:
+            if _created_pid != os.getpid():
+                _cache = create_list_cache()
+                _created_pid = os.getpid()
+    return _cache
+
+# Replace the list cache (tests and benchmarks); None disables caching
+def set_list_cache(cache: Optional[ListCache]):
+    global _cache, _created_pid
+    with _lock:
+        _cache = cache
+        _created_pid = os.getpid()
+
+# Serialize a response body as FastAPI's JSONResponse does
+def encode_body(body: dict) -> bytes:
+    return json.dumps(body, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+# Get a list response from the cache, building it on a miss
+def cached_list(user_id: str, collection: str, key: str, build: Callable[..., dict], *args) -> bytes:
+    """
+    Return the serialized response for key, calling build(*args) only on a miss.
+    :param user_id: The ID of the authenticated user.
+    :param collection: The collection listed.
+    :param key: Names the request, including the collection version (e.g. its ETag).
+    :param build: Reads the list and returns the response body.
+    :return: The JSON body.
+    """
+    cache = get_list_cache()
+    if cache is None:
+        return encode_body(build(*args))
+
+    body = cache.get(user_id, collection, key)
+    if body is not None:
+        with _lock:
+            _stats["hits"] += 1
+        _hits.inc()
+        return body
+
+    with _lock:
+        _stats["misses"] += 1
+    _misses.inc()
+    body = encode_body(build(*args))
+    cache.set(user_id, collection, key, body)
+    return body
+
+# Drop a user's cached lists of a collection after a write
+def invalidate_lists(user_id: str, collection: str):
+    cache = get_list_cache()
+    if cache is None:
+        return
+    cache.invalidate(user_id, collection)
+    with _lock:
+        _stats["invalidations"] += 1
+
+# List cache statistics
+def get_list_cache_stats() -> dict:
+    """
+    Snapshot of this process's hits, misses and invalidations, with the backend's own counters.
+    """
+    cache = get_list_cache()
+    with _lock:
+        stats = dict(_stats)
+    if cache is not None:
+        stats.update(cache.stats())
+    return stats
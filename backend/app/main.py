@@ -1,14 +1,71 @@
-from fastapi import FastAPI, HTTPException, Depends
-from app.users import register_user, login_user, get_user_details, update_user_info, delete_user
-from app.items import add_item, get_items, update_item, delete_item, get_item
-from app.submissions import add_submission, get_submissions, update_submission, delete_submission, get_submission
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, BackgroundTasks, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+from app.users import register_user, login_user, refresh_user_token, get_user_details, update_user_info, delete_user
+from app.documents import document_etag, parse_if_match
+from app.idempotency import run_idempotent
+from app.items import add_item, list_items, update_item, delete_item, get_item, batch_items, export_items, ITEM_EXPORT_FIELDS
+from app.submissions import (
+    add_submission, list_submissions, update_submission, delete_submission, get_submission, batch_submissions,
+    export_submissions, SUBMISSION_EXPORT_FIELDS
+)
 from app.auth import get_current_user
-from app.models import User, Item, Submission, LoginRequest
-from app.database import db
-from typing import Optional
+from app.database import warm_storage
+from app.key_management import get_keyring
+from app.jobs import run_user_data_deletion_job
+from app.ratings import get_item_ratings
+from app.recommendations import get_recommendations, DEFAULT_RECOMMENDATIONS, MAX_RECOMMENDATIONS
+from app.weather import get_weather, WeatherUnavailable
+from app.models import User, Item, Submission, LoginRequest, RefreshRequest, CurrentUser, BatchRequest, SubmissionBatchRequest
+from app.config import THREADPOOL_SIZE, INSTRUMENTATION, METRICS
+from app.instrumentation import TimingMiddleware
+from app.metrics import MetricsMiddleware, render_metrics, mark_process_dead
+from app.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.export import export_response
+from app.storage.base import TransactionConflict
+from app.versions import check_etag, etag_headers
+from app.list_cache import cached_list
+from typing import Optional, Literal
+import anyio
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The Firestore client is synchronous, so handlers offload every call to a
+    # worker thread; size the pool so concurrent requests can overlap their I/O.
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+
+    # Nothing is loaded or connected at import time: load the signing keys and create and
+    # connect the storage client here, before taking traffic, not on the first request
+    await run_in_threadpool(get_keyring)
+    await run_in_threadpool(warm_storage)
+    yield
+    mark_process_dead()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Seconds clients are asked to wait (Retry-After) before retrying a write refused on contention
+TRANSACTION_RETRY_AFTER = "1"
+
+# Server-Timing header and one structured log line per request
+if INSTRUMENTATION:
+    app.add_middleware(TimingMiddleware)
+
+# Per-route request counts, status codes and latency histograms for /metrics
+if METRICS:
+    app.add_middleware(MetricsMiddleware)
+
+# A transaction that still conflicted after every attempt: the documents it needs are busy,
+# so the client should try again shortly
+@app.exception_handler(TransactionConflict)
+async def transaction_conflict_handler(request: Request, exc: TransactionConflict):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "The data is being modified concurrently, try again"},
+        headers={"Retry-After": TRANSACTION_RETRY_AFTER},
+    )
 
 
 ########################################################################################################################
@@ -18,7 +75,7 @@ app = FastAPI()
 async def register_user_route(user: User):
     user_data = user.model_dump()  # Use model_dump to handle Pydantic model
     try:
-        user_id = register_user(user_data)
+        user_id = await run_in_threadpool(register_user, user_data)
         return {"message": "User created successfully", "user_id": user_id}
     except HTTPException as e:
         raise e
@@ -27,106 +84,258 @@ async def register_user_route(user: User):
 @app.post("/tokens/")
 async def login_user_route(login_data: LoginRequest):
     user_data = login_data.model_dump()
-    token = login_user(user_data)
-    return {"access_token": token, "token_type": "bearer"}
+    return await run_in_threadpool(login_user, user_data)
+
+# Renew the tokens with a refresh token (no password check)
+@app.post("/tokens/refresh")
+async def refresh_token_route(refresh_data: RefreshRequest):
+    return await run_in_threadpool(refresh_user_token, refresh_data.refresh_token)
 
 
 # Get current user information
 @app.get("/users/me/")
-async def get_user_info_route(current_user: str = Depends(get_current_user)):
-    user_info = get_user_details(current_user)
+async def get_user_info_route(current_user: CurrentUser = Depends(get_current_user)):
+    user_info = await run_in_threadpool(get_user_details, current_user.id)
     return user_info
 
 # Update user details
 @app.put("/users/me/")
-async def update_user_info_route(user: User, current_user: str = Depends(get_current_user)):
-    user_ref = db.collection("users").where("username", "==", current_user).stream()
-    user_data = next(user_ref, None)
-
-    if user_data is None:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    user_id = user_data.id
-    update_data = user.dict()  # Use the data provided in the update
-    return update_user_info(user_id, update_data)
+async def update_user_info_route(user: User, current_user: CurrentUser = Depends(get_current_user)):
+    update_data = user.model_dump()  # Use the data provided in the update
+    return await run_in_threadpool(update_user_info, current_user.id, update_data)
 
 
 # Delete current user account
 @app.delete("/users/me/")
-async def delete_user_route(current_user: str = Depends(get_current_user)):
-    return delete_user(current_user)
+async def delete_user_route(background_tasks: BackgroundTasks, current_user: CurrentUser = Depends(get_current_user)):
+    result = await run_in_threadpool(delete_user, current_user.id)
+    # Remove the user's items and submissions after responding
+    background_tasks.add_task(run_user_data_deletion_job, result["job_id"])
+    return result
 
 
 ########################################################################################################################
 
 # Add an item (Requires Authentication)
 @app.post("/items/")
-async def add_item_route(item: Item, username: str = Depends(get_current_user)):
-    item_id = add_item(item.dict(), username)
-    return {"message": "Item added successfully", "id": item_id}
+async def add_item_route(
+    item: Item,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    def create():
+        item_id = add_item(item.model_dump(), current_user.id)
+        return {"message": "Item added successfully", "id": item_id}
+
+    # A retry with the same Idempotency-Key gets the first response, without a second item
+    result, replayed = await run_in_threadpool(run_idempotent, current_user.id, "items", idempotency_key, item.model_dump(), create)
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
 
-# Get all items (Requires Authentication)
+# Get all items, or the items with the given IDs (Requires Authentication)
 @app.get("/items/")
-async def get_items_route(username: str = Depends(get_current_user)):
-    items = get_items(username)
-    return {"items": items}
+async def get_items_route(
+    request: Request,
+    current_user: CurrentUser = Depends(get_current_user),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    page_token: Optional[str] = None,
+    fields: Optional[str] = None,  # Comma-separated fields to return
+    ids: Optional[str] = None  # Comma-separated item IDs to read in one round trip
+):
+    # Polling clients with a current copy get a 304 after one small read
+    etag, unchanged = await run_in_threadpool(check_etag, request, current_user.id, "items")
+    if unchanged is not None:
+        return unchanged
+
+    # The ETag names this version of the list, so it is also the cache key
+    body = await run_in_threadpool(
+        cached_list, current_user.id, "items", etag, list_items, current_user.id, limit, page_token, fields, ids
+    )
+    return Response(body, media_type="application/json", headers=etag_headers(etag))
+
+# Create, update and delete several items at once (Requires Authentication)
+@app.post("/items:batch")
+async def batch_items_route(batch: BatchRequest, current_user: CurrentUser = Depends(get_current_user)):
+    results = await run_in_threadpool(batch_items, batch.operations, current_user.id)
+    return {"results": results}
+
+# Export all items as NDJSON or CSV (Requires Authentication)
+@app.get("/items/export")
+async def export_items_route(
+    current_user: CurrentUser = Depends(get_current_user),
+    format: Literal["ndjson", "csv"] = "ndjson",
+    gzip: bool = False
+):
+    pages = export_items(current_user.id)
+    return export_response(pages, ITEM_EXPORT_FIELDS, format, gzip, "items")
 
 # Get an item (Requires Authentication)
 @app.get("/items/{item_id}")
-async def get_item_route(item_id: str, username: str = Depends(get_current_user)):
-    item = get_item(item_id, username)
+async def get_item_route(item_id: str, response: Response, current_user: CurrentUser = Depends(get_current_user)):
+    item, version = await run_in_threadpool(get_item, item_id, current_user.id)
+    response.headers["ETag"] = document_etag(version)
     return {"item": item}
 
-# Update an item (Requires Authentication)
+# Update an item (Requires Authentication); with If-Match, only the version the client read
 @app.put("/items/{item_id}/")
-async def update_item_route(item_id: str, update_data: dict, username: str = Depends(get_current_user)):
-    return update_item(item_id, update_data, username)
+async def update_item_route(
+    item_id: str,
+    update_data: dict,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    result, version = await run_in_threadpool(update_item, item_id, update_data, current_user.id, parse_if_match(if_match))
+    response.headers["ETag"] = document_etag(version)
+    return result
 
 # Delete an item (Requires Authentication)
 @app.delete("/items/{item_id}/")
-async def delete_item_route(item_id: str, username: str = Depends(get_current_user)):
-    return delete_item(item_id, username)
+async def delete_item_route(item_id: str, if_match: Optional[str] = Header(None), current_user: CurrentUser = Depends(get_current_user)):
+    return await run_in_threadpool(delete_item, item_id, current_user.id, parse_if_match(if_match))
+
+# Get the rating summary of an item (Requires Authentication)
+@app.get("/items/{item_id}/ratings")
+async def get_item_ratings_route(item_id: str, current_user: CurrentUser = Depends(get_current_user)):
+    return await run_in_threadpool(get_item_ratings, item_id, current_user.id)
 
 
 ########################################################################################################################
 
 # Add a submission (Requires Authentication)
 @app.post("/submissions/")
-async def add_submission_route(submission: Submission, username: str = Depends(get_current_user)):
-    submission_id = add_submission(submission.dict(), username)
-    return {"message": "Submission added successfully", "id": submission_id}
+async def add_submission_route(
+    submission: Submission,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    def create():
+        submission_id = add_submission(submission.model_dump(), current_user.id)
+        return {"message": "Submission added successfully", "id": submission_id}
+
+    # A retry with the same Idempotency-Key gets the first response, without counting the rating twice
+    result, replayed = await run_in_threadpool(
+        run_idempotent, current_user.id, "submissions", idempotency_key, submission.model_dump(), create
+    )
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
+# Create, update and delete several submissions at once (Requires Authentication)
+@app.post("/submissions:batch")
+async def batch_submissions_route(batch: SubmissionBatchRequest, current_user: CurrentUser = Depends(get_current_user)):
+    results = await run_in_threadpool(batch_submissions, batch.operations, current_user.id)
+    return {"results": results}
+
+# Export all submissions as NDJSON or CSV, optionally filtered by item_id (Requires Authentication)
+@app.get("/submissions/export")
+async def export_submissions_route(
+    current_user: CurrentUser = Depends(get_current_user),
+    item_id: Optional[str] = None,
+    format: Literal["ndjson", "csv"] = "ndjson",
+    gzip: bool = False
+):
+    pages = export_submissions(current_user.id, item_id)
+    return export_response(pages, SUBMISSION_EXPORT_FIELDS, format, gzip, "submissions")
 
 # Get a specific submission (Requires Authentication)
 @app.get("/submissions/{submission_id}")
 async def get_submission_route(
     submission_id: str,
-    username: str = Depends(get_current_user)
+    response: Response,
+    current_user: CurrentUser = Depends(get_current_user)
 ):
-    submission = get_submission(username, submission_id)
+    submission, version = await run_in_threadpool(get_submission, current_user.id, submission_id)
+    response.headers["ETag"] = document_etag(version)
     return {"submission": submission}
 
 
-# Get all submissions for a user or filter by item_id (Requires Authentication)
+# Get all submissions for a user or filter by item_id, or the submissions with the given IDs (Requires Authentication)
 @app.get("/submissions/")
 async def get_submissions_route(
-    username: str = Depends(get_current_user), 
-    item_id: Optional[str] = None  # Make item_id optional as a query parameter
+    request: Request,
+    current_user: CurrentUser = Depends(get_current_user), 
+    item_id: Optional[str] = None,  # Make item_id optional as a query parameter
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    page_token: Optional[str] = None,
+    fields: Optional[str] = None,  # Comma-separated fields to return
+    ids: Optional[str] = None  # Comma-separated submission IDs to read in one round trip
 ):
-    submissions = get_submissions(username, item_id)
-    return {"submissions": submissions}
+    # Polling clients with a current copy get a 304 after one small read
+    etag, unchanged = await run_in_threadpool(check_etag, request, current_user.id, "submissions")
+    if unchanged is not None:
+        return unchanged
 
+    # The ETag names this version of the list, so it is also the cache key
+    body = await run_in_threadpool(
+        cached_list, current_user.id, "submissions", etag, list_submissions,
+        current_user.id, item_id, limit, page_token, fields, ids
+    )
+    return Response(body, media_type="application/json", headers=etag_headers(etag))
 
-# Update a submission (Requires Authentication)
+
+# Update a submission (Requires Authentication); with If-Match, only the version the client read
 @app.put("/submissions/{submission_id}/")
-async def update_submission_route(submission_id: str, update_data: dict, username: str = Depends(get_current_user)):
-    return update_submission(submission_id, update_data, username)
+async def update_submission_route(
+    submission_id: str,
+    update_data: dict,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    result, version = await run_in_threadpool(
+        update_submission, submission_id, update_data, current_user.id, parse_if_match(if_match)
+    )
+    # A rating change is written in a transaction, which does not report the new version
+    if version is not None:
+        response.headers["ETag"] = document_etag(version)
+    return result
 
 # Delete a submission (Requires Authentication)
 @app.delete("/submissions/{submission_id}/")
-async def delete_submission_route(submission_id: str, username: str = Depends(get_current_user)):
-    result = delete_submission(submission_id, username)
+async def delete_submission_route(submission_id: str, if_match: Optional[str] = Header(None), current_user: CurrentUser = Depends(get_current_user)):
+    result = await run_in_threadpool(delete_submission, submission_id, current_user.id, parse_if_match(if_match))
     if result:
         return {"message": "Submission deleted successfully"}
     else:
         raise HTTPException(status_code=404, detail="Submission not found")
 
+
+
+########################################################################################################################
+
+# Rank the user's items for a place and its weather (Requires Authentication)
+@app.get("/recommendations/")
+async def get_recommendations_route(
+    city: str,
+    country: str,
+    condition: Optional[str] = None,
+    temperature: Optional[float] = None,
+    limit: int = Query(DEFAULT_RECOMMENDATIONS, ge=1, le=MAX_RECOMMENDATIONS),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    return await run_in_threadpool(get_recommendations, current_user.id, city, country, condition, temperature, limit)
+
+# Get the current weather of a place (Requires Authentication)
+@app.get("/weather/")
+async def get_weather_route(city: str, country: str, current_user: CurrentUser = Depends(get_current_user)):
+    try:
+        weather = await run_in_threadpool(get_weather, city, country)
+    except WeatherUnavailable:
+        raise HTTPException(status_code=503, detail="Weather service unavailable", headers={"Retry-After": "30"})
+    if weather is None:
+        raise HTTPException(status_code=404, detail="Weather not found for this place")
+    return weather
+
+
+########################################################################################################################
+
+# Prometheus metrics (aggregated across workers in multiprocess mode)
+if METRICS:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics_route():
+        body, content_type = await run_in_threadpool(render_metrics)
+        return Response(content=body, media_type=content_type)
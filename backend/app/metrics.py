@@ -0,0 +1,113 @@
+#app/metrics.py
+from app.config import PROMETHEUS_MULTIPROC_DIR
+from app.instrumentation import add_observer
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, multiprocess
+)
+import os
+import time
+
+# Storage round trips and password hashes are much faster than whole requests
+OPERATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0)
+
+REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route and status code", ["method", "route", "status"]
+)
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ["method", "route"]
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "HTTP requests being handled", ["method"], multiprocess_mode="livesum"
+)
+OPERATION_DURATION = Histogram(
+    "app_operation_duration_seconds",
+    "Duration of storage round trips (db-*), auth checks and password hashes",
+    ["operation"],
+    buckets=OPERATION_BUCKETS,
+)
+CACHE_LOOKUPS = Counter(
+    "app_cache_lookups_total", "In-process cache lookups by cache and result (hit or miss)", ["cache", "result"]
+)
+CACHE_EVICTIONS = Counter(
+    "app_cache_evictions_total", "Entries evicted from a size-bounded cache to make room", ["cache"]
+)
+HASH_QUEUE_DEPTH = Gauge(
+    "app_hash_queue_depth", "Password hashes waiting for a hashing thread", multiprocess_mode="livesum"
+)
+HASH_IN_FLIGHT = Gauge(
+    "app_hashes_in_flight", "Password hashes being computed", multiprocess_mode="livesum"
+)
+HASH_REJECTED = Counter(
+    "app_hash_rejected_total", "Password hashes refused with a 503 because the hashing pool and queue were full"
+)
+
+# Label children are looked up once and reused, keeping the hot path to a single increment
+_operation_histograms = {}
+
+
+def _observe_operation(name: str, seconds: float):
+    histogram = _operation_histograms.get(name)
+    if histogram is None:
+        histogram = _operation_histograms[name] = OPERATION_DURATION.labels(name)
+    histogram.observe(seconds)
+
+add_observer(_observe_operation)
+
+# Counters for one cache's hits and misses
+def cache_counters(cache: str):
+    """
+    :param cache: The cache name used as the "cache" label.
+    :return: (hits, misses) counters to increment on each lookup.
+    """
+    return CACHE_LOOKUPS.labels(cache, "hit"), CACHE_LOOKUPS.labels(cache, "miss")
+
+# Render all metrics in the Prometheus text format
+def render_metrics():
+    """
+    :return: (body, content type). In multiprocess mode the samples of every worker are aggregated.
+    """
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+# Drop this process's live gauges when it exits
+def mark_process_dead():
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+class MetricsMiddleware:
+    """ASGI middleware that counts requests and observes their latency per route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_progress = REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_progress.dec()
+            # Label by route template, never by raw path, to keep label cardinality bounded
+            route = getattr(scope.get("route"), "path", "<unmatched>")
+            REQUESTS.labels(method, route, str(status)).inc()
+            REQUEST_DURATION.labels(method, route).observe(elapsed)
@@ -0,0 +1,178 @@
+#app/migration.py
+from app.config import MIGRATION_RATE
+from app.database import get_storage
+from app.export import iter_pages
+from app.layout import copy_documents, get_data_layout
+from typing import Callable, Dict, Iterator, Optional
+import datetime
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# The migration from the flat layout to the nested one (see app.layout) runs while the
+# app serves traffic, in the dual layout:
+#   1. run every worker with DATA_LAYOUT=dual, so new writes reach both layouts;
+#   2. migrate-layout copies each user's documents, resuming where it stopped;
+#   3. verify-layout compares each user's document counts in both layouts;
+#   4. run every worker with DATA_LAYOUT=nested.
+# Progress is recorded on a job document, so an interrupted run carries on from its last page.
+MIGRATION_JOB_ID = "migrate_layout"
+MIGRATION_PAGE_SIZE = 200
+USER_PAGE_SIZE = 500
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+class _Throttle:
+    """Keeps the average pace at or below rate units per second, sleeping when ahead."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._start = time.monotonic()
+        self._done = 0
+
+    def wait(self, units: int):
+        if self.rate <= 0:
+            return
+        self._done += units
+        ahead = self._done / self.rate - (time.monotonic() - self._start)
+        if ahead > 0:
+            time.sleep(ahead)
+
+# Stream user IDs in ID order, starting with (and including) first
+def _user_ids(first: Optional[str]) -> Iterator[str]:
+    users = get_storage().users
+    if first is not None:
+        yield first
+    last_id = first
+    while True:
+        page = list(users.query(limit=USER_PAGE_SIZE, start_after=last_id, fields=[]))
+        if not page:
+            return
+        for user in page:
+            yield user["id"]
+        last_id = page[-1]["id"]
+
+# Copy one user's documents of a collection to the nested layout
+def _migrate_user_collection(collection: str, user_id: str, after: Optional[str], throttle: _Throttle,
+                             counts: dict, checkpoint: Callable[[str], None]):
+    storage = get_storage()
+    flat = storage.repository(collection)
+
+    while True:
+        page = [
+            document["id"]
+            for document in flat.query({"user_id": user_id}, limit=MIGRATION_PAGE_SIZE, start_after=after, fields=[])
+        ]
+        if not page:
+            break
+        counts["copied"][collection] += copy_documents(collection, user_id, page)
+        after = page[-1]
+        checkpoint(after)
+        throttle.wait(len(page))
+
+    # Drop nested copies whose flat document is gone, e.g. deleted by a worker not yet in dual mode
+    for page in iter_pages(storage.owned(collection, user_id), {}, [], MIGRATION_PAGE_SIZE):
+        doc_ids = [document["id"] for document in page]
+        existing = flat.get_many(doc_ids)
+        stale = [doc_id for doc_id in doc_ids if existing.get(doc_id, {}).get("user_id") != user_id]
+        if stale:
+            copy_documents(collection, user_id, stale)
+            counts["removed"][collection] += len(stale)
+        throttle.wait(len(page))
+
+# Copy every user's items and submissions to the nested layout
+def migrate_layout(rate: float = MIGRATION_RATE, restart: bool = False) -> dict:
+    """
+    Copy the documents of every user, one page at a time, from the flat collections to the
+    user's own. Safe to run while the app serves traffic in the dual layout, and to run
+    again: an interrupted run resumes after the last page it copied, and a finished one
+    does nothing unless restarted. Documents of users that no longer exist are not copied.
+    :param rate: The most documents to copy per second (0 for no limit).
+    :param restart: Start over from the first user, e.g. to re-copy after failed dual writes.
+    :return: The job document: status, counts of documents "copied" and "removed" per collection.
+    """
+    if get_data_layout() != "dual":
+        raise RuntimeError("Run the migration with DATA_LAYOUT=dual, once every worker writes to both layouts")
+
+    storage = get_storage()
+    jobs = storage.jobs
+    job = jobs.get(MIGRATION_JOB_ID)
+    if job is None or restart:
+        empty = {collection: 0 for collection in storage.OWNED_COLLECTIONS}
+        job = {
+            "id": MIGRATION_JOB_ID,
+            "type": "migrate_layout",
+            "status": "running",
+            "cursor": None,
+            "copied": dict(empty),
+            "removed": dict(empty),
+            "created_at": _now(),
+            "updated_at": _now(),
+        }
+        jobs.set(MIGRATION_JOB_ID, job)
+    elif job["status"] == "done":
+        logger.info("The layout migration has already finished; restart it to copy everything again")
+        return job
+    else:
+        jobs.update(MIGRATION_JOB_ID, {"status": "running", "updated_at": _now()})
+
+    counts: Dict[str, dict] = {"copied": dict(job["copied"]), "removed": dict(job["removed"])}
+    cursor = job["cursor"]
+    throttle = _Throttle(rate)
+
+    try:
+        for user_id in _user_ids(cursor["user_id"] if cursor else None):
+            for index, collection in enumerate(storage.OWNED_COLLECTIONS):
+                after = None
+                if cursor is not None and cursor["user_id"] == user_id:
+                    # Carry on within the user where the last run stopped
+                    resume_index = storage.OWNED_COLLECTIONS.index(cursor["collection"])
+                    if index < resume_index:
+                        continue
+                    if index == resume_index:
+                        after = cursor["after"]
+
+                def checkpoint(last_id, user_id=user_id, collection=collection):
+                    jobs.update(MIGRATION_JOB_ID, {
+                        "cursor": {"user_id": user_id, "collection": collection, "after": last_id},
+                        **counts,
+                        "updated_at": _now(),
+                    })
+
+                _migrate_user_collection(collection, user_id, after, throttle, counts, checkpoint)
+
+        jobs.update(MIGRATION_JOB_ID, {"status": "done", "cursor": None, **counts, "updated_at": _now()})
+    except Exception:
+        logger.exception("The layout migration failed; run it again to resume")
+        jobs.update(MIGRATION_JOB_ID, {"status": "failed", **counts, "updated_at": _now()})
+        raise
+
+    logger.info("Migrated to the nested layout: %s", counts)
+    return jobs.get(MIGRATION_JOB_ID)
+
+# Compare the number of documents of every user in both layouts
+def verify_layout() -> dict:
+    """
+    Count each user's items and submissions in the flat and the nested layout.
+    :return: {"users": users checked, "documents": flat documents per collection,
+        "mismatches": [{"user_id", "collection", "flat", "nested"}, ...]}.
+    """
+    storage = get_storage()
+    result = {"users": 0, "documents": {collection: 0 for collection in storage.OWNED_COLLECTIONS}, "mismatches": []}
+
+    for user_id in _user_ids(None):
+        result["users"] += 1
+        for collection in storage.OWNED_COLLECTIONS:
+            flat = sum(1 for _ in storage.repository(collection).query({"user_id": user_id}, fields=[]))
+            nested = sum(1 for _ in storage.owned(collection, user_id).query(fields=[]))
+            result["documents"][collection] += flat
+            if flat != nested:
+                result["mismatches"].append({"user_id": user_id, "collection": collection, "flat": flat, "nested": nested})
+
+    if result["mismatches"]:
+        logger.warning("%d document counts differ between the layouts", len(result["mismatches"]))
+    return result
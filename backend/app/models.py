@@ -1,7 +1,13 @@
 #app/models.py
 
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import Optional, List, Literal
+from app.storage.base import MAX_TRANSACTION_WRITES
+
+# A batch is committed in one transaction, so its writes must fit in one commit
+MAX_BATCH_OPERATIONS = MAX_TRANSACTION_WRITES
+# Each submission also writes (at most) one shard of its item's rating aggregate
+MAX_SUBMISSION_BATCH_OPERATIONS = MAX_TRANSACTION_WRITES // 2
 
 
 class LoginRequest(BaseModel):
@@ -9,6 +15,10 @@ class LoginRequest(BaseModel):
     password: str
 
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+
 class User(BaseModel):
     username: str
     email: str
@@ -24,4 +34,22 @@ class Submission(BaseModel):
     city: str
     country: str
     rating: int   # 0 - 100 
+    condition: Optional[str] = None      # Weather when the item was worn, e.g. "rain", "clear"
+    temperature: Optional[float] = None  # Degrees Celsius when the item was worn
+
+
+class CurrentUser(BaseModel):
+    id: str
+    username: str
+
+
+class BatchOperation(BaseModel):
+    op: Literal["create", "update", "delete"]
+    id: Optional[str] = None      # Required for update and delete
+    data: Optional[dict] = None   # Required for create and update
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation] = Field(min_length=1, max_length=MAX_BATCH_OPERATIONS)
 
+class SubmissionBatchRequest(BaseModel):
+    operations: List[BatchOperation] = Field(min_length=1, max_length=MAX_SUBMISSION_BATCH_OPERATIONS)
@@ -0,0 +1,63 @@
+#app/pagination.py
+from fastapi import HTTPException
+from app.storage.base import Repository
+from typing import Optional, List
+import base64
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+# Page tokens are the URL-safe encoding of the last document ID on the page
+def encode_page_token(document_id: str) -> str:
+    return base64.urlsafe_b64encode(document_id.encode()).decode().rstrip("=")
+
+def decode_page_token(page_token: str) -> str:
+    try:
+        padding = "=" * (-len(page_token) % 4)
+        return base64.urlsafe_b64decode(page_token + padding).decode()
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid page token")
+
+# Parse a comma-separated fields parameter
+def parse_fields(fields: Optional[str], allowed_fields: set) -> Optional[List[str]]:
+    """
+    Turn a `fields=a,b` query parameter into a projection list.
+    :param fields: The raw parameter, or None for all fields.
+    :param allowed_fields: The fields clients may request.
+    :return: The list of fields to select (always including "id"), or None.
+    """
+    if not fields:
+        return None
+
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = set(requested) - allowed_fields
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    if "id" not in requested:
+        requested.append("id")
+    return requested
+
+# Run one page of a query
+def paginate(repository: Repository, filters: dict, limit: int, page_token: Optional[str] = None, fields: Optional[List[str]] = None):
+    """
+    Fetch one page of a query, ordered by document ID.
+    :param repository: The repository to query.
+    :param filters: The equality filters to apply.
+    :param limit: The maximum number of documents to return.
+    :param page_token: The token returned with the previous page, if any.
+    :param fields: The fields to project, or None for whole documents.
+    :return: A tuple of (documents as dicts, next page token or None).
+    """
+    start_after = decode_page_token(page_token) if page_token else None
+
+    # Fetch one extra document to know whether another page exists
+    documents = list(repository.query(filters, limit=limit + 1, start_after=start_after, fields=fields))
+
+    next_page_token = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_page_token = encode_page_token(documents[-1]["id"])
+
+    return documents, next_page_token
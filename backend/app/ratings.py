@@ -0,0 +1,163 @@
+#app/ratings.py
+from fastapi import HTTPException
+from app.config import RATING_SHARDS
+from app.database import get_storage
+from app.layout import iter_all_pages, owned_repository
+from app.storage.base import Transaction
+from typing import Iterable, List, Optional, Tuple
+import logging
+import math
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# Ratings run from 0 to 100: ten buckets of width 10, the last one also holding 100
+HISTOGRAM_BUCKETS = 10
+REBUILD_PAGE_SIZE = 1000
+REBUILD_WRITE_SIZE = 500
+
+
+# Each item's aggregate is split over RATING_SHARDS documents, ratings/{item_id}:{shard}, so
+# concurrent ratings of one item mostly write different documents instead of all contending
+# on one. A submission always counts in the same shard; reads add the shards up. A document
+# with the item's ID alone is an aggregate written before sharding, still counted until
+# rebuild-ratings replaces it.
+def _shard_id(item_id: str, submission_id: str) -> str:
+    return f"{item_id}:{zlib.crc32(submission_id.encode()) % RATING_SHARDS}"
+
+def _aggregate_ids(item_id: str) -> List[str]:
+    return [item_id] + [f"{item_id}:{shard}" for shard in range(RATING_SHARDS)]
+
+def _empty(doc_id: str, item_id: Optional[str] = None) -> dict:
+    return {
+        "id": doc_id, "item_id": item_id or doc_id,
+        "count": 0, "sum": 0, "sum_squares": 0, "histogram": [0] * HISTOGRAM_BUCKETS,
+    }
+
+def _is_empty(aggregate: dict) -> bool:
+    return not (aggregate["count"] or aggregate["sum"] or aggregate["sum_squares"] or any(aggregate["histogram"]))
+
+def _bucket(rating: int) -> int:
+    return min(max(rating, 0) // 10, HISTOGRAM_BUCKETS - 1)
+
+def _add(aggregate: dict, rating: int, sign: int):
+    aggregate["count"] += sign
+    aggregate["sum"] += sign * rating
+    aggregate["sum_squares"] += sign * rating * rating
+    aggregate["histogram"][_bucket(rating)] += sign
+
+# Apply rating changes to the per-item aggregates within a transaction
+def apply_rating_changes(transaction: Transaction,
+                         changes: Iterable[Tuple[str, str, Optional[int], Optional[int]]]):
+    """
+    Read the affected aggregate shards and write them back with the changes applied.
+    It reads, so call it before the transaction's other writes.
+    A shard whose counts all drop to zero is deleted.
+    :param transaction: The transaction that also writes the submissions.
+    :param changes: (item_id, submission_id, rating removed or None, rating added or None) per
+                    submission, e.g. (item_id, submission_id, None, 80) for a new submission rated 80.
+    """
+    changes = [
+        (_shard_id(item_id, submission_id), item_id, old, new)
+        for item_id, submission_id, old, new in changes if item_id and old != new
+    ]
+    if not changes:
+        return
+
+    ratings = get_storage().ratings
+    aggregates = transaction.get_many(ratings, {shard_id for shard_id, _, _, _ in changes})
+
+    for shard_id, item_id, old, new in changes:
+        aggregate = aggregates.setdefault(shard_id, _empty(shard_id, item_id))
+        if old is not None:
+            _add(aggregate, old, -1)
+        if new is not None:
+            _add(aggregate, new, 1)
+
+    for shard_id, aggregate in aggregates.items():
+        if _is_empty(aggregate):
+            transaction.delete(ratings, shard_id)
+        else:
+            transaction.set(ratings, shard_id, aggregate)
+
+# Read an item's aggregate, adding up its shards
+def get_item_aggregate(item_id: str) -> Optional[dict]:
+    """
+    :param item_id: The ID of the item.
+    :return: The item's count, sums and histogram, or None if it has no ratings.
+    """
+    shards = get_storage().ratings.get_many(_aggregate_ids(item_id))
+    if not shards:
+        return None
+    aggregate = _empty(item_id)
+    for shard in shards.values():
+        for field in ("count", "sum", "sum_squares"):
+            aggregate[field] += shard[field]
+        aggregate["histogram"] = [total + count for total, count in zip(aggregate["histogram"], shard["histogram"])]
+    return aggregate
+
+# Summarize an aggregate document
+def summarize(item_id: str, aggregate: Optional[dict]) -> dict:
+    aggregate = aggregate or _empty(item_id)
+    count = aggregate["count"]
+    mean = aggregate["sum"] / count if count else None
+    stddev = math.sqrt(max(aggregate["sum_squares"] / count - mean * mean, 0.0)) if count else None
+    return {
+        "item_id": item_id,
+        "count": count,
+        "mean": mean,
+        "stddev": stddev,
+        "sum": aggregate["sum"],
+        "sum_squares": aggregate["sum_squares"],
+        "histogram": aggregate["histogram"],
+    }
+
+# Get the rating summary of an item
+def get_item_ratings(item_id: str, user_id: str) -> dict:
+    """
+    Read the precomputed rating aggregate of one of the user's items.
+    :param item_id: The ID of the item.
+    :param user_id: The ID of the authenticated user.
+    :return: The count, mean, standard deviation, sums and histogram of the item's ratings.
+    """
+    item = owned_repository("items", user_id).get(item_id)
+    if item is None or item["user_id"] != user_id:
+        raise HTTPException(status_code=404, detail="Item not found")
+
+    return summarize(item_id, get_item_aggregate(item_id))
+
+# Recompute every aggregate from the submissions
+def rebuild_ratings() -> int:
+    """
+    Scan all submissions, rewrite every item's aggregate shards and delete the
+    others (of items that no longer have submissions, unsharded aggregates, and
+    shards beyond a lowered RATING_SHARDS). Submissions written during the scan
+    may be missed, so run it while writes are paused (e.g. for a backfill).
+    :return: The number of items with ratings.
+    """
+    storage = get_storage()
+    aggregates = {}
+
+    for page in iter_all_pages("submissions", ["item_id", "rating"], REBUILD_PAGE_SIZE):
+        for submission in page:
+            item_id = submission.get("item_id")
+            rating = submission.get("rating")
+            if item_id and rating is not None:
+                shard_id = _shard_id(item_id, submission["id"])
+                _add(aggregates.setdefault(shard_id, _empty(shard_id, item_id)), rating, 1)
+
+    stale_ids = [aggregate["id"] for aggregate in storage.ratings.query(fields=[]) if aggregate["id"] not in aggregates]
+
+    pending = list(aggregates.items())
+    for start in range(0, len(pending), REBUILD_WRITE_SIZE):
+        batch = storage.batch()
+        for item_id, aggregate in pending[start:start + REBUILD_WRITE_SIZE]:
+            batch.set(storage.ratings, item_id, aggregate)
+        batch.commit()
+
+    if stale_ids:
+        storage.ratings.delete_many(stale_ids)
+
+    item_count = len({aggregate["item_id"] for aggregate in aggregates.values()})
+    logger.info("Rebuilt ratings for %d items, removed %d stale aggregates", item_count, len(stale_ids))
+    return item_count
@@ -0,0 +1,238 @@
+#app/recommendations.py
+from app.config import RECOMMENDATION_CACHE_SIZE
+from app.database import get_storage
+from app.layout import owned_repository, owner_filter
+from app.export import iter_pages
+from app.metrics import cache_counters
+from app.weather import WeatherUnavailable, get_weather, normalize, place_key
+from cachetools import LRUCache
+from typing import TYPE_CHECKING, List, Optional, Tuple
+import logging
+import threading
+import time
+
+# numpy takes longer to import than the rest of the app, so it is imported on first use
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# A rating loses half its weight every RECENCY_HALF_LIFE_DAYS days
+RECENCY_HALF_LIFE_DAYS = 30.0
+
+# Weight factors for ratings given in the same place, in the same weather condition,
+# and at a similar temperature (falling off over about TEMPERATURE_SCALE degrees)
+PLACE_WEIGHT = 1.0
+CONDITION_WEIGHT = 2.0
+TEMPERATURE_WEIGHT = 2.0
+TEMPERATURE_SCALE = 5.0
+
+# Weight of the user's overall mean rating in each item's score, so an item with a
+# single rating does not outrank an item with many consistently good ones
+PRIOR_WEIGHT = 1.0
+
+DEFAULT_RECOMMENDATIONS = 10
+MAX_RECOMMENDATIONS = 100
+
+ITEM_FIELDS = ["name", "color"]
+HISTORY_FIELDS = ["item_id", "rating", "city", "country", "condition", "temperature", "created_at"]
+
+# Columns of the submission history matrix
+ITEM, RATING, CREATED_AT, TEMPERATURE, SAME_PLACE, SAME_CONDITION = range(6)
+
+# Encoded histories by user ID, with the collection versions they were loaded at (per process)
+_histories = LRUCache(maxsize=RECOMMENDATION_CACHE_SIZE)
+_lock = threading.Lock()
+_hits, _misses = cache_counters("recommendations")
+
+
+# Encode submissions once, for any place and weather
+def encode_history(submissions: List[dict], item_index: dict) -> dict:
+    """
+    Encode submissions as a (n, 4) matrix of item index (-1 for unknown items), rating,
+    creation time and temperature (NaN if unknown), and give each its place and condition
+    as an integer code, so matching a request's place and condition is one vectorized
+    comparison. This is the only per-submission Python loop; all scoring is vectorized.
+    :return: {"columns", "places", "place_codes", "conditions", "condition_codes"}: the matrix,
+        the code arrays, and the code of each normalized place and condition.
+    """
+    import numpy as np
+    nan = float("nan")
+    place_codes = {}
+    condition_codes = {}
+
+    # Cities, countries and conditions repeat a lot, so each distinct value is normalized once
+    raw_places = {}
+    raw_conditions = {}
+
+    def place_code(city, country) -> int:
+        code = raw_places.get((city, country))
+        if code is None:
+            code = raw_places[(city, country)] = place_codes.setdefault(place_key(city, country), len(place_codes))
+        return code
+
+    def condition_code(condition) -> int:
+        code = raw_conditions.get(condition)
+        if code is None:
+            code = raw_conditions[condition] = condition_codes.setdefault(normalize(condition), len(condition_codes))
+        return code
+
+    rows = []
+    places = []
+    conditions = []
+    for submission in submissions:
+        rows.append((
+            item_index.get(submission.get("item_id"), -1),
+            submission.get("rating") or 0,
+            nan if submission.get("created_at") is None else submission["created_at"],
+            nan if submission.get("temperature") is None else submission["temperature"],
+        ))
+        places.append(place_code(submission.get("city"), submission.get("country")))
+        conditions.append(condition_code(submission.get("condition")))
+
+    return {
+        "columns": np.array(rows, dtype=np.float64).reshape(len(rows), 4),
+        "places": np.array(places, dtype=np.int64),
+        "place_codes": place_codes,
+        "conditions": np.array(conditions, dtype=np.int64),
+        "condition_codes": condition_codes,
+    }
+
+# Complete an encoded history for a place and weather
+def match_history(encoded: dict, city: str, country: str, condition: Optional[str]) -> "np.ndarray":
+    """
+    :param encoded: The history built by encode_history.
+    :return: The (n, 6) matrix score_items takes: the encoded columns, then same place and
+        same condition flags.
+    """
+    import numpy as np
+    same_place = encoded["places"] == encoded["place_codes"].get(place_key(city, country), -1)
+    if condition:
+        same_condition = encoded["conditions"] == encoded["condition_codes"].get(normalize(condition), -1)
+    else:
+        same_condition = np.zeros(len(encoded["conditions"]), dtype=bool)
+    return np.column_stack([encoded["columns"], same_place, same_condition]).astype(np.float64).reshape(-1, 6)
+
+# Turn submissions into one row of floats each
+def build_history(submissions: List[dict], item_index: dict, city: str, country: str,
+                  condition: Optional[str]) -> "np.ndarray":
+    """
+    Encode submissions as a (n, 6) matrix: item index (-1 for unknown items), rating,
+    creation time, temperature (NaN if unknown), same place and same condition flags.
+    """
+    return match_history(encode_history(submissions, item_index), city, country, condition)
+
+# Load and encode a user's items and submissions, reusing them until either collection changes
+def load_history(user_id: str) -> Tuple[List[dict], dict]:
+    """
+    The user's collection versions are read first (one small read), and an encoding cached
+    for the same versions is reused; a write that lands meanwhile bumps a version after it
+    is applied, so the next request loads it. Users without a versions document (nothing
+    written yet, or their data deleted) are always loaded.
+    :param user_id: The ID of the authenticated user.
+    :return: A tuple of (items, encoded history of their submissions).
+    """
+    versions = get_storage().versions.get(user_id)
+    stamp = None if versions is None else (versions.get("items", 0), versions.get("submissions", 0))
+    with _lock:
+        cached = _histories.get(user_id)
+    if stamp is not None and cached is not None and cached[0] == stamp:
+        _hits.inc()
+        return cached[1], cached[2]
+    _misses.inc()
+
+    items = [
+        item for page in iter_pages(owned_repository("items", user_id), owner_filter(user_id), ITEM_FIELDS) for item in page
+    ]
+    item_index = {item["id"]: index for index, item in enumerate(items)}
+    submissions = [
+        submission
+        for page in iter_pages(owned_repository("submissions", user_id), owner_filter(user_id), HISTORY_FIELDS)
+        for submission in page
+    ]
+    encoded = encode_history(submissions, item_index)
+
+    if stamp is not None:
+        with _lock:
+            _histories[user_id] = (stamp, items, encoded)
+    return items, encoded
+
+# Score every item in one pass over the history
+def score_items(history: "np.ndarray", item_count: int, temperature: Optional[float] = None,
+                now: Optional[float] = None):
+    """
+    Score each item by the weighted mean of its ratings. A rating's weight is its
+    recency (exponential decay) times its similarity to today's conditions.
+    :param history: The matrix built by build_history.
+    :param item_count: The number of items (the range of the item index column).
+    :param temperature: Today's temperature in degrees Celsius (optional).
+    :param now: The current Unix time (defaults to time.time()).
+    :return: A tuple of arrays (score, number of ratings), indexed by item.
+    """
+    import numpy as np
+    history = history[history[:, ITEM] >= 0]
+    items = history[:, ITEM].astype(np.int64)
+    ratings = history[:, RATING]
+    now = time.time() if now is None else now
+
+    age_days = np.maximum(now - history[:, CREATED_AT], 0.0) / 86400.0
+    recency = np.exp2(-age_days / RECENCY_HALF_LIFE_DAYS)
+    # Submissions stored before timestamps were recorded count as one half-life old
+    recency = np.where(np.isnan(recency), 0.5, recency)
+
+    # Each matching aspect multiplies a rating's weight
+    similarity = (1.0 + PLACE_WEIGHT * history[:, SAME_PLACE]) * (1.0 + CONDITION_WEIGHT * history[:, SAME_CONDITION])
+    if temperature is not None:
+        closeness = np.exp(-np.square((history[:, TEMPERATURE] - temperature) / TEMPERATURE_SCALE))
+        similarity *= 1.0 + TEMPERATURE_WEIGHT * np.nan_to_num(closeness)
+
+    weights = recency * similarity
+    weighted_sum = np.bincount(items, weights=weights * ratings, minlength=item_count)
+    weight_total = np.bincount(items, weights=weights, minlength=item_count)
+    counts = np.bincount(items, minlength=item_count)
+
+    prior = weighted_sum.sum() / weight_total.sum() if weight_total.sum() > 0 else 50.0
+    scores = (weighted_sum + PRIOR_WEIGHT * prior) / (weight_total + PRIOR_WEIGHT)
+    return scores, counts
+
+# Rank a user's items for a place and weather
+def get_recommendations(user_id: str, city: str, country: str, condition: Optional[str] = None,
+                        temperature: Optional[float] = None, limit: int = DEFAULT_RECOMMENDATIONS) -> dict:
+    """
+    Load the user's items and submissions once and rank the items for today.
+    Without a condition or temperature, the current weather of the place is looked up.
+    :param user_id: The ID of the authenticated user.
+    :param city: Where the user is.
+    :param country: Where the user is.
+    :param condition: Today's weather condition, e.g. "rain" (optional).
+    :param temperature: Today's temperature in degrees Celsius (optional).
+    :param limit: The maximum number of items to return.
+    :return: The weather used and the items with their score and number of ratings, best first.
+    """
+    import numpy as np
+    if condition is None and temperature is None:
+        try:
+            weather = get_weather(city, country)
+        except WeatherUnavailable:
+            # Rank on place and recency alone rather than failing the request
+            logger.warning("Weather unavailable for %s, %s", city, country, exc_info=True)
+            weather = None
+        if weather is not None:
+            condition, temperature = weather["condition"], weather["temperature"]
+
+    result = {"weather": {"condition": condition, "temperature": temperature}, "recommendations": []}
+
+    items, encoded = load_history(user_id)
+    if not items:
+        return result
+
+    history = match_history(encoded, city, country, condition)
+    scores, counts = score_items(history, len(items), temperature)
+
+    # Best score first; ties keep the items' ID order
+    ranking = np.argsort(-scores, kind="stable")[:limit]
+    result["recommendations"] = [
+        {"item": items[index], "score": round(float(scores[index]), 2), "ratings": int(counts[index])}
+        for index in ranking
+    ]
+    return result
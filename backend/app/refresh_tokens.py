@@ -0,0 +1,92 @@
+#app/refresh_tokens.py
+from fastapi import HTTPException
+from app.config import REFRESH_TOKEN_TTL
+from app.database import get_storage
+from app.storage.base import PreconditionFailed
+from typing import Tuple
+import hashlib
+import hmac
+import logging
+import secrets
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# A refresh token is "<session ID>.<secret>". Each login starts a session, stored in the
+# refresh_tokens collection under its ID with a SHA-256 hash of its current secret: the
+# secret is 256 random bits, so a fast hash is as safe as bcrypt and checking it costs
+# one document read. Every refresh replaces the secret, and presenting a replaced one
+# (a stolen copy, or a replay) ends the session.
+
+
+def _hash(secret: str) -> str:
+    return hashlib.sha256(secret.encode()).hexdigest()
+
+# Start a session for a user
+def issue_refresh_token(user_id: str) -> str:
+    """
+    :param user_id: The ID of the authenticated user.
+    :return: A new refresh token.
+    """
+    session_id = uuid.uuid4().hex
+    secret = secrets.token_urlsafe(32)
+    now = time.time()
+    get_storage().refresh_tokens.set(session_id, {
+        "id": session_id,
+        "user_id": user_id,
+        "token_hash": _hash(secret),
+        "created_at": now,
+        "expires_at": now + REFRESH_TOKEN_TTL,
+    })
+    return f"{session_id}.{secret}"
+
+# Exchange a refresh token for the next one
+def rotate_refresh_token(refresh_token: str) -> Tuple[str, str]:
+    """
+    Check a refresh token and replace its secret, conditionally on the session being
+    unchanged since it was read, so of two concurrent refreshes with one token only one wins.
+    The session's expiry moves REFRESH_TOKEN_TTL past now.
+    :param refresh_token: The token presented by the client.
+    :return: A tuple of (user ID, new refresh token).
+    """
+    session_id, _, secret = refresh_token.partition(".")
+    if not session_id or not secret:
+        raise HTTPException(status_code=403, detail="Invalid refresh token")
+
+    sessions = get_storage().refresh_tokens
+    session, version = sessions.get_with_version(session_id)
+    if session is None:
+        raise HTTPException(status_code=403, detail="Invalid refresh token")
+
+    if not hmac.compare_digest(_hash(secret), session["token_hash"]):
+        # Only the current secret is ever valid: an older one means the token leaked
+        logger.warning("Refresh token reused; ending session %s of user %s", session_id, session["user_id"])
+        sessions.delete(session_id)
+        raise HTTPException(status_code=403, detail="Invalid refresh token")
+
+    if session["expires_at"] <= time.time():
+        sessions.delete(session_id)
+        raise HTTPException(status_code=403, detail="Refresh token expired")
+
+    new_secret = secrets.token_urlsafe(32)
+    try:
+        sessions.update(session_id, {
+            "token_hash": _hash(new_secret),
+            "expires_at": time.time() + REFRESH_TOKEN_TTL,
+        }, version=version)
+    except PreconditionFailed:
+        raise HTTPException(status_code=403, detail="Invalid refresh token")
+    return session["user_id"], f"{session_id}.{new_secret}"
+
+# End every session of a user
+def revoke_refresh_tokens(user_id: str):
+    """
+    Invalidate all of a user's refresh tokens, e.g. when the password changes or the
+    account is deleted. Access tokens already issued stay valid until they expire.
+    :param user_id: The ID of the user.
+    """
+    sessions = get_storage().refresh_tokens
+    session_ids = [session["id"] for session in sessions.query({"user_id": user_id}, fields=[])]
+    if session_ids:
+        sessions.delete_many(session_ids)
@@ -0,0 +1,240 @@
+#app/storage/base.py
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+import random
+
+T = TypeVar("T")
+
+# Firestore commits at most 500 writes at once, in a batch or a transaction
+MAX_TRANSACTION_WRITES = 500
+
+# How many times a transaction is attempted before giving up on contention
+MAX_TRANSACTION_ATTEMPTS = 5
+
+# Seconds to wait before a transaction's second attempt, doubling for each later one (up to the maximum)
+TRANSACTION_BACKOFF = 0.01
+MAX_TRANSACTION_BACKOFF = 0.5
+
+
+# How long to wait before attempting a conflicted transaction again
+def transaction_backoff(attempt: int) -> float:
+    """
+    A random delay ("full jitter"), so transactions that conflicted with each other
+    do not all try again at the same moment and conflict once more.
+    :param attempt: The number of attempts made so far (1 or more).
+    :return: Seconds to wait.
+    """
+    return random.uniform(0, min(MAX_TRANSACTION_BACKOFF, TRANSACTION_BACKOFF * 2 ** (attempt - 1)))
+
+
+class DocumentNotFound(Exception):
+    """Raised when updating a document that does not exist."""
+
+
+class PreconditionFailed(Exception):
+    """Raised when a write's version precondition does not hold (the document changed or was deleted)."""
+
+
+class TransactionConflict(Exception):
+    """Raised when a transaction still conflicts with concurrent writes after every attempt."""
+
+
+class Repository(ABC):
+    """
+    A collection of documents (dicts) keyed by ID.
+    Documents returned by get, get_many and query always contain their "id".
+    Every write gives a document a new opaque version string; passing a version
+    read earlier to update or delete makes the write conditional on it.
+    """
+
+    name: str
+
+    @abstractmethod
+    def get(self, doc_id: str) -> Optional[dict]:
+        """Return the document, or None if it does not exist."""
+
+    @abstractmethod
+    def get_with_version(self, doc_id: str) -> Tuple[Optional[dict], Optional[str]]:
+        """Return the document and its current version, or (None, None) if it does not exist."""
+
+    @abstractmethod
+    def get_many(self, doc_ids: Iterable[str]) -> Dict[str, dict]:
+        """Return the existing documents among doc_ids, keyed by ID, in one round trip."""
+
+    @abstractmethod
+    def set(self, doc_id: str, data: dict):
+        """Create or overwrite a document."""
+
+    @abstractmethod
+    def update(self, doc_id: str, data: dict, version: Optional[str] = None) -> str:
+        """
+        Update fields of an existing document; raises DocumentNotFound if it does not exist.
+        With a version, raises PreconditionFailed unless the document is still at that version.
+        :return: The document's new version.
+        """
+
+    @abstractmethod
+    def delete(self, doc_id: str, version: Optional[str] = None):
+        """
+        Delete a document (no error if it does not exist).
+        With a version, raises PreconditionFailed unless the document is still at that version.
+        """
+
+    @abstractmethod
+    def delete_many(self, doc_ids: Iterable[str]):
+        """Delete several documents using the backend's bulk path."""
+
+    @abstractmethod
+    def increment(self, doc_id: str, field: str, amount: int = 1):
+        """Atomically add amount to a numeric field, creating the document or field (from 0) if missing."""
+
+    @abstractmethod
+    def query(self, filters: Optional[dict] = None, limit: Optional[int] = None,
+              start_after: Optional[str] = None, fields: Optional[List[str]] = None) -> Iterator[dict]:
+        """
+        Stream documents matching all equality filters, ordered by document ID.
+        :param filters: Field/value pairs that must all match.
+        :param limit: The maximum number of documents to return.
+        :param start_after: Only return documents with an ID after this one.
+        :param fields: Project documents to these fields (plus "id").
+        """
+
+
+class WriteBatch(ABC):
+    """Writes that are applied together by commit()."""
+
+    @abstractmethod
+    def set(self, repository: Repository, doc_id: str, data: dict):
+        pass
+
+    @abstractmethod
+    def update(self, repository: Repository, doc_id: str, data: dict):
+        pass
+
+    @abstractmethod
+    def delete(self, repository: Repository, doc_id: str):
+        pass
+
+    @abstractmethod
+    def commit(self):
+        pass
+
+
+class Transaction(ABC):
+    """
+    Reads and writes applied atomically by Storage.run_transaction.
+    As on Firestore, every read must come before the first write.
+    """
+
+    @abstractmethod
+    def get(self, repository: Repository, doc_id: str) -> Optional[dict]:
+        pass
+
+    @abstractmethod
+    def get_many(self, repository: Repository, doc_ids: Iterable[str]) -> Dict[str, dict]:
+        pass
+
+    @abstractmethod
+    def set(self, repository: Repository, doc_id: str, data: dict):
+        pass
+
+    @abstractmethod
+    def update(self, repository: Repository, doc_id: str, data: dict):
+        pass
+
+    @abstractmethod
+    def delete(self, repository: Repository, doc_id: str):
+        pass
+
+
+class Storage(ABC):
+    """The data store: one repository per collection."""
+
+    # Collections used by the app
+    COLLECTIONS = ("users", "items", "submissions", "jobs", "ratings", "versions", "refresh_tokens", "usernames", "idempotency_keys")
+
+    # Collections that also exist per user, as users/{user_id}/{name} (see app.layout)
+    OWNED_COLLECTIONS = ("items", "submissions")
+
+    def __init__(self):
+        self._repositories = {}
+        for name in self.COLLECTIONS:
+            self._repositories[name] = self._create_repository(name)
+
+    @abstractmethod
+    def _create_repository(self, name: str) -> Repository:
+        pass
+
+    @abstractmethod
+    def batch(self) -> WriteBatch:
+        """Start a batch of writes that is committed atomically."""
+
+    @abstractmethod
+    def run_transaction(self, fn: Callable[[Transaction], T]) -> T:
+        """
+        Call fn(transaction) and commit the writes it makes atomically.
+        fn is called again if a document it read changed before the commit,
+        so it must not have side effects outside the transaction.
+        :return: The result of fn.
+        """
+
+    @abstractmethod
+    def owned(self, name: str, user_id: str) -> Repository:
+        """
+        One user's collection, users/{user_id}/{name}: its queries only scan that user's
+        documents, and an ID that is not in it is simply not found.
+        :param name: One of OWNED_COLLECTIONS.
+        :param user_id: The owner.
+        """
+
+    @abstractmethod
+    def owners(self, name: str) -> Iterator[str]:
+        """
+        The IDs of the users that may have documents in an owned collection, including
+        users that no longer exist. May include users that have none.
+        """
+
+    def warm(self):
+        """Open connections ahead of the first request (nothing to do for local backends)."""
+
+    def close(self):
+        """Release connections held by the backend."""
+
+    def repository(self, name: str) -> Repository:
+        return self._repositories[name]
+
+    @property
+    def users(self) -> Repository:
+        return self._repositories["users"]
+
+    @property
+    def items(self) -> Repository:
+        return self._repositories["items"]
+
+    @property
+    def submissions(self) -> Repository:
+        return self._repositories["submissions"]
+
+    @property
+    def jobs(self) -> Repository:
+        return self._repositories["jobs"]
+
+    @property
+    def ratings(self) -> Repository:
+        return self._repositories["ratings"]
+
+    @property
+    def versions(self) -> Repository:
+        return self._repositories["versions"]
+
+    @property
+    def refresh_tokens(self) -> Repository:
+        return self._repositories["refresh_tokens"]
+
+    @property
+    def usernames(self) -> Repository:
+        return self._repositories["usernames"]
+
+    @property
+    def idempotency_keys(self) -> Repository:
+        return self._repositories["idempotency_keys"]
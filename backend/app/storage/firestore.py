@@ -0,0 +1,200 @@
+#app/storage/firestore.py
+from app.storage.base import (
+    DocumentNotFound, MAX_TRANSACTION_ATTEMPTS, PreconditionFailed, Repository, Storage, Transaction,
+    TransactionConflict, WriteBatch, transaction_backoff
+)
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+from google.api_core.exceptions import Aborted, FailedPrecondition, NotFound
+from google.cloud import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+import time
+
+T = TypeVar("T")
+
+
+class FirestoreRepository(Repository):
+    def __init__(self, client: firestore.Client, name: str):
+        self.name = name
+        self.client = client
+        self.collection = client.collection(name)
+
+    def get(self, doc_id: str) -> Optional[dict]:
+        snapshot = self.collection.document(doc_id).get()
+        if not snapshot.exists:
+            return None
+        return _with_id(snapshot)
+
+    def get_with_version(self, doc_id: str) -> Tuple[Optional[dict], Optional[str]]:
+        # The document's update time is its version
+        snapshot = self.collection.document(doc_id).get()
+        if not snapshot.exists:
+            return None, None
+        return _with_id(snapshot), snapshot.update_time.rfc3339()
+
+    def get_many(self, doc_ids: Iterable[str]) -> Dict[str, dict]:
+        refs = [self.collection.document(doc_id) for doc_id in set(doc_ids)]
+        if not refs:
+            return {}
+        return {snapshot.id: _with_id(snapshot) for snapshot in self.client.get_all(refs) if snapshot.exists}
+
+    def set(self, doc_id: str, data: dict):
+        self.collection.document(doc_id).set(data)
+
+    def update(self, doc_id: str, data: dict, version: Optional[str] = None) -> str:
+        try:
+            result = self.collection.document(doc_id).update(data, option=self._precondition(version))
+        except NotFound:
+            if version is not None:
+                raise PreconditionFailed(f"{self.name}/{doc_id}")
+            raise DocumentNotFound(f"{self.name}/{doc_id}")
+        except FailedPrecondition:
+            raise PreconditionFailed(f"{self.name}/{doc_id}")
+        return result.update_time.rfc3339()
+
+    def delete(self, doc_id: str, version: Optional[str] = None):
+        try:
+            self.collection.document(doc_id).delete(option=self._precondition(version))
+        except (FailedPrecondition, NotFound):
+            raise PreconditionFailed(f"{self.name}/{doc_id}")
+
+    def delete_many(self, doc_ids: Iterable[str]):
+        bulk_writer = self.client.bulk_writer()
+        try:
+            for doc_id in doc_ids:
+                bulk_writer.delete(self.collection.document(doc_id))
+        finally:
+            bulk_writer.close()
+
+    def increment(self, doc_id: str, field: str, amount: int = 1):
+        # A server-side transform: one write, no read
+        self.collection.document(doc_id).set({field: firestore.Increment(amount)}, merge=True)
+
+    def query(self, filters: Optional[dict] = None, limit: Optional[int] = None,
+              start_after: Optional[str] = None, fields: Optional[List[str]] = None) -> Iterator[dict]:
+        query = self.collection
+        for field, value in (filters or {}).items():
+            query = query.where(field, "==", value)
+
+        # Ordering by document name needs no composite index
+        query = query.order_by(FieldPath.document_id())
+
+        if start_after is not None:
+            query = query.start_after({FieldPath.document_id(): start_after})
+        if fields is not None:
+            query = query.select(fields)
+        if limit is not None:
+            query = query.limit(limit)
+
+        for snapshot in query.stream():
+            yield _with_id(snapshot)
+
+    # Checked by the server as part of the write, so it costs no extra round trip
+    def _precondition(self, version: Optional[str]):
+        if version is None:
+            return None
+        return self.client.write_option(last_update_time=DatetimeWithNanoseconds.from_rfc3339(version))
+
+
+class FirestoreWriteBatch(WriteBatch):
+    def __init__(self, client: firestore.Client):
+        self._batch = client.batch()
+
+    def set(self, repository: FirestoreRepository, doc_id: str, data: dict):
+        self._batch.set(repository.collection.document(doc_id), data)
+
+    def update(self, repository: FirestoreRepository, doc_id: str, data: dict):
+        self._batch.update(repository.collection.document(doc_id), data)
+
+    def delete(self, repository: FirestoreRepository, doc_id: str):
+        self._batch.delete(repository.collection.document(doc_id))
+
+    def commit(self):
+        try:
+            self._batch.commit()
+        except NotFound as e:
+            raise DocumentNotFound(str(e))
+
+
+class FirestoreTransaction(Transaction):
+    def __init__(self, client: firestore.Client, transaction: firestore.Transaction):
+        self._client = client
+        self._transaction = transaction
+
+    def get(self, repository: FirestoreRepository, doc_id: str) -> Optional[dict]:
+        snapshot = repository.collection.document(doc_id).get(transaction=self._transaction)
+        return _with_id(snapshot) if snapshot.exists else None
+
+    def get_many(self, repository: FirestoreRepository, doc_ids: Iterable[str]) -> Dict[str, dict]:
+        refs = [repository.collection.document(doc_id) for doc_id in set(doc_ids)]
+        if not refs:
+            return {}
+        snapshots = self._client.get_all(refs, transaction=self._transaction)
+        return {snapshot.id: _with_id(snapshot) for snapshot in snapshots if snapshot.exists}
+
+    def set(self, repository: FirestoreRepository, doc_id: str, data: dict):
+        self._transaction.set(repository.collection.document(doc_id), data)
+
+    def update(self, repository: FirestoreRepository, doc_id: str, data: dict):
+        self._transaction.update(repository.collection.document(doc_id), data)
+
+    def delete(self, repository: FirestoreRepository, doc_id: str):
+        self._transaction.delete(repository.collection.document(doc_id))
+
+
+class FirestoreStorage(Storage):
+    """Google Cloud Firestore, using the default project and credentials."""
+
+    def __init__(self, client: Optional[firestore.Client] = None):
+        self.client = client or firestore.Client()
+        super().__init__()
+
+    def _create_repository(self, name: str) -> Repository:
+        return FirestoreRepository(self.client, name)
+
+    def owned(self, name: str, user_id: str) -> Repository:
+        return FirestoreRepository(self.client, f"users/{user_id}/{name}")
+
+    def owners(self, name: str) -> Iterator[str]:
+        # Lists every user document, and also the missing ones that still have subcollections
+        for reference in self.client.collection("users").list_documents():
+            yield reference.id
+
+    def batch(self) -> WriteBatch:
+        return FirestoreWriteBatch(self.client)
+
+    def run_transaction(self, fn: Callable[[Transaction], T]) -> T:
+        attempts = 0
+
+        # The client retries an aborted commit by calling run again, in a transaction that
+        # keeps the first one's place in line; wait a little before each retry all the same
+        @firestore.transactional
+        def run(transaction):
+            nonlocal attempts
+            if attempts:
+                time.sleep(transaction_backoff(attempts))
+            attempts += 1
+            return fn(FirestoreTransaction(self.client, transaction))
+
+        try:
+            return run(self.client.transaction(max_attempts=MAX_TRANSACTION_ATTEMPTS))
+        except NotFound as e:
+            raise DocumentNotFound(str(e))
+        except ValueError as e:
+            # The client gives up with a ValueError raised from the last Aborted
+            if isinstance(e.__cause__, Aborted):
+                raise TransactionConflict(str(e)) from e
+            raise
+
+    def warm(self):
+        # One small read opens the gRPC channel and fetches credentials
+        self.client.collection(self.COLLECTIONS[0]).document("_warmup").get()
+
+    def close(self):
+        self.client.close()
+
+
+def _with_id(snapshot) -> dict:
+    data = snapshot.to_dict()
+    data["id"] = snapshot.id
+    return data
@@ -0,0 +1,251 @@
+#app/storage/memory.py
+from app.storage.base import (
+    DocumentNotFound, MAX_TRANSACTION_ATTEMPTS, MAX_TRANSACTION_WRITES, PreconditionFailed, Repository, Storage, Transaction,
+    TransactionConflict, WriteBatch, transaction_backoff
+)
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+import copy
+import itertools
+import threading
+import time
+
+T = TypeVar("T")
+
+
+class MemoryRepository(Repository):
+    def __init__(self, storage: "MemoryStorage", name: str):
+        self.name = name
+        self._storage = storage
+        self._documents: Dict[str, dict] = {}
+        self._versions: Dict[str, str] = {}
+
+    def get(self, doc_id: str) -> Optional[dict]:
+        return self.get_with_version(doc_id)[0]
+
+    def get_with_version(self, doc_id: str) -> Tuple[Optional[dict], Optional[str]]:
+        self._storage.round_trip()
+        with self._storage.lock:
+            document = self._documents.get(doc_id)
+            if document is None:
+                return None, None
+            return _with_id(doc_id, document), self._versions[doc_id]
+
+    def get_many(self, doc_ids: Iterable[str]) -> Dict[str, dict]:
+        self._storage.round_trip()
+        with self._storage.lock:
+            return {
+                doc_id: _with_id(doc_id, self._documents[doc_id])
+                for doc_id in set(doc_ids) if doc_id in self._documents
+            }
+
+    def set(self, doc_id: str, data: dict):
+        self._storage.round_trip()
+        with self._storage.lock:
+            self._set(doc_id, data)
+
+    def update(self, doc_id: str, data: dict, version: Optional[str] = None) -> str:
+        self._storage.round_trip()
+        with self._storage.lock:
+            self._check_version(doc_id, version)
+            self._update(doc_id, data)
+            return self._versions[doc_id]
+
+    def delete(self, doc_id: str, version: Optional[str] = None):
+        self._storage.round_trip()
+        with self._storage.lock:
+            self._check_version(doc_id, version)
+            self._delete(doc_id)
+
+    def delete_many(self, doc_ids: Iterable[str]):
+        self._storage.round_trip()
+        with self._storage.lock:
+            for doc_id in doc_ids:
+                self._delete(doc_id)
+
+    def increment(self, doc_id: str, field: str, amount: int = 1):
+        self._storage.round_trip()
+        with self._storage.lock:
+            document = self._documents.get(doc_id, {})
+            self._set(doc_id, {**document, field: document.get(field, 0) + amount})
+
+    def query(self, filters: Optional[dict] = None, limit: Optional[int] = None,
+              start_after: Optional[str] = None, fields: Optional[List[str]] = None) -> Iterator[dict]:
+        self._storage.round_trip()
+        filters = filters or {}
+        with self._storage.lock:
+            matches = []
+            for doc_id in sorted(self._documents):
+                if start_after is not None and doc_id <= start_after:
+                    continue
+                document = self._documents[doc_id]
+                if all(document.get(field) == value for field, value in filters.items()):
+                    if fields is not None:
+                        document = {field: document[field] for field in fields if field in document}
+                    matches.append(_with_id(doc_id, document))
+                    if limit is not None and len(matches) >= limit:
+                        break
+        return iter(matches)
+
+    # Unlocked writes, shared with MemoryWriteBatch (callers hold the storage lock)
+    def _set(self, doc_id: str, data: dict):
+        self._documents[doc_id] = copy.deepcopy(data)
+        self._versions[doc_id] = self._storage.next_version()
+
+    def _update(self, doc_id: str, data: dict):
+        if doc_id not in self._documents:
+            raise DocumentNotFound(f"{self.name}/{doc_id}")
+        self._documents[doc_id].update(copy.deepcopy(data))
+        self._versions[doc_id] = self._storage.next_version()
+
+    def _delete(self, doc_id: str):
+        self._documents.pop(doc_id, None)
+        self._versions.pop(doc_id, None)
+
+    def _check_version(self, doc_id: str, version: Optional[str]):
+        if version is not None and self._versions.get(doc_id) != version:
+            raise PreconditionFailed(f"{self.name}/{doc_id}")
+
+
+class MemoryWriteBatch(WriteBatch):
+    def __init__(self, storage: "MemoryStorage"):
+        self._storage = storage
+        self._writes = []
+
+    def set(self, repository: MemoryRepository, doc_id: str, data: dict):
+        self._writes.append(("set", repository, doc_id, data))
+
+    def update(self, repository: MemoryRepository, doc_id: str, data: dict):
+        self._writes.append(("update", repository, doc_id, data))
+
+    def delete(self, repository: MemoryRepository, doc_id: str):
+        self._writes.append(("delete", repository, doc_id, None))
+
+    def commit(self):
+        self._storage.round_trip()
+        with self._storage.lock:
+            self._apply()
+
+    # Apply the writes (callers hold the storage lock)
+    def _apply(self):
+        # Refused as Firestore would, so tests catch commits that would fail there
+        if len(self._writes) > MAX_TRANSACTION_WRITES:
+            raise ValueError(f"At most {MAX_TRANSACTION_WRITES} writes may be committed at once, not {len(self._writes)}")
+
+        # Validate every update first, so a failing batch writes nothing
+        exists = {}
+        for kind, repository, doc_id, _ in self._writes:
+            key = (repository.name, doc_id)
+            if kind == "update" and not exists.get(key, doc_id in repository._documents):
+                raise DocumentNotFound(f"{repository.name}/{doc_id}")
+            exists[key] = kind != "delete"
+
+        for kind, repository, doc_id, data in self._writes:
+            if kind == "set":
+                repository._set(doc_id, data)
+            elif kind == "update":
+                repository._update(doc_id, data)
+            else:
+                repository._delete(doc_id)
+
+
+class MemoryTransaction(MemoryWriteBatch, Transaction):
+    """
+    Optimistic transaction: writes are buffered, and the commit only applies them
+    if none of the documents read have changed since.
+    """
+
+    def __init__(self, storage: "MemoryStorage"):
+        super().__init__(storage)
+        self._reads = {}  # (repository name, doc_id) -> (repository, document as read)
+
+    def get(self, repository: MemoryRepository, doc_id: str) -> Optional[dict]:
+        return self.get_many(repository, [doc_id]).get(doc_id)
+
+    def get_many(self, repository: MemoryRepository, doc_ids: Iterable[str]) -> Dict[str, dict]:
+        if self._writes:
+            raise RuntimeError("Transaction reads must come before writes")
+        self._storage.round_trip()
+        documents = {}
+        with self._storage.lock:
+            for doc_id in set(doc_ids):
+                document = repository._documents.get(doc_id)
+                self._reads[(repository.name, doc_id)] = (repository, copy.deepcopy(document))
+                if document is not None:
+                    documents[doc_id] = _with_id(doc_id, document)
+        return documents
+
+    def commit(self) -> bool:
+        """
+        :return: False, without writing anything, if a document read by the transaction has changed.
+        """
+        if not self._writes:
+            return True
+        self._storage.round_trip()
+        with self._storage.lock:
+            for (_, doc_id), (repository, document) in self._reads.items():
+                if repository._documents.get(doc_id) != document:
+                    return False
+            self._apply()
+        return True
+
+
+class MemoryStorage(Storage):
+    """
+    Process-local storage for tests, benchmarks and single-process development.
+    Every repository or batch call counts as one round trip, as it would on Firestore.
+    :param latency: Seconds to sleep on every round trip, to simulate a remote store.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.round_trips = 0
+        self.lock = threading.RLock()
+        # Versions come from one counter, so a recreated document never reuses an old version
+        self._version_counter = itertools.count(1)
+        self._owned: Dict[Tuple[str, str], MemoryRepository] = {}
+        super().__init__()
+
+    def _create_repository(self, name: str) -> Repository:
+        return MemoryRepository(self, name)
+
+    def owned(self, name: str, user_id: str) -> Repository:
+        with self.lock:
+            repository = self._owned.get((name, user_id))
+            if repository is None:
+                repository = self._owned[(name, user_id)] = MemoryRepository(self, f"users/{user_id}/{name}")
+            return repository
+
+    def owners(self, name: str) -> Iterator[str]:
+        with self.lock:
+            return iter(sorted(
+                user_id for (collection, user_id), repository in self._owned.items()
+                if collection == name and repository._documents
+            ))
+
+    def batch(self) -> WriteBatch:
+        return MemoryWriteBatch(self)
+
+    def run_transaction(self, fn: Callable[[Transaction], T]) -> T:
+        for attempt in range(MAX_TRANSACTION_ATTEMPTS):
+            if attempt:
+                time.sleep(transaction_backoff(attempt))
+            transaction = MemoryTransaction(self)
+            result = fn(transaction)
+            if transaction.commit():
+                return result
+        raise TransactionConflict(f"Transaction failed after {MAX_TRANSACTION_ATTEMPTS} attempts")
+
+    def next_version(self) -> str:
+        return str(next(self._version_counter))
+
+    def round_trip(self):
+        with self.lock:
+            self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+
+def _with_id(doc_id: str, document: dict) -> dict:
+    data = copy.deepcopy(document)
+    data["id"] = doc_id
+    return data
@@ -0,0 +1,334 @@
+#app/storage/sqlite.py
+from app.storage.base import (
+    DocumentNotFound, PreconditionFailed, Repository, Storage, Transaction, TransactionConflict, WriteBatch
+)
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+import datetime
+import json
+import re
+import sqlite3
+import threading
+import uuid
+
+T = TypeVar("T")
+
+# Indexed fields per collection. Each index also covers the document ID, so
+# filtered queries are answered in ID order straight from the index.
+INDEXES = {
+    "users": [("username",)],
+    "items": [("user_id",)],
+    "submissions": [("user_id",), ("user_id", "item_id"), ("item_id",)],
+    "jobs": [("status",)],
+    "refresh_tokens": [("user_id",)],
+}
+
+# Indexed fields of the owned collections, within each user's documents
+OWNED_INDEXES = {
+    "submissions": [("item_id",)],
+}
+
+_FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+# Rows written before documents were versioned all read as version "0"
+_VERSION = "COALESCE(version, '0')"
+
+
+def _field(field: str) -> str:
+    # Field names are interpolated into SQL, so only plain identifiers are allowed
+    if not _FIELD_NAME.match(field):
+        raise ValueError(f"Invalid field name: {field!r}")
+    return f"json_extract(data, '$.{field}')"
+
+
+def _create_indexes(connection: sqlite3.Connection, table: str, indexes: List[Tuple[str, ...]], key_columns: List[str]):
+    for fields in indexes:
+        index_name = f"{table}_{'_'.join(fields)}"
+        columns = ", ".join(key_columns + [_field(field) for field in fields] + ["id"])
+        connection.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({columns})")
+
+
+class SQLiteRepository(Repository):
+    """
+    A table of documents. The owned collections of every user share one table per
+    collection (users_items, users_submissions), keyed by (parent, id): a repository
+    with a parent only sees that user's rows.
+    """
+
+    def __init__(self, storage: "SQLiteStorage", name: str, table: Optional[str] = None, parent: Optional[str] = None):
+        self.name = name
+        self._storage = storage
+        self._table = table or name
+        self._scope = "parent = ? AND " if parent is not None else ""
+        self._scope_params = (parent,) if parent is not None else ()
+
+        if table is None:
+            with storage.connection() as connection:
+                connection.execute(f"CREATE TABLE IF NOT EXISTS {name} (id TEXT PRIMARY KEY, data TEXT NOT NULL, version TEXT)")
+                # Databases created before documents were versioned lack the column
+                existing = [row[1] for row in connection.execute(f"PRAGMA table_info({name})")]
+                if "version" not in existing:
+                    connection.execute(f"ALTER TABLE {name} ADD COLUMN version TEXT")
+                _create_indexes(connection, name, INDEXES.get(name, []), [])
+
+    def get(self, doc_id: str) -> Optional[dict]:
+        row = self._storage.read().execute(
+            f"SELECT id, data FROM {self._table} WHERE {self._scope}id = ?", (*self._scope_params, doc_id)
+        ).fetchone()
+        return _load(row) if row is not None else None
+
+    def get_with_version(self, doc_id: str) -> Tuple[Optional[dict], Optional[str]]:
+        row = self._storage.read().execute(
+            f"SELECT id, data, {_VERSION} FROM {self._table} WHERE {self._scope}id = ?", (*self._scope_params, doc_id)
+        ).fetchone()
+        return (_load(row), row[2]) if row is not None else (None, None)
+
+    def get_many(self, doc_ids: Iterable[str]) -> Dict[str, dict]:
+        return self._get_many(self._storage.read(), doc_ids)
+
+    def set(self, doc_id: str, data: dict):
+        with self._storage.connection() as connection:
+            self._set(connection, doc_id, data)
+
+    def update(self, doc_id: str, data: dict, version: Optional[str] = None) -> str:
+        with self._storage.connection() as connection:
+            return self._update(connection, doc_id, data, version)
+
+    def delete(self, doc_id: str, version: Optional[str] = None):
+        with self._storage.connection() as connection:
+            if version is None:
+                self._delete(connection, doc_id)
+                return
+            cursor = connection.execute(
+                f"DELETE FROM {self._table} WHERE {self._scope}id = ? AND {_VERSION} = ?", (*self._scope_params, doc_id, version)
+            )
+            if cursor.rowcount != 1:
+                raise PreconditionFailed(f"{self.name}/{doc_id}")
+
+    def delete_many(self, doc_ids: Iterable[str]):
+        with self._storage.connection() as connection:
+            connection.executemany(
+                f"DELETE FROM {self._table} WHERE {self._scope}id = ?", [(*self._scope_params, doc_id) for doc_id in doc_ids]
+            )
+
+    def increment(self, doc_id: str, field: str, amount: int = 1):
+        with self._storage.connection() as connection:
+            document = self._get_many(connection, [doc_id]).get(doc_id)
+            if document is None:
+                self._set(connection, doc_id, {field: amount})
+            else:
+                self._update(connection, doc_id, {field: document.get(field, 0) + amount})
+
+    def query(self, filters: Optional[dict] = None, limit: Optional[int] = None,
+              start_after: Optional[str] = None, fields: Optional[List[str]] = None) -> Iterator[dict]:
+        clauses = ["parent = ?"] if self._scope_params else []
+        params = list(self._scope_params)
+        for field, value in (filters or {}).items():
+            clauses.append(f"{_field(field)} = ?")
+            params.append(value)
+        if start_after is not None:
+            clauses.append("id > ?")
+            params.append(start_after)
+
+        sql = f"SELECT id, data FROM {self._table}"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        # Fetch eagerly: a statement left open on this thread's connection would
+        # block the next write transaction from committing
+        rows = self._storage.read().execute(sql, params).fetchall()
+        for row in rows:
+            document = _load(row)
+            if fields is not None:
+                document = {field: document[field] for field in fields + ["id"] if field in document}
+            yield document
+
+    # Reads and writes on an open transaction, shared with SQLiteWriteBatch and SQLiteTransaction
+    def _get_many(self, connection: sqlite3.Connection, doc_ids: Iterable[str]) -> Dict[str, dict]:
+        doc_ids = list(set(doc_ids))
+        documents = {}
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(doc_ids), 500):
+            chunk = doc_ids[start:start + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            rows = connection.execute(
+                f"SELECT id, data FROM {self._table} WHERE {self._scope}id IN ({placeholders})", (*self._scope_params, *chunk)
+            )
+            documents.update((row[0], _load(row)) for row in rows)
+        return documents
+
+    def _set(self, connection: sqlite3.Connection, doc_id: str, data: dict):
+        connection.execute(
+            f"INSERT OR REPLACE INTO {self._table} ({'parent, ' if self._scope else ''}id, data, version) "
+            f"VALUES ({'?, ' if self._scope else ''}?, ?, ?)",
+            (*self._scope_params, doc_id, json.dumps(data, default=_encode), _new_version())
+        )
+
+    def _update(self, connection: sqlite3.Connection, doc_id: str, data: dict, version: Optional[str] = None) -> str:
+        row = connection.execute(
+            f"SELECT data, {_VERSION} FROM {self._table} WHERE {self._scope}id = ?", (*self._scope_params, doc_id)
+        ).fetchone()
+        if row is None:
+            if version is not None:
+                raise PreconditionFailed(f"{self.name}/{doc_id}")
+            raise DocumentNotFound(f"{self.name}/{doc_id}")
+        if version is not None and row[1] != version:
+            raise PreconditionFailed(f"{self.name}/{doc_id}")
+        document = json.loads(row[0])
+        document.update(data)
+        new_version = _new_version()
+        connection.execute(
+            f"UPDATE {self._table} SET data = ?, version = ? WHERE {self._scope}id = ?",
+            (json.dumps(document, default=_encode), new_version, *self._scope_params, doc_id)
+        )
+        return new_version
+
+    def _delete(self, connection: sqlite3.Connection, doc_id: str):
+        connection.execute(f"DELETE FROM {self._table} WHERE {self._scope}id = ?", (*self._scope_params, doc_id))
+
+
+class SQLiteWriteBatch(WriteBatch):
+    def __init__(self, storage: "SQLiteStorage"):
+        self._storage = storage
+        self._writes = []
+
+    def set(self, repository: SQLiteRepository, doc_id: str, data: dict):
+        self._writes.append(lambda connection: repository._set(connection, doc_id, data))
+
+    def update(self, repository: SQLiteRepository, doc_id: str, data: dict):
+        self._writes.append(lambda connection: repository._update(connection, doc_id, data))
+
+    def delete(self, repository: SQLiteRepository, doc_id: str):
+        self._writes.append(lambda connection: repository._delete(connection, doc_id))
+
+    def commit(self):
+        with self._storage.connection() as connection:
+            for write in self._writes:
+                write(connection)
+
+
+class SQLiteTransaction(Transaction):
+    """Runs inside a BEGIN IMMEDIATE transaction, so no other writer can interleave."""
+
+    def __init__(self, connection: sqlite3.Connection):
+        self._connection = connection
+
+    def get(self, repository: SQLiteRepository, doc_id: str) -> Optional[dict]:
+        return repository._get_many(self._connection, [doc_id]).get(doc_id)
+
+    def get_many(self, repository: SQLiteRepository, doc_ids: Iterable[str]) -> Dict[str, dict]:
+        return repository._get_many(self._connection, doc_ids)
+
+    def set(self, repository: SQLiteRepository, doc_id: str, data: dict):
+        repository._set(self._connection, doc_id, data)
+
+    def update(self, repository: SQLiteRepository, doc_id: str, data: dict):
+        repository._update(self._connection, doc_id, data)
+
+    def delete(self, repository: SQLiteRepository, doc_id: str):
+        repository._delete(self._connection, doc_id)
+
+
+class SQLiteStorage(Storage):
+    """
+    A single SQLite file in WAL mode, for local runs and small edge deployments.
+    Each thread has its own connection; WAL lets readers run alongside the writer.
+    :param path: The database file (":memory:" is not supported across threads).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        super().__init__()
+
+        with self.connection() as connection:
+            for name in self.OWNED_COLLECTIONS:
+                table = _owned_table(name)
+                connection.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table} "
+                    "(parent TEXT NOT NULL, id TEXT NOT NULL, data TEXT NOT NULL, version TEXT, PRIMARY KEY (parent, id))"
+                )
+                _create_indexes(connection, table, OWNED_INDEXES.get(name, []), ["parent"])
+
+    def _create_repository(self, name: str) -> Repository:
+        return SQLiteRepository(self, name)
+
+    def owned(self, name: str, user_id: str) -> Repository:
+        return SQLiteRepository(self, f"users/{user_id}/{name}", table=_owned_table(name), parent=user_id)
+
+    def owners(self, name: str) -> Iterator[str]:
+        rows = self.read().execute(f"SELECT DISTINCT parent FROM {_owned_table(name)} ORDER BY parent").fetchall()
+        return iter(row[0] for row in rows)
+
+    def batch(self) -> WriteBatch:
+        return SQLiteWriteBatch(self)
+
+    def run_transaction(self, fn: Callable[[Transaction], T]) -> T:
+        # Writers take turns (BEGIN IMMEDIATE), so the only conflict is waiting out busy_timeout
+        try:
+            with self.connection() as connection:
+                return fn(SQLiteTransaction(connection))
+        except sqlite3.OperationalError as e:
+            if "locked" in str(e):
+                raise TransactionConflict(str(e)) from e
+            raise
+
+    def read(self) -> sqlite3.Connection:
+        """The calling thread's connection, for reads outside a transaction."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA busy_timeout=5000")
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    @contextmanager
+    def connection(self):
+        """A write transaction on the calling thread's connection, committed on exit."""
+        connection = self.read()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def close(self):
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+
+
+def _owned_table(name: str) -> str:
+    if name not in Storage.OWNED_COLLECTIONS:
+        raise ValueError(f"Not an owned collection: {name!r}")
+    return f"users_{name}"
+
+
+def _new_version() -> str:
+    return uuid.uuid4().hex
+
+
+def _encode(value):
+    # Timestamps (e.g. on job documents) are stored as ISO 8601 strings
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _load(row) -> dict:
+    document = json.loads(row[1])
+    document["id"] = row[0]
+    return document
@@ -1,152 +1,276 @@
 # app/submissions.py
 
 from fastapi import HTTPException
-from app.database import db
-from typing import Optional
+from app.database import get_storage
+from app.models import Submission
+from app.batch import run_batch
+from app.documents import PRECONDITION_FAILED, get_owned, get_owned_many, parse_ids, read_if_match, write_owned
+from app.export import iter_pages
+from app.layout import mirror_writes, owned_repository, owner_filter
+from app.pagination import DEFAULT_PAGE_SIZE, parse_fields, paginate
+from app.ratings import apply_rating_changes
+from app.storage.base import Repository
+from app.versions import bump_version
+from pydantic import ValidationError
+from typing import List, Optional
+import time
 import uuid
 
+# Fields clients may request through the fields= parameter
+SUBMISSION_FIELDS = set(Submission.model_fields) | {"id", "user_id", "created_at"}
+
+# Columns written by the export, in order
+SUBMISSION_EXPORT_FIELDS = ["id"] + list(Submission.model_fields)
+
+# Fields a submission update may change
+SUBMISSION_UPDATABLE_FIELDS = {"comment", "city", "country", "rating", "condition", "temperature"}
+
 # Add a new submission
-def add_submission(submission_data: dict, username: str) -> str:
+def add_submission(submission_data: dict, user_id: str) -> str:
     """
     Add a new submission for a user and a item.
     :param submission_data: The submission details (item_it, longitude, latitude, rating).
-    :param username: The username of the authenticated user.
+    :param user_id: The ID of the authenticated user.
     :return: The ID of the newly created submission.
     """
-    # Get the user_id from the username (assumes the user exists)
-    user_ref = db.collection("users").where("username", "==", username).stream()
-    user = next(user_ref, None)
-
-    if user is None:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    user_id = user.id
-
     # Generate a unique submission ID
     submission_id = str(uuid.uuid4())
 
     # Add the user_id to the submission data
     submission_data["user_id"] = user_id
     submission_data["id"] = submission_id  # Store the unique submission ID
+    submission_data["created_at"] = time.time()  # Unix timestamp, used to weight recent ratings
+
+    # Save the submission and add its rating to the item's aggregate
+    submissions = owned_repository("submissions", user_id)
+    items = owned_repository("items", user_id)
+
+    def write(transaction):
+        # Only the user's own items can be rated
+        item = transaction.get(items, submission_data["item_id"])
+        if item is None or item["user_id"] != user_id:
+            raise HTTPException(status_code=404, detail="Item not found")
 
-    # Save the submission in Firestore
-    db.collection("submissions").document(submission_id).set(submission_data)
+        apply_rating_changes(transaction, [(submission_data["item_id"], submission_id, None, submission_data["rating"])])
+        transaction.set(submissions, submission_id, submission_data)
+
+    get_storage().run_transaction(write)
+    mirror_writes("submissions", user_id, [submission_id])
+    bump_version(user_id, "submissions")
     return submission_id
 
 
 # Get all submissions for a user, optionally filtered by item_id
-def get_submissions(username: str, item_id: Optional[str] = None):
+def get_submissions(user_id: str, item_id: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE,
+                    page_token: Optional[str] = None, fields: Optional[str] = None):
     """
-    Retrieve all submissions for the authenticated user, optionally filtered by item_id.
-    :param username: The username of the authenticated user.
+    Retrieve one page of submissions for the authenticated user, optionally filtered by item_id.
+    :param user_id: The ID of the authenticated user.
     :param item_id: The item_id to filter submissions by (optional).
-    :return: A list of submissions.
+    :param limit: The maximum number of submissions to return.
+    :param page_token: The token returned with the previous page (optional).
+    :param fields: Comma-separated submission fields to return (optional).
+    :return: A tuple of (list of submissions, next page token or None).
     """
-    user_ref = db.collection("users").where("username", "==", username).stream()
-    user = next(user_ref, None)
-
-    if user is None:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    user_id = user.id
+    projection = parse_fields(fields, SUBMISSION_FIELDS)
 
     # Get submissions for the user, optionally filtered by item_id
-    submissions_ref = db.collection("submissions").where("user_id", "==", user_id)
+    filters = owner_filter(user_id)
     
     if item_id:
-        submissions_ref = submissions_ref.where("item_id", "==", item_id)  # Filter by item_id if provided
+        filters["item_id"] = item_id  # Filter by item_id if provided
     
-    submissions = [submission.to_dict() for submission in submissions_ref.stream()]
-
-    return submissions
+    return paginate(owned_repository("submissions", user_id), filters, limit, page_token, projection)
 
 
-# Get a specific submission for the authenticated user.
-def get_submission(username: str, submission_id: str):
+# Build the GET /submissions/ response body
+def list_submissions(user_id: str, item_id: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE,
+                     page_token: Optional[str] = None, fields: Optional[str] = None, ids: Optional[str] = None) -> dict:
     """
-    Retrieve a specific submission for the authenticated user.
-    :param username: The username of the authenticated user.
-    :param submission_id: The ID of the submission to retrieve.
-    :return: The submission if found, otherwise raises an HTTPException.
+    Read one page of the user's submissions (optionally of one item), or the submissions with the given IDs.
+    :return: {"submissions", "next_page_token"}, or {"submissions", "missing"} when ids are given.
     """
-    user_ref = db.collection("users").where("username", "==", username).stream()
-    user = next(user_ref, None)
+    if ids is not None:
+        submissions, missing = get_submissions_by_id(ids, user_id, fields)
+        return {"submissions": submissions, "missing": missing}
 
-    if user is None:
-        raise HTTPException(status_code=404, detail="User not found")
+    submissions, next_page_token = get_submissions(user_id, item_id, limit, page_token, fields)
+    return {"submissions": submissions, "next_page_token": next_page_token}
 
-    user_id = user.id
-
-    # Retrieve the specific submission by user_id and submission_id
-    submission_ref = db.collection("submissions").where("user_id", "==", user_id).where("id", "==", submission_id).stream()
-    submission = next(submission_ref, None)
-
-    if submission is None:
-        raise HTTPException(status_code=404, detail="Submission not found")
-
-    return submission.to_dict()  # Convert Firestore document to dictionary
 
+# Get several submissions of the authenticated user by ID
+def get_submissions_by_id(ids: str, user_id: str, fields: Optional[str] = None):
+    """
+    Retrieve several submissions of the authenticated user in one read.
+    :param ids: Comma-separated submission IDs.
+    :param user_id: The ID of the authenticated user.
+    :param fields: Comma-separated submission fields to return (optional).
+    :return: A tuple of (submissions in request order, IDs not found).
+    """
+    projection = parse_fields(fields, SUBMISSION_FIELDS)
+    return get_owned_many(owned_repository("submissions", user_id), parse_ids(ids), user_id, projection)
 
-def update_submission(submission_id: str, update_data: dict, username: str):
-    # Get user ID from Firestore
-    user_ref = db.collection("users").where("username", "==", username).stream()
-    user = next(user_ref, None)
-    if user is None:
-        raise HTTPException(status_code=404, detail="User not found")
 
-    user_id = user.id  # Get the user ID
+# Stream all submissions for a user, optionally filtered by item_id
+def export_submissions(user_id: str, item_id: Optional[str] = None):
+    """
+    Stream every submission of the authenticated user, one page at a time.
+    :param user_id: The ID of the authenticated user.
+    :param item_id: The item_id to filter submissions by (optional).
+    :return: An iterator of pages of submissions (lists of dicts).
+    """
+    filters = owner_filter(user_id)
 
-    # Fetch the existing submission
-    submission_ref = db.collection("submissions").document(submission_id).get()
-    if not submission_ref.exists:
-        raise HTTPException(status_code=404, detail="Submission not found")
+    if item_id:
+        filters["item_id"] = item_id
 
-    submission_data = submission_ref.to_dict()
+    return iter_pages(owned_repository("submissions", user_id), filters, SUBMISSION_EXPORT_FIELDS)
 
-    # Ensure the submission belongs to the user
-    if submission_data["user_id"] != user_id:
-        raise HTTPException(status_code=403, detail="Unauthorized to update this submission")
 
-    # Only allow updating longitude, latitude, and rating
-    allowed_fields = {"comment", "city", "country", "rating"}
-    update_data = {k: v for k, v in update_data.items() if k in allowed_fields}
+# Get a specific submission for the authenticated user.
+def get_submission(user_id: str, submission_id: str):
+    """
+    Retrieve a specific submission for the authenticated user.
+    :param user_id: The ID of the authenticated user.
+    :param submission_id: The ID of the submission to retrieve.
+    :return: A tuple of (submission, version) if found, otherwise raises an HTTPException.
+    """
+    # Read the submission directly and check its owner
+    return get_owned(owned_repository("submissions", user_id), submission_id, user_id, "Submission not found")
 
-    # Perform the update
-    db.collection("submissions").document(submission_id).update(update_data)
-    
-    return {"message": "Submission updated successfully"}
 
+def update_submission(submission_id: str, update_data: dict, user_id: str, if_match: Optional[List[str]] = None):
+    """
+    Update a submission for the authenticated user.
+    :param submission_id: The submission ID.
+    :param update_data: The fields to change.
+    :param user_id: The ID of the authenticated user.
+    :param if_match: The versions the client edited (If-Match), or None to apply the update to any version.
+    :return: A tuple of (message indicating success, the new version, or None when the rating changed).
+    """
+    submissions = owned_repository("submissions", user_id)
+
+    # Only allow updating comment, city, country, rating and the weather
+    update_data = {k: v for k, v in update_data.items() if k in SUBMISSION_UPDATABLE_FIELDS}
+
+    # Without a new rating the aggregates are untouched, so a single write is enough
+    if "rating" not in update_data:
+        def write_unrated(submission_data, version):
+            changes = _validated_changes(submission_data, update_data)
+            return submissions.update(submission_id, changes, version=version)
+
+        version = write_owned(submissions, submission_id, user_id, write_unrated,
+                              "Submission not found", "Unauthorized to update this submission", if_match)
+        mirror_writes("submissions", user_id, [submission_id])
+        bump_version(user_id, "submissions")
+        return {"message": "Submission updated successfully"}, version
+
+    expected = read_if_match(submissions, submission_id, user_id, if_match)
+
+    def write(transaction):
+        # Fetch the existing submission
+        submission_data = transaction.get(submissions, submission_id)
+        if submission_data is None:
+            raise HTTPException(status_code=404, detail="Submission not found")
+
+        # Ensure the submission belongs to the user
+        if submission_data["user_id"] != user_id:
+            raise HTTPException(status_code=403, detail="Unauthorized to update this submission")
+        if expected is not None and submission_data != expected:
+            raise HTTPException(status_code=412, detail=PRECONDITION_FAILED)
+
+        # Perform the update, moving the rating within the item's aggregate
+        changes = _validated_changes(submission_data, update_data)
+        apply_rating_changes(
+            transaction, [(submission_data["item_id"], submission_id, submission_data.get("rating"), changes["rating"])]
+        )
+        transaction.update(submissions, submission_id, changes)
+
+    get_storage().run_transaction(write)
+    mirror_writes("submissions", user_id, [submission_id])
+    bump_version(user_id, "submissions")
+    return {"message": "Submission updated successfully"}, None
+
+# Validate an update against the stored submission
+def _validated_changes(submission_data: dict, update_data: dict) -> dict:
+    # The updated submission must still be valid (the rating feeds the aggregates)
+    try:
+        validated = Submission(**{**submission_data, **update_data}).model_dump()
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=e.errors(include_url=False, include_context=False))
+    return {k: validated[k] for k in update_data}
 
 
 
 # Delete a submission
-def delete_submission(submission_id: str, username: str):
+def delete_submission(submission_id: str, user_id: str, if_match: Optional[List[str]] = None):
     """
     Delete a submission for the authenticated user.
     :param submission_id: The submission ID.
-    :param username: The username of the authenticated user.
+    :param user_id: The ID of the authenticated user.
+    :param if_match: The versions the client deletes (If-Match), or None to delete any version.
     :return: A message indicating success.
     """
-    user_ref = db.collection("users").where("username", "==", username).stream()
-    user = next(user_ref, None)
-
-    if user is None:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    user_id = user.id
+    submissions = owned_repository("submissions", user_id)
+    expected = read_if_match(submissions, submission_id, user_id, if_match)
 
-    # Fetch the submission
-    submission_ref = db.collection("submissions").document(submission_id).get()
+    def write(transaction):
+        # Fetch the submission
+        submission_data = transaction.get(submissions, submission_id)
 
-    if not submission_ref.exists:
-        raise HTTPException(status_code=404, detail="Submission not found")
+        if submission_data is None:
+            raise HTTPException(status_code=404, detail="Submission not found")
 
-    submission_data = submission_ref.to_dict()
+        # Ensure the submission belongs to the user
+        if submission_data["user_id"] != user_id:
+            raise HTTPException(status_code=403, detail="Unauthorized to delete this submission")
+        if expected is not None and submission_data != expected:
+            raise HTTPException(status_code=412, detail=PRECONDITION_FAILED)
 
-    # Ensure the submission belongs to the user
-    if submission_data["user_id"] != user_id:
-        raise HTTPException(status_code=403, detail="Unauthorized to delete this submission")
+        # Delete the submission and remove its rating from the item's aggregate
+        apply_rating_changes(transaction, [(submission_data["item_id"], submission_id, submission_data.get("rating"), None)])
+        transaction.delete(submissions, submission_id)
 
-    # Delete the submission
-    db.collection("submissions").document(submission_id).delete()
+    get_storage().run_transaction(write)
+    mirror_writes("submissions", user_id, [submission_id])
+    bump_version(user_id, "submissions")
     return {"message": "Submission deleted successfully"}
+
+# Delete submissions by ID, keeping the rating aggregates in step
+def delete_submission_documents(repository: Repository, submission_ids: List[str]):
+    """
+    Delete several submissions (of any owner) in one transaction, e.g. from a cleanup job.
+    Collection versions are left alone: the owners are deleted users.
+    :param repository: The repository holding the submissions (flat, or one user's).
+    :param submission_ids: The IDs of the submissions to delete.
+    """
+    def write(transaction):
+        submissions = transaction.get_many(repository, submission_ids)
+        apply_rating_changes(
+            transaction, [
+                (submission.get("item_id"), submission_id, submission.get("rating"), None)
+                for submission_id, submission in submissions.items()
+            ]
+        )
+        for submission_id in submissions:
+            transaction.delete(repository, submission_id)
+
+    get_storage().run_transaction(write)
+
+# Apply a batch of submission operations
+def batch_submissions(operations: list, user_id: str):
+    """
+    Create, update and delete several submissions in one request.
+    :param operations: The list of operations (op, id, data).
+    :param user_id: The ID of the authenticated user.
+    :return: One result per operation, in request order.
+    """
+    return run_batch("submissions", Submission, SUBMISSION_UPDATABLE_FIELDS, operations, user_id,
+                     on_changes=_rating_changes, references=("item_id", "items"))
+
+# Feed a batch's submission changes into the rating aggregates
+def _rating_changes(transaction, changes):
+    apply_rating_changes(transaction, [
+        ((after or before)["item_id"], (after or before)["id"], before and before.get("rating"), after and after.get("rating"))
+        for before, after in changes
+    ])
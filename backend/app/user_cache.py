@@ -0,0 +1,85 @@
+#app/user_cache.py
+from app.database import get_storage
+from app.config import USER_CACHE_SIZE, USER_CACHE_TTL
+from app.metrics import cache_counters
+from app.usernames import get_user_id
+from cachetools import TTLCache
+from typing import Optional
+import threading
+
+# User records by ID, and user IDs by username.
+# Entries expire after USER_CACHE_TTL seconds, which also bounds how stale
+# another worker's view can be after an update or delete.
+_users_by_id = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+_ids_by_username = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+_lock = threading.Lock()
+_hits, _misses = cache_counters("user")
+
+
+def _store(user: dict):
+    with _lock:
+        _users_by_id[user["id"]] = user
+        _ids_by_username[user["username"]] = user["id"]
+
+
+# Get a user record by ID
+def get_user_by_id(user_id: str) -> Optional[dict]:
+    """
+    Retrieve a user record by ID, reading storage only on a cache miss.
+    :param user_id: The ID of the user.
+    :return: A copy of the user record, or None if the user does not exist.
+    """
+    with _lock:
+        user = _users_by_id.get(user_id)
+
+    if user is None:
+        _misses.inc()
+        user = get_storage().users.get(user_id)
+        if user is None:
+            return None
+        _store(user)
+    else:
+        _hits.inc()
+
+    return dict(user)
+
+# Get a user record by username
+def get_user_by_username(username: str) -> Optional[dict]:
+    """
+    Retrieve a user record by username. On a cache miss the username index gives the
+    user ID with a point read, and the user record takes a second one.
+    :param username: The username of the user.
+    :return: A copy of the user record, or None if the user does not exist.
+    """
+    with _lock:
+        user_id = _ids_by_username.get(username)
+
+    if user_id is not None:
+        user = get_user_by_id(user_id)
+        # The username may have changed since the mapping was cached
+        if user is not None and user["username"] == username:
+            return user
+
+    _misses.inc()
+    user_id = get_user_id(username)
+    if user_id is None:
+        return None
+
+    user = get_storage().users.get(user_id)
+    if user is None or user["username"] != username:
+        return None
+
+    _store(user)
+    return dict(user)
+
+# Drop a user from the cache
+def invalidate_user(user_id: str):
+    """
+    Remove a user record (and its username mapping) from the cache.
+    Must be called after any write to the user's document.
+    :param user_id: The ID of the user.
+    """
+    with _lock:
+        user = _users_by_id.pop(user_id, None)
+        if user is not None and _ids_by_username.get(user["username"]) == user_id:
+            del _ids_by_username[user["username"]]
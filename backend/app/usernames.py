@@ -0,0 +1,108 @@
+#app/usernames.py
+from fastapi import HTTPException
+from app.config import USERNAME_QUERY_FALLBACK
+from app.database import get_storage
+from app.export import iter_pages
+from app.storage.base import Transaction
+from typing import Optional
+from urllib.parse import quote
+import logging
+
+logger = logging.getLogger(__name__)
+
+# The usernames collection maps each username to its user: usernames/{username} = {"user_id": ...}.
+# It is written in the same transaction as the user document, so a username is claimed
+# atomically, and finding a user by name is a point read instead of a query.
+BACKFILL_PAGE_SIZE = 500
+
+
+# Document ID of a username's index entry
+def username_key(username: str) -> str:
+    # Escape "/" (and "%"), which cannot appear in a document ID
+    return quote(username, safe="")
+
+# Look up the ID of the user holding a username
+def get_user_id(username: str) -> Optional[str]:
+    """
+    :param username: The username.
+    :return: The user ID from the index (or, for a user created before it, from a query on
+        the users, which indexes the name), or None if the username is not taken.
+    """
+    entry = get_storage().usernames.get(username_key(username))
+    if entry is not None:
+        return entry["user_id"]
+    if USERNAME_QUERY_FALLBACK:
+        return _index_unindexed_user(username)
+    return None
+
+# Find a user created before the username index by a query, and index their username
+def _index_unindexed_user(username: str) -> Optional[str]:
+    storage = get_storage()
+    user = next(storage.users.query({"username": username}, limit=1, fields=[]), None)
+    if user is None:
+        return None
+
+    def write(transaction) -> str:
+        # Unless the name was indexed meanwhile (e.g. by backfill-usernames)
+        entry = transaction.get(storage.usernames, username_key(username))
+        if entry is not None:
+            return entry["user_id"]
+        transaction.set(storage.usernames, username_key(username), {"user_id": user["id"]})
+        return user["id"]
+
+    user_id = storage.run_transaction(write)
+    logger.info("Indexed username %r of user %s, created before the username index", username, user_id)
+    return user_id
+
+# Check inside a transaction that a username can be given to a user
+def check_username_available(transaction: Transaction, username: str, user_id: str):
+    """
+    Read the username's index entry (and its holder, if it belongs to someone else) as part
+    of the transaction, so a concurrent claim of the same name makes the transaction retry.
+    Call it before the transaction's first write.
+    :param transaction: The transaction that will claim the username.
+    :param username: The wanted username.
+    :param user_id: The user who wants it.
+    """
+    storage = get_storage()
+    entry = transaction.get(storage.usernames, username_key(username))
+    if entry is None or entry["user_id"] == user_id:
+        return
+    # An entry whose user no longer exists does not hold the name
+    if transaction.get(storage.users, entry["user_id"]) is not None:
+        raise HTTPException(status_code=400, detail="Username already exists")
+
+# Write the username index for users created before it existed
+def backfill_username_index() -> dict:
+    """
+    Scan all users and add the index entries that are missing. Safe to run again, and
+    while the app serves traffic: a name already indexed for another user is left alone
+    and reported as a conflict.
+    :return: Counts of users "scanned", entries "created" and "conflicts".
+    """
+    storage = get_storage()
+    counts = {"scanned": 0, "created": 0, "conflicts": 0}
+
+    for page in iter_pages(storage.users, {}, ["username"], BACKFILL_PAGE_SIZE):
+        keys = {user["id"]: username_key(user["username"]) for user in page if user.get("username")}
+        existing = storage.usernames.get_many(keys.values())
+
+        batch = storage.batch()
+        created = 0
+        for user_id, key in keys.items():
+            entry = existing.get(key)
+            if entry is None:
+                batch.set(storage.usernames, key, {"user_id": user_id})
+                existing[key] = {"user_id": user_id}
+                created += 1
+            elif entry["user_id"] != user_id:
+                logger.warning("Username %r of user %s is already indexed for user %s", key, user_id, entry["user_id"])
+                counts["conflicts"] += 1
+        if created:
+            batch.commit()
+
+        counts["scanned"] += len(page)
+        counts["created"] += created
+
+    logger.info("Backfilled the username index: %s", counts)
+    return counts
@@ -1,21 +1,15 @@
 #app/users.py
 from fastapi import HTTPException
-from app.database import db
+from app.database import get_storage
 from app.auth import create_access_token
-from passlib.context import CryptContext
+from app.config import ACCESS_TOKEN_TTL
+from app.refresh_tokens import issue_refresh_token, revoke_refresh_tokens, rotate_refresh_token
+from app.user_cache import get_user_by_id, get_user_by_username, invalidate_user
+from app.hashing import hash_password, verify_password
+from app.jobs import create_user_data_deletion_job
+from app.usernames import check_username_available, get_user_id, username_key
 import uuid
 
-# Initialize password hasher
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-# Hash password before storing
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
-
-# Verify password during login
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
-
 # Register a new user
 def register_user(user_data: dict):
     """
@@ -23,9 +17,8 @@ def register_user(user_data: dict):
     :param user_data: A dictionary containing user details (username, email, password).
     :return: User ID if successful.
     """
-    # Check if username already exists
-    user_ref = db.collection("users").where("username", "==", user_data["username"]).stream()
-    if any(user_ref):
+    # Check if username already exists (a point read, before paying for the hash)
+    if get_user_id(user_data["username"]) is not None and get_user_by_username(user_data["username"]) is not None:
         raise HTTPException(status_code=400, detail="Username already exists")
 
     # Generate unique user ID
@@ -35,66 +28,137 @@ def register_user(user_data: dict):
     user_data["password"] = hash_password(user_data["password"])
     user_data["id"] = user_id  # Store the unique ID
 
-    # Save user data in Firestore
-    db.collection("users").document(user_id).set(user_data)
+    # Save the user and claim the username together; of concurrent registrations
+    # of one username, only the first to commit gets it
+    storage = get_storage()
+
+    def create(transaction):
+        check_username_available(transaction, user_data["username"], user_id)
+        transaction.set(storage.users, user_id, user_data)
+        transaction.set(storage.usernames, username_key(user_data["username"]), {"user_id": user_id})
+
+    storage.run_transaction(create)
     return user_id
 
+# Token response for an authenticated user
+def _token_response(user: dict, refresh_token: str) -> dict:
+    # Embed the user ID so authenticated requests need no username lookup
+    return {
+        "access_token": create_access_token({"sub": user["username"], "uid": user["id"]}),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_TTL,
+        "refresh_token": refresh_token,
+    }
+
 # Authenticate user and generate JWT token
 def login_user(user_data: dict):
     """
-    Authenticate user and return a JWT token.
+    Authenticate user and return a JWT access token and a refresh token.
     """
-    user_ref = db.collection("users").where("username", "==", user_data["username"]).stream()
-    stored_user = next(user_ref, None)
+    stored_user = get_user_by_username(user_data["username"])
 
     if stored_user is None:
         raise HTTPException(status_code=400, detail="Invalid credentials")
 
-    stored_user = stored_user.to_dict()
-
     # Verify hashed password
     if not verify_password(user_data["password"], stored_user["password"]):
         raise HTTPException(status_code=400, detail="Invalid credentials")
 
-    # Generate token using username as the identifier
-    token = create_access_token({"sub": stored_user["username"]})
-    return token
+    return _token_response(stored_user, issue_refresh_token(stored_user["id"]))
+
+# Renew the tokens without the password
+def refresh_user_token(refresh_token: str):
+    """
+    Exchange a refresh token for a new access token and the next refresh token.
+    No password hash is checked: this costs a few storage reads and one write.
+    :param refresh_token: The refresh token from the last login or refresh.
+    :return: The same response as a login.
+    """
+    user_id, next_refresh_token = rotate_refresh_token(refresh_token)
+    user = get_user_by_id(user_id)
+    if user is None:
+        raise HTTPException(status_code=403, detail="Invalid refresh token")
+    return _token_response(user, next_refresh_token)
 
 # Get user details
-def get_user_details(user_username: str):
+def get_user_details(user_id: str):
     """
-    Retrieve user details from Firestore using username.
+    Retrieve user details using the user ID.
     """
-    user_ref = db.collection("users").where("username", "==", user_username).stream()
-    user = next(user_ref, None)
+    user = get_user_by_id(user_id)
 
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
 
-    return user.to_dict()
+    return user
 
 # Update user details
 def update_user_info(user_id: str, update_data: dict):
     """
     Update user details in Firestore.
     """
-    # Hash new password if provided
-    if "password" in update_data:
-        update_data["password"] = hash_password(update_data["password"])
+    storage = get_storage()
 
-    db.collection("users").document(user_id).update(update_data)
+    # PUT sends the whole user: a password matching the stored one is left alone, a new one is hashed
+    password_changed = False
+    if "password" in update_data:
+        stored_user = storage.users.get(user_id)
+        if stored_user is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        if verify_password(update_data["password"], stored_user["password"]):
+            update_data = {k: v for k, v in update_data.items() if k != "password"}
+        else:
+            update_data["password"] = hash_password(update_data["password"])
+            password_changed = True
+
+    # A new username is claimed, and the old one released, with the update
+    def update(transaction):
+        user = transaction.get(storage.users, user_id)
+        if user is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        renamed = "username" in update_data and update_data["username"] != user["username"]
+        if renamed:
+            check_username_available(transaction, update_data["username"], user_id)
+
+        transaction.update(storage.users, user_id, update_data)
+        if renamed:
+            transaction.delete(storage.usernames, username_key(user["username"]))
+            transaction.set(storage.usernames, username_key(update_data["username"]), {"user_id": user_id})
+
+    storage.run_transaction(update)
+    invalidate_user(user_id)
+    # Sessions started with the old password must log in again
+    if password_changed:
+        revoke_refresh_tokens(user_id)
     return {"message": "User information updated successfully"}
 
 # Delete a user from Firestore
-def delete_user(user_username: str):
+def delete_user(user_id: str):
     """
-    Delete a user from Firestore by username.
+    Delete a user from Firestore by user ID.
+    The user's items and submissions are removed by a background job; the
+    returned job_id identifies it.
     """
-    user_ref = db.collection("users").where("username", "==", user_username).stream()
-    user = next(user_ref, None)
-
-    if user is None:
+    if get_user_by_id(user_id) is None:
         raise HTTPException(status_code=404, detail="User not found")
 
-    db.collection("users").document(user.id).delete()
-    return {"message": "User account deleted successfully"}
+    storage = get_storage()
+
+    # The username is released with the user, and the job deleting their data is created with it
+    def remove(transaction):
+        user = transaction.get(storage.users, user_id)
+        if user is None:
+            return None
+        key = username_key(user["username"])
+        entry = transaction.get(storage.usernames, key)
+        transaction.delete(storage.users, user_id)
+        if entry is not None and entry["user_id"] == user_id:
+            transaction.delete(storage.usernames, key)
+        return create_user_data_deletion_job(transaction, user_id)
+
+    job_id = storage.run_transaction(remove)
+    if job_id is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    invalidate_user(user_id)
+    revoke_refresh_tokens(user_id)
+    return {"message": "User account deleted successfully", "job_id": job_id}
@@ -0,0 +1,84 @@
+#app/versions.py
+from app.database import get_storage
+from app.list_cache import invalidate_lists
+from fastapi import Request, Response
+from typing import Optional, Tuple
+import hashlib
+
+# Polling clients revalidate every time, and shared caches never store the per-user lists
+CACHE_CONTROL = "private, no-cache"
+
+
+# Record a change to one of the user's collections
+def bump_version(user_id: str, collection: str):
+    """
+    Advance the user's version of a collection. Call it after the write has been applied,
+    so a client never sees the new version together with the old contents.
+    :param user_id: The owner of the changed documents.
+    :param collection: The changed collection ("items" or "submissions").
+    """
+    get_storage().versions.increment(user_id, collection)
+    invalidate_lists(user_id, collection)
+
+# Get the user's version of a collection
+def get_version(user_id: str, collection: str) -> int:
+    """
+    :param user_id: The ID of the authenticated user.
+    :param collection: The collection ("items" or "submissions").
+    :return: The number of changes made to the collection so far (0 if none).
+    """
+    versions = get_storage().versions.get(user_id) or {}
+    return versions.get(collection, 0)
+
+# Weak ETag of a list response
+def collection_etag(user_id: str, collection: str, query: str) -> str:
+    """
+    Build the ETag of a list response from the collection version, with a single small read.
+    The user and query string are part of the tag, so responses for different users,
+    pages or fields never share one.
+    :param user_id: The ID of the authenticated user.
+    :param collection: The collection listed.
+    :param query: The request's query string.
+    :return: A weak ETag, e.g. W/"3f1c...".
+    """
+    version = get_version(user_id, collection)
+    digest = hashlib.sha256(f"{user_id}\n{collection}\n{version}\n{query}".encode()).hexdigest()[:32]
+    return f'W/"{digest}"'
+
+# Check an If-None-Match header against an ETag
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Weak comparison, as If-None-Match requires: W/ prefixes are ignored.
+    :param if_none_match: The header value (a list of tags, or "*"), or None.
+    :param etag: The current ETag.
+    :return: True if the client's copy is current.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    def opaque(tag: str) -> str:
+        tag = tag.strip()
+        return tag[2:] if tag.startswith("W/") else tag
+
+    return any(opaque(tag) == opaque(etag) for tag in if_none_match.split(","))
+
+# Answer a conditional list request
+def check_etag(request: Request, user_id: str, collection: str) -> Tuple[str, Optional[Response]]:
+    """
+    Compute a list response's ETag and, if the client's If-None-Match is current,
+    the 304 Not Modified answer, before the list is read.
+    :param request: The incoming request.
+    :param user_id: The ID of the authenticated user.
+    :param collection: The collection listed.
+    :return: A tuple of (ETag, 304 response or None to go on and return the list).
+    """
+    etag = collection_etag(user_id, collection, request.url.query)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return etag, Response(status_code=304, headers=etag_headers(etag))
+    return etag, None
+
+# Headers sent with a list response or its 304
+def etag_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
@@ -0,0 +1,202 @@
+#app/weather.py
+from abc import ABC, abstractmethod
+from app.config import (
+    WEATHER_PROVIDER, WEATHER_FILE, OPENWEATHERMAP_API_KEY, WEATHER_CACHE_SIZE, WEATHER_CACHE_TTL
+)
+from app.metrics import cache_counters
+from cachetools import TTLCache
+from concurrent.futures import Future
+from typing import Dict, Optional, Tuple
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class WeatherUnavailable(Exception):
+    """Raised when the weather provider cannot be reached or fails."""
+
+
+# Normalize a city, country or condition for comparison
+def normalize(value: Optional[str]) -> str:
+    return (value or "").strip().casefold()
+
+def place_key(city: str, country: str) -> Tuple[str, str]:
+    return normalize(city), normalize(country)
+
+
+class WeatherProvider(ABC):
+    """A source of current weather. Results are cached by get_weather, not here."""
+
+    @abstractmethod
+    def fetch(self, city: str, country: str) -> Optional[dict]:
+        """
+        :return: {"condition": str, "temperature": float} (degrees Celsius), or None if the place is unknown.
+        Raises WeatherUnavailable if the upstream service fails.
+        """
+
+
+class FileWeatherProvider(WeatherProvider):
+    """
+    Local stand-in for an upstream service, for development, tests and benchmarks.
+    Reads a JSON object mapping "city,country" to {"condition", "temperature"}.
+    :param path: The JSON file (a missing file means every place is unknown).
+    :param latency: Seconds to sleep on every fetch, to simulate a remote service.
+    """
+
+    def __init__(self, path: Optional[str] = None, latency: float = 0.0, data: Optional[dict] = None):
+        self.latency = latency
+        self.fetches = 0
+        self._lock = threading.Lock()
+        if data is None and path is not None and os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+        self._data = {}
+        for place, weather in (data or {}).items():
+            city, _, country = place.partition(",")
+            self._data[place_key(city, country)] = weather
+
+    def fetch(self, city: str, country: str) -> Optional[dict]:
+        with self._lock:
+            self.fetches += 1
+        if self.latency:
+            time.sleep(self.latency)
+        weather = self._data.get(place_key(city, country))
+        return dict(weather) if weather is not None else None
+
+
+class OpenWeatherMapProvider(WeatherProvider):
+    """Current weather from the OpenWeatherMap API (country as an ISO 3166 code)."""
+
+    URL = "https://api.openweathermap.org/data/2.5/weather"
+
+    def __init__(self, api_key: str, timeout: float = 5.0):
+        import requests
+        self._session = requests.Session()
+        self._api_key = api_key
+        self._timeout = timeout
+
+    def fetch(self, city: str, country: str) -> Optional[dict]:
+        import requests
+        try:
+            response = self._session.get(
+                self.URL,
+                params={"q": f"{city},{country}", "units": "metric", "appid": self._api_key},
+                timeout=self._timeout,
+            )
+        except requests.RequestException as e:
+            raise WeatherUnavailable(str(e))
+        if response.status_code == 404:
+            return None
+        if response.status_code != 200:
+            raise WeatherUnavailable(f"OpenWeatherMap returned {response.status_code}")
+
+        body = response.json()
+        return {"condition": body["weather"][0]["main"].lower(), "temperature": body["main"]["temp"]}
+
+
+# Create a weather provider by name
+def create_provider(provider: str = WEATHER_PROVIDER) -> WeatherProvider:
+    """
+    Create the weather provider selected by configuration.
+    :param provider: "file" or "openweathermap".
+    :return: A WeatherProvider instance.
+    """
+    if provider == "file":
+        return FileWeatherProvider(WEATHER_FILE)
+    if provider == "openweathermap":
+        if not OPENWEATHERMAP_API_KEY:
+            raise ValueError("OPENWEATHERMAP_API_KEY is required for WEATHER_PROVIDER=openweathermap")
+        return OpenWeatherMapProvider(OPENWEATHERMAP_API_KEY)
+    raise ValueError(f"Unknown WEATHER_PROVIDER: {provider!r}")
+
+
+_provider: Optional[WeatherProvider] = None
+
+# Weather per normalized (city, country). Unknown places are cached too (as None),
+# so they do not reach the provider on every request either.
+_cache = TTLCache(maxsize=WEATHER_CACHE_SIZE, ttl=WEATHER_CACHE_TTL)
+# Fetches in progress; later requests for the same place wait for these
+_in_flight: Dict[Tuple[str, str], Future] = {}
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "coalesced": 0, "errors": 0}
+_hits, _misses = cache_counters("weather")
+
+
+# Get the process-wide weather provider, creating it on first use
+def get_provider() -> WeatherProvider:
+    global _provider
+    if _provider is None:
+        with _lock:
+            if _provider is None:
+                _provider = create_provider()
+    return _provider
+
+# Replace the weather provider and clear the cache (tests and benchmarks)
+def set_provider(provider: Optional[WeatherProvider]):
+    global _provider
+    with _lock:
+        _provider = provider
+        _cache.clear()
+
+# Get the current weather for a place
+def get_weather(city: str, country: str) -> Optional[dict]:
+    """
+    Return the current weather, fetching it only when the place is not cached.
+    Concurrent calls for the same place share a single upstream fetch.
+    Raises WeatherUnavailable if the provider fails.
+    :param city: The city.
+    :param country: The country.
+    :return: {"condition", "temperature"}, or None if the provider does not know the place.
+    """
+    key = place_key(city, country)
+
+    with _lock:
+        if key in _cache:
+            _stats["hits"] += 1
+            _hits.inc()
+            weather = _cache[key]
+            return dict(weather) if weather is not None else None
+
+        future = _in_flight.get(key)
+        leader = future is None
+        if leader:
+            future = _in_flight[key] = Future()
+            _stats["misses"] += 1
+            _misses.inc()
+        else:
+            _stats["coalesced"] += 1
+            _hits.inc()
+
+    if not leader:
+        weather = future.result()
+        return dict(weather) if weather is not None else None
+
+    try:
+        weather = get_provider().fetch(city.strip(), country.strip())
+    except Exception as e:
+        with _lock:
+            _stats["errors"] += 1
+            del _in_flight[key]
+        future.set_exception(e)
+        raise
+
+    with _lock:
+        _cache[key] = weather
+        del _in_flight[key]
+    future.set_result(weather)
+    return dict(weather) if weather is not None else None
+
+# Weather cache statistics
+def get_weather_stats() -> dict:
+    """
+    Snapshot of the weather cache: hits, misses (upstream fetches), requests that
+    waited for another request's fetch, failed fetches, and entries cached.
+    """
+    with _lock:
+        stats = dict(_stats)
+        stats["size"] = len(_cache)
+    return stats
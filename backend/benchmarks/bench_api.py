@@ -0,0 +1,231 @@
+#benchmarks/bench_api.py
+"""
+API benchmark: latency percentiles, throughput and storage round trips per route.
+
+Every route is driven through an ASGI client against the in-memory storage
+backend with an injectable per-round-trip latency. Routes run one after another,
+each with a fixed number of requests spread over concurrent clients, so the
+storage round trips counted during a phase belong to that route.
+
+Usage (from backend/):
+    python -m benchmarks.bench_api --output results.json
+    python -m benchmarks.bench_api --compare results.json   # exit 1 on regression
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+import uuid
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-not-for-production")
+
+import httpx  # noqa: E402
+
+import app.main as main  # noqa: E402
+from app.database import set_storage  # noqa: E402
+from app.storage.memory import MemoryStorage  # noqa: E402
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Bench:
+    def __init__(self, client: httpx.AsyncClient, storage: MemoryStorage, concurrency: int):
+        self.client = client
+        self.storage = storage
+        self.concurrency = concurrency
+        self.results = {}
+
+    async def phase(self, name: str, count: int, make_request):
+        """
+        Send `count` requests built by make_request(i) -> (method, url, kwargs) and record stats.
+        :return: The list of responses, in request order.
+        """
+        latencies = [0.0] * count
+        responses = [None] * count
+        next_index = iter(range(count))
+
+        async def worker():
+            for i in next_index:
+                method, url, kwargs = make_request(i)
+                start = time.perf_counter()
+                response = await self.client.request(method, url, **kwargs)
+                latencies[i] = time.perf_counter() - start
+                if response.status_code >= 400:
+                    raise RuntimeError(f"{name}: {response.status_code} {response.text}")
+                responses[i] = response
+
+        calls_before = self.storage.round_trips
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, count))))
+        elapsed = time.perf_counter() - start
+        calls = self.storage.round_trips - calls_before
+
+        latencies.sort()
+        self.results[name] = {
+            "requests": count,
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+            "requests_per_second": round(count / elapsed, 1),
+            "storage_calls_per_request": round(calls / count, 2),
+        }
+        return responses
+
+
+async def run(args) -> dict:
+    storage = MemoryStorage()
+    set_storage(storage)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.lifespan(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            storage.latency = args.latency
+            bench = Bench(client, storage, args.concurrency)
+            n = args.requests
+            n_auth = args.auth_requests
+            run_id = uuid.uuid4().hex[:8]
+
+            # Users (bcrypt-bound routes use a smaller request count)
+            users = [
+                {"username": f"bench_{run_id}_{i}", "email": f"bench_{i}@example.com", "password": "BenchPassword123"}
+                for i in range(n_auth)
+            ]
+            await bench.phase("POST /users/", n_auth, lambda i: ("POST", "/users/", {"json": users[i]}))
+            responses = await bench.phase(
+                "POST /tokens/", n_auth,
+                lambda i: ("POST", "/tokens/", {"json": {"username": users[i]["username"], "password": users[i]["password"]}})
+            )
+            all_headers = [{"Authorization": f"Bearer {r.json()['access_token']}"} for r in responses]
+            headers = all_headers[0]
+            auth = {"headers": headers}
+
+            await bench.phase("GET /users/me/", n, lambda i: ("GET", "/users/me/", auth))
+            await bench.phase("PUT /users/me/", n_auth, lambda i: ("PUT", "/users/me/", {"json": users[i], "headers": all_headers[i]}))
+
+            # Items
+            responses = await bench.phase(
+                "POST /items/", n, lambda i: ("POST", "/items/", {"json": {"name": f"Item_{i}", "color": "Red"}, **auth})
+            )
+            item_ids = [r.json()["id"] for r in responses]
+            await bench.phase("GET /items/", n, lambda i: ("GET", "/items/", auth))
+            await bench.phase("GET /items/{item_id}", n, lambda i: ("GET", f"/items/{item_ids[i]}", auth))
+            await bench.phase(
+                "PUT /items/{item_id}/", n, lambda i: ("PUT", f"/items/{item_ids[i]}/", {"json": {"color": "Blue"}, **auth})
+            )
+            await bench.phase("GET /items/export", max(1, n // 10), lambda i: ("GET", "/items/export", auth))
+            batch = {"operations": [{"op": "create", "data": {"name": f"Batch_{j}", "color": "Red"}} for j in range(20)]}
+            await bench.phase("POST /items:batch", max(1, n // 10), lambda i: ("POST", "/items:batch", {"json": batch, **auth}))
+
+            # Submissions
+            responses = await bench.phase(
+                "POST /submissions/", n,
+                lambda i: ("POST", "/submissions/", {"json": {
+                    "item_id": item_ids[i % len(item_ids)], "comment": "ok", "city": "London", "country": "UK", "rating": i % 101
+                }, **auth})
+            )
+            submission_ids = [r.json()["id"] for r in responses]
+            await bench.phase("GET /submissions/", n, lambda i: ("GET", "/submissions/", auth))
+            await bench.phase(
+                "GET /submissions/?item_id", n, lambda i: ("GET", "/submissions/", {"params": {"item_id": item_ids[i]}, **auth})
+            )
+            await bench.phase("GET /submissions/{submission_id}", n, lambda i: ("GET", f"/submissions/{submission_ids[i]}", auth))
+            await bench.phase(
+                "PUT /submissions/{submission_id}/", n,
+                lambda i: ("PUT", f"/submissions/{submission_ids[i]}/", {"json": {"rating": 50}, **auth})
+            )
+            await bench.phase("GET /submissions/export", max(1, n // 10), lambda i: ("GET", "/submissions/export", auth))
+            await bench.phase(
+                "DELETE /submissions/{submission_id}/", n, lambda i: ("DELETE", f"/submissions/{submission_ids[i]}/", auth)
+            )
+            await bench.phase("DELETE /items/{item_id}/", n, lambda i: ("DELETE", f"/items/{item_ids[i]}/", auth))
+
+            # Account deletion (includes the background data deletion job)
+            await bench.phase("DELETE /users/me/", n_auth, lambda i: ("DELETE", "/users/me/", {"headers": all_headers[i]}))
+
+    set_storage(None)
+    return {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "latency_ms": args.latency * 1000,
+            "requests": args.requests,
+            "auth_requests": args.auth_requests,
+            "concurrency": args.concurrency,
+        },
+        "routes": bench.results,
+    }
+
+
+def print_results(results: dict, baseline: dict = None):
+    header = f"{'route':<38} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>9} {'calls':>6}"
+    if baseline:
+        header += f" {'p95 vs base':>12}"
+    print(header)
+    for route, stats in results["routes"].items():
+        line = (f"{route:<38} {stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f} "
+                f"{stats['requests_per_second']:>9.1f} {stats['storage_calls_per_request']:>6.2f}")
+        base = (baseline or {}).get("routes", {}).get(route)
+        if base:
+            line += f" {stats['p95_ms'] / base['p95_ms']:>11.2f}x"
+        print(line)
+
+
+def find_regressions(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Routes whose p95 latency grew by more than `threshold` or that make more storage calls.
+    """
+    regressions = []
+    for route, stats in results["routes"].items():
+        base = baseline["routes"].get(route)
+        if base is None:
+            continue
+        if stats["p95_ms"] > base["p95_ms"] * threshold:
+            regressions.append(f"{route}: p95 {base['p95_ms']:.2f} ms -> {stats['p95_ms']:.2f} ms")
+        if stats["storage_calls_per_request"] > base["storage_calls_per_request"]:
+            regressions.append(
+                f"{route}: storage calls {base['storage_calls_per_request']} -> {stats['storage_calls_per_request']}"
+            )
+    return regressions
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.002, help="Seconds per storage round trip")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per route")
+    parser.add_argument("--auth-requests", type=int, default=20, help="Requests per password-hashing route")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients per route")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Compare against a previous results JSON file")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Allowed p95 growth factor when comparing")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if baseline:
+        regressions = find_regressions(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
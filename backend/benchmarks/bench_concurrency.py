@@ -0,0 +1,93 @@
+#benchmarks/bench_concurrency.py
+"""
+Concurrency benchmark: request throughput at 1, 16 and 64 concurrent clients.
+
+Runs the FastAPI app in-process through an ASGI transport against the in-memory
+storage backend, which blocks for a fixed latency per round trip. Two modes are measured:
+
+- inline:  data calls run directly on the event loop (the behaviour before
+           handlers were offloaded to worker threads);
+- offload: data calls run in the worker thread pool (current behaviour).
+
+Usage (from backend/):
+    python -m benchmarks.bench_concurrency --latency 0.01 --requests 256
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-not-for-production")
+
+import httpx  # noqa: E402
+from fastapi.concurrency import run_in_threadpool  # noqa: E402
+
+import app.main as main  # noqa: E402
+from app.database import set_storage  # noqa: E402
+from app.storage.memory import MemoryStorage  # noqa: E402
+
+
+async def _inline(func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+
+async def _setup(client: httpx.AsyncClient) -> tuple:
+    user = {"username": "bench_user", "email": "bench@example.com", "password": "BenchPassword123"}
+    await client.post("/users/", json=user)
+    response = await client.post("/tokens/", json={"username": user["username"], "password": user["password"]})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    response = await client.post("/items/", json={"name": "Item", "color": "Red"}, headers=headers)
+    return headers, response.json()["id"]
+
+
+async def _client_loop(client: httpx.AsyncClient, headers: dict, item_id: str, count: int):
+    # Three reads for every write
+    for i in range(count):
+        if i % 4 == 3:
+            response = await client.put(f"/items/{item_id}/", json={"color": f"Color_{i}"}, headers=headers)
+        else:
+            response = await client.get(f"/items/{item_id}", headers=headers)
+        assert response.status_code == 200, response.text
+
+
+async def _run(concurrency: int, total_requests: int, headers: dict, item_id: str, client: httpx.AsyncClient) -> float:
+    per_client = max(1, total_requests // concurrency)
+    start = time.perf_counter()
+    await asyncio.gather(*(_client_loop(client, headers, item_id, per_client) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return per_client * concurrency / elapsed
+
+
+async def main_async(args):
+    storage = MemoryStorage()
+    set_storage(storage)
+    results = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.lifespan(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            headers, item_id = await _setup(client)
+            storage.latency = args.latency
+            for mode in ("inline", "offload"):
+                main.run_in_threadpool = _inline if mode == "inline" else run_in_threadpool
+                for concurrency in args.concurrency:
+                    results[(mode, concurrency)] = await _run(concurrency, args.requests, headers, item_id, client)
+    main.run_in_threadpool = run_in_threadpool
+
+    print(f"latency per storage round trip: {args.latency * 1000:.1f} ms")
+    print(f"{'clients':>8} {'inline req/s':>14} {'offload req/s':>14} {'speedup':>8}")
+    for concurrency in args.concurrency:
+        inline = results[("inline", concurrency)]
+        offload = results[("offload", concurrency)]
+        print(f"{concurrency:>8} {inline:>14.1f} {offload:>14.1f} {offload / inline:>7.1f}x")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.01, help="Seconds per storage round trip")
+    parser.add_argument("--requests", type=int, default=256, help="Requests per run")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,106 @@
+#benchmarks/bench_contention.py
+"""
+Contention benchmark: many writers editing one item at once.
+
+Every writer runs read-modify-write cycles on the same item: GET it, add one to a counter
+kept in its name, and PUT the result. Runs the FastAPI app in-process through an ASGI
+transport against the in-memory storage backend, which blocks for a fixed latency per
+round trip. Two modes are measured:
+
+- blind:    PUT without If-Match; every PUT succeeds, the last writer wins and concurrent
+            increments are lost;
+- if-match: PUT with the ETag of the GET; a stale edit gets 412 and the writer reads again.
+
+Reports committed writes per second, the share of PUTs refused (412, after which the
+writer starts over) and the number of increments lost (successful PUTs minus the counter's
+final value).
+
+Usage (from backend/):
+    python -m benchmarks.bench_contention --latency 0.005 --writes 200
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-not-for-production")
+
+import httpx  # noqa: E402
+
+import app.main as main  # noqa: E402
+from app.database import set_storage  # noqa: E402
+from app.storage.memory import MemoryStorage  # noqa: E402
+
+
+async def _setup(client: httpx.AsyncClient) -> dict:
+    user = {"username": "bench_user", "email": "bench@example.com", "password": "BenchPassword123"}
+    await client.post("/users/", json=user)
+    response = await client.post("/tokens/", json={"username": user["username"], "password": user["password"]})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def _writer(client: httpx.AsyncClient, headers: dict, item_id: str, writes: int, if_match: bool, stats: dict):
+    done = 0
+    while done < writes:
+        response = await client.get(f"/items/{item_id}", headers=headers)
+        count = int(response.json()["item"]["name"])
+        put_headers = {**headers, "If-Match": response.headers["etag"]} if if_match else headers
+
+        response = await client.put(f"/items/{item_id}/", json={"name": str(count + 1)}, headers=put_headers)
+        stats["puts"] += 1
+        if response.status_code == 412:
+            stats["refused"] += 1
+            continue
+        assert response.status_code == 200, response.text
+        done += 1
+
+
+async def _run(client: httpx.AsyncClient, headers: dict, writers: int, writes: int, if_match: bool) -> dict:
+    response = await client.post("/items/", json={"name": "0", "color": "Red"}, headers=headers)
+    item_id = response.json()["id"]
+    per_writer = max(1, writes // writers)
+    stats = {"puts": 0, "refused": 0}
+
+    start = time.perf_counter()
+    await asyncio.gather(*(_writer(client, headers, item_id, per_writer, if_match, stats) for _ in range(writers)))
+    elapsed = time.perf_counter() - start
+
+    final = int((await client.get(f"/items/{item_id}", headers=headers)).json()["item"]["name"])
+    committed = per_writer * writers
+    return {
+        "writes/s": committed / elapsed,
+        "refused": stats["refused"] / stats["puts"],
+        "lost": committed - final,
+    }
+
+
+async def main_async(args):
+    storage = MemoryStorage()
+    set_storage(storage)
+    results = {}
+    async with main.lifespan(main.app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench") as client:
+            headers = await _setup(client)
+            storage.latency = args.latency
+            for writers in args.writers:
+                for mode in ("blind", "if-match"):
+                    results[(mode, writers)] = await _run(client, headers, writers, args.writes, mode == "if-match")
+
+    print(f"latency per storage round trip: {args.latency * 1000:.1f} ms, one item")
+    print(f"{'writers':>8} {'mode':>9} {'writes/s':>10} {'refused':>8} {'lost':>6}")
+    for writers in args.writers:
+        for mode in ("blind", "if-match"):
+            result = results[(mode, writers)]
+            print(f"{writers:>8} {mode:>9} {result['writes/s']:>10.1f} {result['refused']:>8.0%} {result['lost']:>6}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.005, help="Seconds per storage round trip")
+    parser.add_argument("--writes", type=int, default=200, help="Committed writes per run")
+    parser.add_argument("--writers", type=int, nargs="+", default=[1, 8, 32])
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,109 @@
+#benchmarks/bench_recommendations.py
+"""
+Recommendation benchmark: time to rank a user's items from a large submission history.
+
+Fills the in-memory storage backend with one user's items and submissions, then
+times each stage of get_recommendations separately (loading, encoding, matching
+today's place and weather, scoring) and end to end, both cold (the user's encoded
+history reloaded) and warm (reused from the per-process cache), reporting the
+median of several runs.
+
+Usage (from backend/):
+    python -m benchmarks.bench_recommendations --items 200 --submissions 30000
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-not-for-production")
+
+from app.database import get_storage, set_storage  # noqa: E402
+from app.export import iter_pages  # noqa: E402
+from app import recommendations  # noqa: E402
+from app.recommendations import (  # noqa: E402
+    HISTORY_FIELDS, ITEM_FIELDS, encode_history, get_recommendations, match_history, score_items
+)
+from app.storage.base import MAX_TRANSACTION_WRITES  # noqa: E402
+from app.storage.memory import MemoryStorage  # noqa: E402
+
+CITIES = [("London", "UK"), ("Oslo", "NO"), ("Lisbon", "PT"), ("Berlin", "DE")]
+CONDITIONS = ["clear", "rain", "snow", "clouds", "wind"]
+
+
+def populate(user_id: str, items: int, submissions: int):
+    storage = get_storage()
+    now = time.time()
+    item_ids = [f"item-{i:05d}" for i in range(items)]
+    for item_id in item_ids:
+        storage.items.set(item_id, {"id": item_id, "user_id": user_id, "name": item_id, "color": "Red"})
+
+    batch = storage.batch()
+    for i in range(submissions):
+        if i and i % MAX_TRANSACTION_WRITES == 0:
+            batch.commit()
+            batch = storage.batch()
+        city, country = random.choice(CITIES)
+        submission_id = f"submission-{i:07d}"
+        batch.set(storage.submissions, submission_id, {
+            "id": submission_id, "user_id": user_id, "item_id": random.choice(item_ids), "comment": "",
+            "city": city, "country": country, "rating": random.randint(0, 100),
+            "condition": random.choice(CONDITIONS), "temperature": random.uniform(-10, 35),
+            "created_at": now - random.uniform(0, 365 * 86400),
+        })
+    batch.commit()
+
+
+def median_ms(func, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=200, help="Items owned by the user")
+    parser.add_argument("--submissions", type=int, default=30000, help="Submissions by the user")
+    parser.add_argument("--runs", type=int, default=10, help="Runs per measurement")
+    args = parser.parse_args()
+
+    random.seed(0)
+    set_storage(MemoryStorage())
+    user_id = "bench-user"
+    populate(user_id, args.items, args.submissions)
+
+    storage = get_storage()
+    items = [item for page in iter_pages(storage.items, {"user_id": user_id}, ITEM_FIELDS) for item in page]
+    item_index = {item["id"]: index for index, item in enumerate(items)}
+    submissions = [s for page in iter_pages(storage.submissions, {"user_id": user_id}, HISTORY_FIELDS) for s in page]
+    encoded = encode_history(submissions, item_index)
+    history = match_history(encoded, "London", "UK", "rain")
+    # Versions are bumped by the API after each write; populate writes directly
+    storage.versions.set(user_id, {"items": 1, "submissions": 1})
+
+    def cold():
+        recommendations._histories.clear()
+        get_recommendations(user_id, "London", "UK", "rain", 8.0)
+
+    stages = {
+        "load (storage reads)": lambda: [s for page in iter_pages(storage.submissions, {"user_id": user_id}, HISTORY_FIELDS) for s in page],
+        "encode (encode_history)": lambda: encode_history(submissions, item_index),
+        "match (match_history)": lambda: match_history(encoded, "London", "UK", "rain"),
+        "score (score_items)": lambda: score_items(history, len(items), 8.0),
+        "end to end, cold": cold,
+        "end to end, warm": lambda: get_recommendations(user_id, "London", "UK", "rain", 8.0),
+    }
+
+    print(f"{args.items} items, {args.submissions} submissions, median of {args.runs} runs")
+    for name, func in stages.items():
+        print(f"{name:<24} {median_ms(func, args.runs):>9.2f} ms")
+
+    set_storage(None)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,82 @@
+#benchmarks/bench_startup.py
+"""
+Startup benchmark: cold import and time to first response, in fresh processes.
+
+Each run starts a new interpreter (as a new container or worker would) that imports
+app.main, runs the app's startup (lifespan) and sends two requests through an
+in-process ASGI client: the first pays for anything still initialized lazily, the
+second shows the steady state. Reports the median of each stage over the runs,
+plus the whole process from spawn to exit.
+
+Usage (from backend/):
+    python -m benchmarks.bench_startup --runs 10
+    STORAGE_BACKEND=sqlite SQLITE_PATH=/tmp/bench.db python -m benchmarks.bench_startup
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Runs in the child process; httpx is imported first because the server is not part of the app's startup
+CHILD = r"""
+import asyncio, json, time, uuid
+import httpx
+
+start = time.perf_counter()
+from app.main import app
+imported = time.perf_counter()
+
+async def run():
+    async with app.router.lifespan_context(app):
+        started = time.perf_counter()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            timings = []
+            for _ in range(2):
+                before = time.perf_counter()
+                user = {"username": f"bench_{uuid.uuid4().hex}", "email": f"{uuid.uuid4().hex}@example.com", "password": "BenchPassword123"}
+                response = await client.post("/users/", json=user)
+                response.raise_for_status()
+                timings.append(time.perf_counter() - before)
+    return started, timings
+
+started, (first, second) = asyncio.run(run())
+print(json.dumps({
+    "import": imported - start,
+    "startup": started - imported,
+    "first request": first,
+    "second request": second,
+    "time to first response": started - start + first,
+}))
+"""
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="Fresh processes to start")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("SECRET_KEY", "benchmark-secret-key-not-for-production")
+    env.setdefault("STORAGE_BACKEND", "memory")
+
+    samples = {}
+    for _ in range(args.runs):
+        spawned = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-c", CHILD], env=env, check=True, capture_output=True, text=True
+        ).stdout
+        timings = json.loads(output.strip().splitlines()[-1])
+        timings["process (spawn to exit)"] = time.perf_counter() - spawned
+        for name, seconds in timings.items():
+            samples.setdefault(name, []).append(seconds)
+
+    print(f"{env['STORAGE_BACKEND']} storage, median of {args.runs} fresh processes")
+    for name, values in samples.items():
+        print(f"{name:<24} {statistics.median(values) * 1000:>9.1f} ms")
+
+
+if __name__ == "__main__":
+    main_cli()
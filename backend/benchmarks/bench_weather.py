@@ -0,0 +1,54 @@
+#benchmarks/bench_weather.py
+"""
+Weather benchmark: upstream fetches and latency as request volume grows.
+
+Sends weather lookups for a fixed set of cities from a pool of threads (as the
+request thread pool would) through the cached, coalescing get_weather, with the
+local provider sleeping for a fixed latency per fetch. Upstream fetches should
+equal the number of distinct cities at every request volume.
+
+Usage (from backend/):
+    python -m benchmarks.bench_weather --cities 20 --latency 0.1
+"""
+import argparse
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-not-for-production")
+
+from app.weather import FileWeatherProvider, get_weather, get_weather_stats, set_provider  # noqa: E402
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cities", type=int, default=20, help="Distinct cities requested")
+    parser.add_argument("--latency", type=float, default=0.1, help="Seconds per upstream fetch")
+    parser.add_argument("--threads", type=int, default=64, help="Concurrent callers")
+    args = parser.parse_args()
+
+    data = {f"City{i},CC": {"condition": "clear", "temperature": 20.0} for i in range(args.cities)}
+
+    print(f"{args.cities} cities, {args.latency * 1000:.0f} ms per upstream fetch, {args.threads} threads")
+    print(f"{'requests':>9} {'fetches':>8} {'coalesced':>10} {'hits':>8} {'seconds':>8} {'req/s':>10}")
+    for requests in (100, 1000, 10000):
+        provider = FileWeatherProvider(data=data, latency=args.latency)
+        set_provider(provider)
+        before = get_weather_stats()
+        places = [(f"City{random.randrange(args.cities)}", "CC") for _ in range(requests)]
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as executor:
+            list(executor.map(lambda place: get_weather(*place), places))
+        elapsed = time.perf_counter() - start
+
+        stats = get_weather_stats()
+        print(f"{requests:>9} {provider.fetches:>8} {stats['coalesced'] - before['coalesced']:>10} "
+              f"{stats['hits'] - before['hits']:>8} {elapsed:>8.2f} {requests / elapsed:>10.0f}")
+
+    set_provider(None)
+
+
+if __name__ == "__main__":
+    main_cli()
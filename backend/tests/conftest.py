@@ -0,0 +1,8 @@
+#tests/conftest.py
+import os
+
+# Run against the in-memory backend unless a backend is chosen explicitly,
+# e.g. STORAGE_BACKEND=firestore to test against a real project.
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("SECRET_KEY", "test-secret-key-used-only-by-the-test-suite")
+os.environ.setdefault("IDEMPOTENCY_BACKEND", "memory")
@@ -0,0 +1,40 @@
+#tests/test_auth.py
+import datetime
+import uuid
+import jwt
+import pytest
+from fastapi import HTTPException
+from app.auth import create_access_token, decode_access_token, get_current_user, get_token_cache_stats
+
+# Test that a repeated token is served from the verified-token cache
+def test_token_cache_hit():
+    token = create_access_token({"sub": f"test_user_{uuid.uuid4().hex}"})
+
+    before = get_token_cache_stats()
+    first = decode_access_token(token)
+    second = decode_access_token(token)
+    after = get_token_cache_stats()
+
+    assert first == second
+    assert after["misses"] == before["misses"] + 1
+    assert after["hits"] == before["hits"] + 1
+
+# Test that expired tokens are rejected, not cached
+def test_expired_token_rejected():
+    from app.auth import ALGORITHM
+    from app.key_management import get_secret_key
+    expired = datetime.datetime.utcnow() - datetime.timedelta(seconds=1)
+    token = jwt.encode({"sub": "someone", "exp": expired}, get_secret_key(), algorithm=ALGORITHM)
+
+    with pytest.raises(jwt.ExpiredSignatureError):
+        decode_access_token(token)
+    with pytest.raises(HTTPException) as exc_info:
+        get_current_user(f"Bearer {token}")
+    assert exc_info.value.status_code == 403
+
+# Test that malformed Authorization headers are rejected
+@pytest.mark.parametrize("header", ["Bearer", "Bearer ", "Token abc", "abc", "Bearer a b"])
+def test_malformed_authorization_header(header):
+    with pytest.raises(HTTPException) as exc_info:
+        get_current_user(header)
+    assert exc_info.value.status_code == 403
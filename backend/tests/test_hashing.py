@@ -0,0 +1,50 @@
+#tests/test_hashing.py
+import threading
+import pytest
+from fastapi import HTTPException
+from app import hashing
+from prometheus_client import REGISTRY
+
+# Test hashing and verification through the pool
+def test_hash_and_verify():
+    hashed = hashing.hash_password("TestPassword123")
+    assert hashed != "TestPassword123"
+    assert hashing.verify_password("TestPassword123", hashed)
+    assert not hashing.verify_password("WrongPassword", hashed)
+
+    stats = hashing.get_hash_stats()
+    assert stats["completed"] >= 3
+    assert stats["queue_depth"] == 0
+    assert stats["in_flight"] == 0
+
+# Test that a full pool rejects new work with a 503
+def test_full_pool_rejects(monkeypatch):
+    monkeypatch.setattr(hashing, "HASH_POOL_SIZE", 1)
+    monkeypatch.setattr(hashing, "HASH_QUEUE_SIZE", 0)
+
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_hash(password):
+        started.set()
+        release.wait(5)
+        return password
+
+    in_flight_before = REGISTRY.get_sample_value("app_hashes_in_flight")
+    worker = threading.Thread(target=hashing._run, args=(slow_hash, "x"))
+    worker.start()
+    started.wait(5)
+    assert REGISTRY.get_sample_value("app_hashes_in_flight") == in_flight_before + 1
+    assert REGISTRY.get_sample_value("app_hash_queue_depth") == 0
+
+    rejected_before = hashing.get_hash_stats()["rejected"]
+    rejected_metric_before = REGISTRY.get_sample_value("app_hash_rejected_total")
+    with pytest.raises(HTTPException) as exc_info:
+        hashing.hash_password("TestPassword123")
+    assert exc_info.value.status_code == 503
+    assert hashing.get_hash_stats()["rejected"] == rejected_before + 1
+    assert REGISTRY.get_sample_value("app_hash_rejected_total") == rejected_metric_before + 1
+
+    release.set()
+    worker.join(5)
+    assert REGISTRY.get_sample_value("app_hashes_in_flight") == in_flight_before
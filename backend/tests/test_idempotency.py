@@ -0,0 +1,87 @@
+#tests/test_idempotency.py
+import uuid
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.idempotency import (
+    MemoryIdempotencyStore, StorageIdempotencyStore, get_idempotency_store, run_idempotent, set_idempotency_store
+)
+from fastapi import HTTPException
+
+client = TestClient(app)
+
+
+def create_user_and_login():
+    user_data = {
+        "username": f"test_user_{uuid.uuid4().hex}",
+        "email": f"user_{uuid.uuid4().hex}@example.com",
+        "password": "TestPassword123"
+    }
+    client.post("/users/", json=user_data)
+    response = client.post("/tokens/", json={"username": user_data["username"], "password": user_data["password"]})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+# Run each test against the per-process store and the storage-backed one
+@pytest.fixture(params=["memory", "storage"])
+def store(request):
+    previous = get_idempotency_store()
+    store = MemoryIdempotencyStore() if request.param == "memory" else StorageIdempotencyStore()
+    set_idempotency_store(store)
+    yield store
+    set_idempotency_store(previous)
+
+# Test that a retried create returns the first response and writes nothing
+def test_retried_creates(store):
+    headers = create_user_and_login()
+    key = {"Idempotency-Key": uuid.uuid4().hex}
+
+    first = client.post("/items/", json={"name": "Jacket", "color": "Blue"}, headers={**headers, **key})
+    retry = client.post("/items/", json={"name": "Jacket", "color": "Blue"}, headers={**headers, **key})
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json()
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+    assert len(client.get("/items/", headers=headers).json()["items"]) == 1
+
+    # The same key with another body is refused; another key creates a new item
+    response = client.post("/items/", json={"name": "Hat", "color": "Red"}, headers={**headers, **key})
+    assert response.status_code == 422
+    response = client.post("/items/", json={"name": "Jacket", "color": "Blue"}, headers={**headers, "Idempotency-Key": uuid.uuid4().hex})
+    assert response.json()["id"] != first.json()["id"]
+
+    # A retried submission counts its rating once
+    item_id = first.json()["id"]
+    submission = {"item_id": item_id, "comment": "", "city": "Oslo", "country": "NO", "rating": 70}
+    for _ in range(2):
+        assert client.post("/submissions/", json=submission, headers={**headers, **key}).status_code == 200
+    assert client.get(f"/items/{item_id}/ratings", headers=headers).json()["count"] == 1
+
+    # Keys are scoped per user
+    other_headers = create_user_and_login()
+    response = client.post("/items/", json={"name": "Jacket", "color": "Blue"}, headers={**other_headers, **key})
+    assert response.json()["id"] != first.json()["id"]
+
+    client.delete("/users/me/", headers=headers)
+    client.delete("/users/me/", headers=other_headers)
+
+# Test that a key is held while its first request runs, and released if it fails
+def test_claims(store):
+    assert store.claim("r1", "f1") is None
+    assert store.claim("r1", "f1")["response"] is None  # Still running: the caller answers 409
+
+    store.complete("r1", "f1", {"id": "a"})
+    assert store.claim("r1", "f1")["response"] == {"id": "a"}
+
+    assert store.claim("r2", "f2") is None
+    store.release("r2")
+    assert store.claim("r2", "f2") is None
+
+    # A failed create releases the key, so the retry runs again
+    def fail():
+        raise HTTPException(status_code=503, detail="Unavailable")
+
+    key = uuid.uuid4().hex
+    with pytest.raises(HTTPException):
+        run_idempotent("u1", "items", key, {"name": "Jacket"}, fail)
+    assert run_idempotent("u1", "items", key, {"name": "Jacket"}, lambda: {"id": "b"}) == ({"id": "b"}, False)
+    assert run_idempotent("u1", "items", key, {"name": "Jacket"}, fail) == ({"id": "b"}, True)
@@ -0,0 +1,60 @@
+#tests/test_instrumentation.py
+import logging
+import json
+import uuid
+from fastapi.testclient import TestClient
+from app.main import app
+from app.instrumentation import InstrumentedStorage, RequestTimings, _current
+from app.storage.memory import MemoryStorage
+
+client = TestClient(app)
+
+# Test that the wrapper records each storage operation on the current request
+def test_instrumented_storage_records_operations():
+    storage = InstrumentedStorage(MemoryStorage())
+    timings = RequestTimings()
+    token = _current.set(timings)
+    try:
+        storage.items.set("a", {"id": "a", "user_id": "u1"})
+        storage.items.get("a")
+        storage.items.get_many(["a"])
+        assert [document["id"] for document in storage.items.query({"user_id": "u1"})] == ["a"]
+        batch = storage.batch()
+        batch.delete(storage.items, "a")
+        batch.commit()
+    finally:
+        _current.reset(token)
+
+    counts = {name: count for name, (count, _) in timings.operations.items()}
+    assert counts == {"db-set": 1, "db-get": 2, "db-query": 1, "db-commit": 1}
+    assert storage.items.get("a") is None
+
+# Test the Server-Timing header and the structured log line
+def test_server_timing_header(caplog):
+    user_data = {
+        "username": f"test_user_{uuid.uuid4().hex}",
+        "email": f"user_{uuid.uuid4().hex}@example.com",
+        "password": "TestPassword123"
+    }
+    response = client.post("/users/", json=user_data)
+    assert "hash;" in response.headers["Server-Timing"]
+
+    token = client.post("/tokens/", json={"username": user_data["username"], "password": user_data["password"]}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    with caplog.at_level(logging.INFO, logger="app.timing"):
+        response = client.post("/items/", json={"name": "Jacket", "color": "Red"}, headers=headers)
+    assert response.status_code == 200
+
+    server_timing = response.headers["Server-Timing"]
+    assert "auth;" in server_timing
+    assert 'db-set;desc="x1";dur=' in server_timing
+    assert "app;dur=" in server_timing
+
+    line = json.loads(caplog.records[-1].getMessage())
+    assert line["method"] == "POST"
+    assert line["route"] == "/items/"
+    assert line["status"] == 200
+    assert line["timings"]["db-set"]["count"] == 1
+
+    client.delete("/users/me/", headers=headers)
@@ -1,11 +1,15 @@
 #tests/test_items.py
 import uuid
+import csv
+import io
+import json
 import pytest
+from concurrent.futures import ThreadPoolExecutor
 from fastapi.testclient import TestClient
 from app.main import app
-from app.database import db
+from app.database import get_storage, set_storage
+from app.storage.memory import MemoryStorage
 from typing import Optional
-import time
 
 client = TestClient(app)
 
@@ -47,33 +51,25 @@ def cleanup_user_and_items():
     yield user_data, headers
 
     # Cleanup after tests: Delete all items for the user
-    user_ref = db.collection("users").where("username", "==", user_data["username"]).stream()
-    user = next(user_ref, None)
+    storage = get_storage()
+    user = next(storage.users.query({"username": user_data["username"]}, limit=1), None)
     if user:
-        user_id = user.id
+        user_id = user["id"]
         
         # Delete all items associated with the user
-        items_ref = db.collection("items").where("user_id", "==", user_id).stream()
-        for item in items_ref:
-            db.collection("items").document(item.id).delete()
-
-        # Wait for Firestore to process the deletions (retry logic)
-        time.sleep(1)
+        items = storage.items.query({"user_id": user_id})
+        storage.items.delete_many([item["id"] for item in items])
 
         # Double-check that no items remain for the user
-        items_ref_after_cleanup = db.collection("items").where("user_id", "==", user_id).stream()
-        remaining_items = list(items_ref_after_cleanup)
+        remaining_items = list(storage.items.query({"user_id": user_id}))
         assert len(remaining_items) == 0, "There are still items associated with the user after cleanup."
 
         # Finally, delete the user
-        db.collection("users").document(user_id).delete()
-
-    # Wait again to ensure the user deletion has been processed
-    time.sleep(1)
+        storage.users.delete(user_id)
 
     # Verify the user is deleted
-    user_ref_after_cleanup = db.collection("users").where("username", "==", user_data["username"]).stream()
-    assert next(user_ref_after_cleanup, None) is None, "The user was not deleted."
+    user_after_cleanup = storage.users.query({"username": user_data["username"]}, limit=1)
+    assert next(user_after_cleanup, None) is None, "The user was not deleted."
 
 # Test adding multiple items for the user
 def test_add_multiple_items(cleanup_user_and_items):
@@ -179,3 +175,157 @@ def test_delete_item(cleanup_user_and_items):
     assert response.status_code == 200
     assert all(item["id"] != item_id for item in response.json()["items"])
 
+
+# Test paging through items and projecting fields
+def test_get_items_paginated(cleanup_user_and_items):
+    user_data, headers = cleanup_user_and_items  # Fixture provides this automatically
+
+    response = client.get("/items/", headers=headers)
+    assert response.status_code == 200
+    all_ids = {item["id"] for item in response.json()["items"]}
+    assert response.json()["next_page_token"] is None
+
+    # Page through the items two at a time, asking only for their names
+    seen_ids = []
+    page_token = None
+    while True:
+        params = {"limit": 2, "fields": "name"}
+        if page_token:
+            params["page_token"] = page_token
+        response = client.get("/items/", params=params, headers=headers)
+        assert response.status_code == 200
+        page = response.json()["items"]
+        assert len(page) <= 2
+        for item in page:
+            assert set(item) == {"id", "name"}
+        seen_ids.extend(item["id"] for item in page)
+        page_token = response.json()["next_page_token"]
+        if page_token is None:
+            break
+
+    assert len(seen_ids) == len(all_ids)
+    assert set(seen_ids) == all_ids
+
+    # Unknown fields are rejected
+    response = client.get("/items/", params={"fields": "password"}, headers=headers)
+    assert response.status_code == 400
+
+# Test creating, updating and deleting items in one batch
+def test_batch_items(cleanup_user_and_items):
+    user_data, headers = cleanup_user_and_items  # Fixture provides this automatically
+
+    # Create three items in one request
+    operations = [{"op": "create", "data": generate_random_item()} for _ in range(3)]
+    operations.append({"op": "create", "data": {"name": "No color"}})
+    response = client.post("/items:batch", json={"operations": operations}, headers=headers)
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["status"] for result in results] == [201, 201, 201, 400]
+    item_ids = [result["id"] for result in results[:3]]
+
+    # Update one, delete one, and touch an item that does not exist
+    operations = [
+        {"op": "update", "id": item_ids[0], "data": {"color": "Green"}},
+        {"op": "delete", "id": item_ids[1]},
+        {"op": "delete", "id": str(uuid.uuid4())},
+    ]
+    response = client.post("/items:batch", json={"operations": operations}, headers=headers)
+    assert response.status_code == 200
+    assert [result["status"] for result in response.json()["results"]] == [200, 200, 404]
+
+    response = client.get(f"/items/{item_ids[0]}", headers=headers)
+    assert response.json()["item"]["color"] == "Green"
+    response = client.get(f"/items/{item_ids[1]}", headers=headers)
+    assert response.status_code == 404
+
+# Test exporting items as NDJSON and CSV
+def test_export_items(cleanup_user_and_items):
+    user_data, headers = cleanup_user_and_items  # Fixture provides this automatically
+
+    items = client.get("/items/", headers=headers).json()["items"]
+    item_ids = {item["id"] for item in items}
+
+    response = client.get("/items/export", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert {row["id"] for row in rows} == item_ids
+    assert all(set(row) == {"id", "name", "color"} for row in rows)
+
+    # The gzip-compressed CSV export holds the same rows
+    response = client.get("/items/export", params={"format": "csv", "gzip": "true"}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert {row["id"] for row in rows} == item_ids
+
+# Test reading several items by ID in one request
+def test_get_items_by_id(cleanup_user_and_items):
+    user_data, headers = cleanup_user_and_items  # Fixture provides this automatically
+
+    item_ids = [client.post("/items/", json=generate_random_item(), headers=headers).json()["id"] for _ in range(2)]
+
+    # Another user's item is reported as missing, like an unknown ID
+    other_user, other_token = create_user_and_login()
+    other_headers = {"Authorization": f"Bearer {other_token}"}
+    other_item_id = client.post("/items/", json=generate_random_item(), headers=other_headers).json()["id"]
+
+    ids = ",".join([item_ids[1], "missing", item_ids[0], other_item_id, item_ids[1]])
+    response = client.get("/items/", params={"ids": ids, "fields": "name"}, headers=headers)
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()["items"]] == [item_ids[1], item_ids[0]]
+    assert all(set(item) == {"id", "name"} for item in response.json()["items"])
+    assert response.json()["missing"] == ["missing", other_item_id]
+
+    # The other user can neither read nor change the item
+    assert client.get(f"/items/{item_ids[0]}", headers=other_headers).status_code == 404
+    assert client.put(f"/items/{item_ids[0]}/", json={"color": "Blue"}, headers=other_headers).status_code == 403
+
+    response = client.get("/items/", params={"ids": ",".join(str(i) for i in range(101))}, headers=headers)
+    assert response.status_code == 400
+
+    client.delete("/users/me/", headers=other_headers)
+
+# Test that If-Match turns a stale edit into 412 instead of overwriting a newer version
+def test_conditional_item_writes(cleanup_user_and_items):
+    user_data, headers = cleanup_user_and_items  # Fixture provides this automatically
+
+    item_id = client.post("/items/", json=generate_random_item(), headers=headers).json()["id"]
+    etag = client.get(f"/items/{item_id}", headers=headers).headers["etag"]
+
+    # Another client edits the item first; the new version comes back as the ETag
+    response = client.put(f"/items/{item_id}/", json={"color": "Blue"}, headers={**headers, "If-Match": etag})
+    assert response.status_code == 200
+    new_etag = response.headers["etag"]
+    assert new_etag != etag
+    assert client.get(f"/items/{item_id}", headers=headers).headers["etag"] == new_etag
+
+    # An edit of the old version is refused and leaves the item alone
+    response = client.put(f"/items/{item_id}/", json={"color": "Green"}, headers={**headers, "If-Match": etag})
+    assert response.status_code == 412
+    assert client.delete(f"/items/{item_id}/", headers={**headers, "If-Match": etag}).status_code == 412
+    assert client.get(f"/items/{item_id}", headers=headers).json()["item"]["color"] == "Blue"
+
+    # Without If-Match, or with "*", the latest version is written
+    assert client.put(f"/items/{item_id}/", json={"color": "Green"}, headers={**headers, "If-Match": "*"}).status_code == 200
+    assert client.delete(f"/items/{item_id}/", headers={**headers, "If-Match": new_etag}).status_code == 412
+    assert client.delete(f"/items/{item_id}/", headers=headers).status_code == 200
+
+# Test that concurrent PUTs without If-Match all succeed, the last writer winning
+def test_concurrent_blind_writes():
+    previous_storage = get_storage()
+    set_storage(MemoryStorage(latency=0.005))
+    try:
+        user_data, token = create_user_and_login()
+        headers = {"Authorization": f"Bearer {token}"}
+        item_id = client.post("/items/", json=generate_random_item(), headers=headers).json()["id"]
+
+        with ThreadPoolExecutor(16) as pool:
+            statuses = list(pool.map(
+                lambda i: client.put(f"/items/{item_id}/", json={"color": f"Color_{i}"}, headers=headers).status_code,
+                range(64),
+            ))
+        assert statuses == [200] * 64
+        assert client.get(f"/items/{item_id}", headers=headers).json()["item"]["color"].startswith("Color_")
+    finally:
+        set_storage(previous_storage)
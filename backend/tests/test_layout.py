@@ -0,0 +1,140 @@
+#tests/test_layout.py
+import uuid
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.database import get_storage, set_storage
+from app.jobs import resume_unfinished_jobs, sweep_orphans
+from app.layout import get_data_layout, set_data_layout
+from app.storage.memory import MemoryStorage
+import app.migration as migration
+
+client = TestClient(app)
+
+
+def create_user_and_login():
+    user_data = {
+        "username": f"test_user_{uuid.uuid4().hex}",
+        "email": f"user_{uuid.uuid4().hex}@example.com",
+        "password": "TestPassword123"
+    }
+    user_id = client.post("/users/", json=user_data).json()["user_id"]
+    response = client.post("/tokens/", json={"username": user_data["username"], "password": user_data["password"]})
+    return user_id, {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+# Each test starts with an empty store, in the flat layout
+@pytest.fixture(autouse=True)
+def fresh_storage():
+    previous_storage, previous_layout = get_storage(), get_data_layout()
+    set_storage(MemoryStorage())
+    set_data_layout("flat")
+    yield get_storage()
+    set_storage(previous_storage)
+    set_data_layout(previous_layout)
+
+# Test that in the nested layout documents live under their owner, who alone can reach them
+def test_nested_layout(fresh_storage):
+    set_data_layout("nested")
+    user_id, headers = create_user_and_login()
+    _, other_headers = create_user_and_login()
+
+    item_id = client.post("/items/", json={"name": "Jacket", "color": "Blue"}, headers=headers).json()["id"]
+    submission = {"item_id": item_id, "comment": "", "city": "Oslo", "country": "NO", "rating": 70}
+    submission_id = client.post("/submissions/", json=submission, headers=headers).json()["id"]
+
+    assert fresh_storage.owned("items", user_id).get(item_id)["name"] == "Jacket"
+    assert fresh_storage.items.get(item_id) is None
+    assert [s["id"] for s in client.get(f"/submissions/?item_id={item_id}", headers=headers).json()["submissions"]] == [submission_id]
+    assert client.get(f"/items/{item_id}/ratings", headers=headers).json()["count"] == 1
+
+    # Another user's IDs are simply not found under their own path
+    assert client.get(f"/items/{item_id}", headers=other_headers).status_code == 404
+    assert client.put(f"/items/{item_id}/", json={"color": "Red"}, headers=other_headers).status_code == 404
+    assert client.delete(f"/submissions/{submission_id}/", headers=other_headers).status_code == 404
+    assert client.get(f"/items/{item_id}/ratings", headers=other_headers).status_code == 404
+    assert client.get("/items/", headers=other_headers).json()["items"] == []
+
+    response = client.post("/items:batch", json={"operations": [
+        {"op": "update", "id": item_id, "data": {"color": "Green"}},
+        {"op": "create", "data": {"name": "Hat", "color": "Red"}},
+    ]}, headers=headers)
+    assert [result["status"] for result in response.json()["results"]] == [200, 201]
+    assert client.get(f"/items/{item_id}", headers=headers).json()["item"]["color"] == "Green"
+
+    # Deleting the user deletes their collections, and the rating goes with the submission
+    assert client.delete("/users/me/", headers=headers).status_code == 200
+    assert list(fresh_storage.owned("items", user_id).query()) == []
+    assert list(fresh_storage.owned("submissions", user_id).query()) == []
+    assert list(fresh_storage.ratings.query({"item_id": item_id})) == []
+
+    # Documents left under a user that no longer exists are swept
+    fresh_storage.owned("items", "deleted-user").set("orphan", {"id": "orphan", "user_id": "deleted-user"})
+    assert sweep_orphans(dry_run=True)["items"] == 1
+    assert sweep_orphans()["items"] == 1
+    assert list(fresh_storage.owned("items", "deleted-user").query()) == []
+
+# Test the cutover: dual writes, an interrupted and resumed migration, verification, then nested reads
+def test_migration(fresh_storage, monkeypatch):
+    user_id, headers = create_user_and_login()
+    item_ids = [
+        client.post("/items/", json={"name": f"Item {i}", "color": "Blue"}, headers=headers).json()["id"]
+        for i in range(5)
+    ]
+    submission = {"item_id": item_ids[0], "comment": "", "city": "Oslo", "country": "NO", "rating": 70}
+    client.post("/submissions/", json=submission, headers=headers)
+    other_id, other_headers = create_user_and_login()
+    client.post("/items/", json={"name": "Hat", "color": "Red"}, headers=other_headers)
+
+    with pytest.raises(RuntimeError):
+        migration.migrate_layout()
+
+    # From now on every write is copied to the nested layout as well
+    set_data_layout("dual")
+    new_id = client.post("/items/", json={"name": "Scarf", "color": "Red"}, headers=headers).json()["id"]
+    client.put(f"/items/{item_ids[1]}/", json={"color": "Green"}, headers=headers)
+    client.delete(f"/items/{item_ids[2]}/", headers=headers)
+    nested = fresh_storage.owned("items", user_id)
+    assert nested.get(new_id)["name"] == "Scarf"
+    assert nested.get(item_ids[1])["color"] == "Green"  # An update copies the whole document
+    assert nested.get(item_ids[0]) is None  # Not written since: left to the migration
+    assert migration.verify_layout()["mismatches"] != []
+
+    # The first run fails after two pages, the second resumes after them
+    monkeypatch.setattr(migration, "MIGRATION_PAGE_SIZE", 2)
+    copy_documents = migration.copy_documents
+    calls = []
+
+    def failing_copy(collection, owner, doc_ids):
+        calls.append(doc_ids)
+        if len(calls) > 2:
+            raise ConnectionError("Storage unavailable")
+        return copy_documents(collection, owner, doc_ids)
+
+    monkeypatch.setattr(migration, "copy_documents", failing_copy)
+    with pytest.raises(ConnectionError):
+        migration.migrate_layout(rate=0)
+    job = fresh_storage.jobs.get(migration.MIGRATION_JOB_ID)
+    assert job["status"] == "failed"
+    assert job["cursor"]["after"] == calls[1][-1]
+
+    monkeypatch.setattr(migration, "copy_documents", copy_documents)
+    sleeps = []
+    monkeypatch.setattr(migration.time, "sleep", sleeps.append)
+    job = migration.migrate_layout(rate=1000)
+    assert job["status"] == "done"
+    assert job["copied"]["items"] == 6
+    assert sleeps  # Paced to the rate
+    assert migration.verify_layout() == {"users": 2, "documents": {"items": 6, "submissions": 1}, "mismatches": []}
+    assert nested.get(item_ids[0])["name"] == "Item 0"
+
+    # Finished: running it again does nothing, and deletion jobs leave it alone
+    assert migration.migrate_layout()["updated_at"] == job["updated_at"]
+    assert resume_unfinished_jobs() == 0
+
+    # Reads come from the users' own collections once switched over
+    set_data_layout("nested")
+    items = client.get("/items/", headers=headers).json()["items"]
+    assert sorted(item["id"] for item in items) == sorted(set(item_ids + [new_id]) - {item_ids[2]})
+    assert client.get(f"/items/{item_ids[0]}/ratings", headers=headers).json()["count"] == 1
+    assert len(client.get("/items/", headers=other_headers).json()["items"]) == 1
+    assert client.get(f"/items/{item_ids[0]}", headers=other_headers).status_code == 404
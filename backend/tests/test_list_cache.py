@@ -0,0 +1,87 @@
+#tests/test_list_cache.py
+import uuid
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.list_cache import (
+    ENTRY_OVERHEAD, MemoryListCache, SQLiteListCache, get_list_cache, get_list_cache_stats, set_list_cache
+)
+
+client = TestClient(app)
+
+
+# Run the backend tests against the per-process and the shared (file) cache
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path):
+    def make(max_bytes):
+        if request.param == "memory":
+            return MemoryListCache(max_bytes)
+        return SQLiteListCache(str(tmp_path / "lists.db"), max_bytes)
+    return make
+
+# Test that the least recently used entries are evicted to stay within the size bound
+def test_lru_eviction(make_cache):
+    cache = make_cache(3 * (100 + ENTRY_OVERHEAD))
+    for key in "abc":
+        cache.set("u1", "items", key, b"x" * 100)
+    assert cache.get("u1", "items", "a") is not None  # "b" is now the least recently used
+
+    cache.set("u1", "items", "d", b"x" * 100)
+    assert cache.get("u1", "items", "b") is None
+    assert all(cache.get("u1", "items", key) is not None for key in "acd")
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["entries"] == 3
+
+# Test that invalidation drops one user's collection only
+def test_invalidation(make_cache):
+    cache = make_cache(1024 * 1024)
+    cache.set("u1", "items", "a", b"1")
+    cache.set("u1", "submissions", "a", b"2")
+    cache.set("u2", "items", "a", b"3")
+
+    cache.invalidate("u1", "items")
+    assert cache.get("u1", "items", "a") is None
+    assert cache.get("u1", "submissions", "a") == b"2"
+    assert cache.get("u2", "items", "a") == b"3"
+
+# Test that workers sharing a cache file see each other's entries
+def test_shared_file_cache(tmp_path):
+    path = str(tmp_path / "lists.db")
+    worker_1, worker_2 = SQLiteListCache(path), SQLiteListCache(path)
+    worker_1.set("u1", "items", "a", b"[1]")
+    assert worker_2.get("u1", "items", "a") == b"[1]"
+    worker_2.invalidate("u1", "items")
+    assert worker_1.get("u1", "items", "a") is None
+
+# Test that list endpoints are served from the cache until the user writes
+def test_cached_list_endpoints():
+    previous = get_list_cache()
+    set_list_cache(MemoryListCache())
+    try:
+        user_data = {
+            "username": f"test_user_{uuid.uuid4().hex}",
+            "email": f"user_{uuid.uuid4().hex}@example.com",
+            "password": "TestPassword123"
+        }
+        client.post("/users/", json=user_data)
+        token = client.post("/tokens/", json={"username": user_data["username"], "password": user_data["password"]}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        client.post("/items/", json={"name": "Jacket", "color": "Blue"}, headers=headers)
+
+        before = get_list_cache_stats()
+        first = client.get("/items/", headers=headers)
+        second = client.get("/items/", headers=headers)
+        assert second.json() == first.json()
+        assert second.headers["content-type"] == "application/json"
+        assert "db-query" not in second.headers["server-timing"]
+        stats = get_list_cache_stats()
+        assert (stats["misses"] - before["misses"], stats["hits"] - before["hits"]) == (1, 1)
+
+        # A write invalidates the user's item lists, and the next read sees it
+        client.post("/items/", json={"name": "Hat", "color": "Red"}, headers=headers)
+        assert get_list_cache_stats()["entries"] == 0
+        assert len(client.get("/items/", headers=headers).json()["items"]) == 2
+
+        client.delete("/users/me/", headers=headers)
+    finally:
+        set_list_cache(previous)
@@ -0,0 +1,73 @@
+#tests/test_metrics.py
+import os
+import subprocess
+import sys
+import uuid
+from fastapi.testclient import TestClient
+from app.main import app
+
+client = TestClient(app)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def sample_value(text: str, prefix: str) -> float:
+    for line in text.splitlines():
+        if line.startswith(prefix):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+# Test per-route counters, latency histograms, storage histograms and cache counters
+def test_metrics_endpoint():
+    user_data = {
+        "username": f"test_user_{uuid.uuid4().hex}",
+        "email": f"user_{uuid.uuid4().hex}@example.com",
+        "password": "TestPassword123"
+    }
+    client.post("/users/", json=user_data)
+    token = client.post("/tokens/", json={"username": user_data["username"], "password": user_data["password"]}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    before = client.get("/metrics").text
+
+    item_id = client.post("/items/", json={"name": "Jacket", "color": "Red"}, headers=headers).json()["id"]
+    client.get(f"/items/{item_id}", headers=headers)
+    client.get(f"/items/{uuid.uuid4()}", headers=headers)
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    after = response.text
+
+    # Labelled by route template, not by raw path
+    ok = 'http_requests_total{method="GET",route="/items/{item_id}",status="200"}'
+    not_found = 'http_requests_total{method="GET",route="/items/{item_id}",status="404"}'
+    assert sample_value(after, ok) == sample_value(before, ok) + 1
+    assert sample_value(after, not_found) == sample_value(before, not_found) + 1
+    assert item_id not in after
+
+    assert 'http_request_duration_seconds_bucket{le="0.005",method="POST",route="/items/"}' in after
+    assert 'http_requests_in_progress{method="GET"}' in after
+    assert 'app_operation_duration_seconds_count{operation="db-set"}' in after
+
+    # The first request with the token verifies it; the next two are cache hits
+    hits = 'app_cache_lookups_total{cache="token",result="hit"}'
+    assert sample_value(after, hits) >= sample_value(before, hits) + 2
+    assert 'app_cache_lookups_total{cache="user",result="hit"}' in after
+
+    client.delete("/users/me/", headers=headers)
+
+# Test that samples written by several worker processes are summed
+def test_metrics_multiprocess(tmp_path):
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path))
+    worker = (
+        "from app.metrics import REQUESTS\n"
+        "REQUESTS.labels('GET', '/items/', '200').inc(3)\n"
+    )
+    for _ in range(2):
+        subprocess.run([sys.executable, "-c", worker], cwd=BACKEND_DIR, env=env, check=True)
+
+    reader = "from app.metrics import render_metrics\nprint(render_metrics()[0].decode())\n"
+    output = subprocess.run(
+        [sys.executable, "-c", reader], cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True
+    ).stdout
+    assert sample_value(output, 'http_requests_total{method="GET",route="/items/",status="200"}') == 6
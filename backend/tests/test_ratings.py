@@ -0,0 +1,138 @@
+#tests/test_ratings.py
+import uuid
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from concurrent.futures import ThreadPoolExecutor
+from app.database import get_storage, set_storage
+from app.ratings import get_item_aggregate, rebuild_ratings
+from app.storage.memory import MemoryStorage
+
+client = TestClient(app)
+
+# Fixture to create a user with one item; the account is deleted afterwards
+@pytest.fixture
+def user_with_item():
+    user_data = {
+        "username": f"test_user_{uuid.uuid4().hex}",
+        "email": f"user_{uuid.uuid4().hex}@example.com",
+        "password": "TestPassword123"
+    }
+    client.post("/users/", json=user_data)
+    response = client.post("/tokens/", json={"username": user_data["username"], "password": user_data["password"]})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    item_id = client.post("/items/", json={"name": "Raincoat", "color": "Yellow"}, headers=headers).json()["id"]
+
+    yield headers, item_id
+
+    client.delete("/users/me/", headers=headers)
+
+
+def add_submission(headers, item_id, rating):
+    submission = {"item_id": item_id, "comment": "ok", "city": "London", "country": "UK", "rating": rating}
+    response = client.post("/submissions/", json=submission, headers=headers)
+    assert response.status_code == 200
+    return response.json()["id"]
+
+# Test that adds, updates and deletes keep the aggregate in step
+def test_ratings_follow_submissions(user_with_item):
+    headers, item_id = user_with_item
+
+    response = client.get(f"/items/{item_id}/ratings", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["count"] == 0
+    assert response.json()["mean"] is None
+
+    first = add_submission(headers, item_id, 80)
+    add_submission(headers, item_id, 60)
+    add_submission(headers, item_id, 100)
+
+    ratings = client.get(f"/items/{item_id}/ratings", headers=headers).json()
+    assert ratings["count"] == 3
+    assert ratings["sum"] == 240
+    assert ratings["sum_squares"] == 80 * 80 + 60 * 60 + 100 * 100
+    assert ratings["mean"] == 80
+    assert ratings["histogram"] == [0, 0, 0, 0, 0, 0, 1, 0, 1, 1]
+
+    response = client.put(f"/submissions/{first}/", json={"rating": 20}, headers=headers)
+    assert response.status_code == 200
+    response = client.put(f"/submissions/{first}/", json={"rating": "high"}, headers=headers)
+    assert response.status_code == 400
+
+    client.delete(f"/submissions/{first}/", headers=headers)
+
+    ratings = client.get(f"/items/{item_id}/ratings", headers=headers).json()
+    assert ratings["count"] == 2
+    assert ratings["sum"] == 160
+    assert ratings["histogram"] == [0, 0, 0, 0, 0, 0, 1, 0, 0, 1]
+
+    # Only the user's own items have ratings
+    response = client.get(f"/items/{uuid.uuid4()}/ratings", headers=headers)
+    assert response.status_code == 404
+
+# Test that batch writes and account deletion update the aggregates
+def test_ratings_batch_and_account_deletion(user_with_item):
+    headers, item_id = user_with_item
+    submission = {"item_id": item_id, "comment": "ok", "city": "Paris", "country": "FR"}
+
+    response = client.post("/submissions:batch", json={"operations": [
+        {"op": "create", "data": {**submission, "rating": 10}},
+        {"op": "create", "data": {**submission, "rating": 30}},
+    ]}, headers=headers)
+    first, second = [result["id"] for result in response.json()["results"]]
+
+    client.post("/submissions:batch", json={"operations": [
+        {"op": "update", "id": first, "data": {"rating": 50}},
+        {"op": "delete", "id": second},
+    ]}, headers=headers)
+
+    ratings = client.get(f"/items/{item_id}/ratings", headers=headers).json()
+    assert (ratings["count"], ratings["sum"]) == (1, 50)
+
+    # The background deletion job removes the user's submissions and their ratings
+    client.delete("/users/me/", headers=headers)
+    assert get_item_aggregate(item_id) is None
+    assert list(get_storage().ratings.query({"item_id": item_id})) == []
+
+# Test that a rebuild recomputes the same aggregates from scratch
+def test_rebuild_ratings(user_with_item):
+    headers, item_id = user_with_item
+    for rating in (5, 55, 95):
+        add_submission(headers, item_id, rating)
+
+    ratings = get_storage().ratings
+    expected = get_item_aggregate(item_id)
+    shards = list(ratings.query({"item_id": item_id}))
+    ratings.delete(shards[0]["id"])
+    # An aggregate written before sharding is counted until the rebuild replaces it
+    ratings.set(item_id, {"id": item_id, "item_id": item_id, "count": 2, "sum": 200, "sum_squares": 20000, "histogram": [0] * 9 + [2]})
+    ratings.set("stale", {"id": "stale", "item_id": "stale", "count": 1, "sum": 1, "sum_squares": 1, "histogram": [1] + [0] * 9})
+    assert get_item_aggregate(item_id) != expected
+
+    rebuild_ratings()
+
+    assert get_item_aggregate(item_id) == expected
+    assert ratings.get(item_id) is None
+    assert ratings.get("stale") is None
+
+# Test that concurrent ratings of one item do not contend on a single aggregate document
+def test_concurrent_ratings():
+    previous_storage = get_storage()
+    set_storage(MemoryStorage(latency=0.005))
+    try:
+        user_data = {"username": f"test_user_{uuid.uuid4().hex}", "email": "user@example.com", "password": "TestPassword123"}
+        client.post("/users/", json=user_data)
+        token = client.post("/tokens/", json=user_data).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        item_id = client.post("/items/", json={"name": "Raincoat", "color": "Yellow"}, headers=headers).json()["id"]
+
+        submission = {"item_id": item_id, "comment": "ok", "city": "London", "country": "UK", "rating": 70}
+        with ThreadPoolExecutor(32) as pool:
+            responses = list(pool.map(
+                lambda _: client.post("/submissions/", json=submission, headers=headers), range(32)
+            ))
+        assert [response.status_code for response in responses] == [200] * 32
+        ratings = client.get(f"/items/{item_id}/ratings", headers=headers).json()
+        assert (ratings["count"], ratings["sum"]) == (32, 32 * 70)
+    finally:
+        set_storage(previous_storage)
@@ -0,0 +1,85 @@
+#tests/test_recommendations.py
+import time
+import uuid
+import numpy as np
+from fastapi.testclient import TestClient
+from app.main import app
+from app.recommendations import build_history, score_items
+
+client = TestClient(app)
+
+DAY = 86400.0
+
+# Test that recent ratings and ratings in similar weather weigh more
+def test_score_items():
+    now = time.time()
+    item_index = {"coat": 0, "shorts": 1, "unrated": 2}
+    submissions = [
+        # An old good rating and a recent poor one for the coat
+        {"item_id": "coat", "rating": 90, "city": "London", "country": "UK", "created_at": now - 365 * DAY},
+        {"item_id": "coat", "rating": 40, "city": "London", "country": "UK", "created_at": now},
+        # Shorts are great when it is hot and clear, poor in the rain
+        {"item_id": "shorts", "rating": 95, "city": "london ", "country": "uk", "condition": "Clear",
+         "temperature": 28, "created_at": now},
+        {"item_id": "shorts", "rating": 10, "city": "London", "country": "UK", "condition": "rain",
+         "temperature": 12, "created_at": now},
+        # Submissions for deleted items are ignored
+        {"item_id": "deleted", "rating": 100, "city": "London", "country": "UK", "created_at": now},
+    ]
+
+    history = build_history(submissions, item_index, "London", "UK", "clear")
+    scores, counts = score_items(history, 3, temperature=27, now=now)
+    assert list(counts) == [2, 2, 0]
+    assert scores[1] > 80  # Today looks like the day the shorts were rated 95
+    # The unrated item gets the user's mean; the coat's recent poor rating outweighs its old good one
+    assert scores[1] > scores[2] > scores[0]
+
+    history = build_history(submissions, item_index, "London", "UK", "rain")
+    scores, _ = score_items(history, 3, temperature=11, now=now)
+    assert scores[1] < 30
+
+# Test that an empty history gives every item the neutral score
+def test_score_items_without_history():
+    scores, counts = score_items(build_history([], {}, "London", "UK", None), 2)
+    assert np.allclose(scores, 50.0)
+    assert list(counts) == [0, 0]
+
+# Test the endpoint ranks the user's items
+def test_recommendations_endpoint():
+    user_data = {
+        "username": f"test_user_{uuid.uuid4().hex}",
+        "email": f"user_{uuid.uuid4().hex}@example.com",
+        "password": "TestPassword123"
+    }
+    client.post("/users/", json=user_data)
+    token = client.post("/tokens/", json={"username": user_data["username"], "password": user_data["password"]}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    raincoat = client.post("/items/", json={"name": "Raincoat", "color": "Yellow"}, headers=headers).json()["id"]
+    sandals = client.post("/items/", json={"name": "Sandals", "color": "Brown"}, headers=headers).json()["id"]
+    for item_id, condition, rating in [(raincoat, "rain", 90), (raincoat, "clear", 30), (sandals, "rain", 10), (sandals, "clear", 95)]:
+        client.post("/submissions/", json={
+            "item_id": item_id, "comment": "ok", "city": "Oslo", "country": "NO", "rating": rating, "condition": condition
+        }, headers=headers)
+
+    response = client.get("/recommendations/", params={"city": "Oslo", "country": "NO", "condition": "rain"}, headers=headers)
+    assert response.status_code == 200
+    ranked = response.json()["recommendations"]
+    assert [entry["item"]["id"] for entry in ranked] == [raincoat, sandals]
+    assert ranked[0]["item"]["name"] == "Raincoat"
+    assert ranked[0]["ratings"] == 2
+
+    response = client.get("/recommendations/", params={"city": "Oslo", "country": "NO", "condition": "clear", "limit": 1}, headers=headers)
+    assert [entry["item"]["id"] for entry in response.json()["recommendations"]] == [sandals]
+
+    # The cached history is reloaded once the user's items or submissions change
+    client.post("/submissions/", json={
+        "item_id": raincoat, "comment": "ok", "city": "Oslo", "country": "NO", "rating": 80, "condition": "rain"
+    }, headers=headers)
+    client.put(f"/items/{raincoat}/", json={"name": "Rain jacket", "color": "Yellow"}, headers=headers)
+    response = client.get("/recommendations/", params={"city": "Oslo", "country": "NO", "condition": "rain"}, headers=headers)
+    ranked = response.json()["recommendations"]
+    assert ranked[0]["item"]["name"] == "Rain jacket"
+    assert ranked[0]["ratings"] == 3
+
+    client.delete("/users/me/", headers=headers)
@@ -0,0 +1,112 @@
+#tests/test_signing_keys.py
+import json
+import os
+import subprocess
+import sys
+import jwt
+import pytest
+from dotenv import dotenv_values
+import app.key_management as key_management
+from app.auth import create_access_token, decode_access_token
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# One worker: start the app, sign a token for its own user, then wait for every
+# other worker's token and report the status each gets from GET /users/me/
+WORKER = r"""
+import asyncio, json, os, sys, time, uuid
+import httpx
+from app.main import app
+
+index, workers = int(sys.argv[1]), int(sys.argv[2])
+
+async def run():
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://worker") as client:
+            user = {"username": f"worker_{index}_{uuid.uuid4().hex}", "email": f"{uuid.uuid4().hex}@example.com", "password": "WorkerPassword123"}
+            (await client.post("/users/", json=user)).raise_for_status()
+            response = await client.post("/tokens/", json={"username": user["username"], "password": user["password"]})
+            with open(f"token_{index}.tmp", "w") as token_file:
+                token_file.write(response.json()["access_token"])
+            os.replace(f"token_{index}.tmp", f"token_{index}")
+
+            deadline = time.time() + 60
+            while not all(os.path.exists(f"token_{other}") for other in range(workers)):
+                if time.time() > deadline:
+                    raise SystemExit("Timed out waiting for the other workers")
+                await asyncio.sleep(0.05)
+
+            statuses = []
+            for other in range(workers):
+                with open(f"token_{other}") as token_file:
+                    headers = {"Authorization": f"Bearer {token_file.read()}"}
+                statuses.append((await client.get("/users/me/", headers=headers)).status_code)
+    return statuses
+
+print(json.dumps(asyncio.run(run())))
+"""
+
+
+# Test that workers started together without SECRET_KEY agree on the signing key,
+# whether it is generated into .env or into a shared keys file
+@pytest.mark.parametrize("keys", ["env", "file"])
+def test_token_works_on_every_worker(keys, tmp_path):
+    workers = 3
+    env = {name: value for name, value in os.environ.items() if name != "SECRET_KEY"}
+    env.update({
+        "PYTHONPATH": BACKEND_DIR,
+        "STORAGE_BACKEND": "sqlite",
+        "SQLITE_PATH": str(tmp_path / "app.db"),
+        "METRICS": "0",
+    })
+    if keys == "file":
+        env["SIGNING_KEYS_FILE"] = str(tmp_path / "keys.json")
+
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-c", WORKER, str(index), str(workers)],
+            cwd=tmp_path, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+        )
+        for index in range(workers)
+    ]
+    for process in processes:
+        output, errors = process.communicate(timeout=120)
+        assert process.returncode == 0, errors
+        assert json.loads(output.strip().splitlines()[-1]) == [200] * workers
+
+    if keys == "env":
+        assert (tmp_path / ".env").read_text().count("SECRET_KEY=") == 1
+    else:
+        assert len(json.loads((tmp_path / "keys.json").read_text())["keys"]) == 1
+    assert list(tmp_path.glob("*.lock")) == []
+
+# Test that every generated key reads back from .env unchanged
+def test_generated_key_round_trips(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    keys = [key_management.generate_secret_key() for _ in range(500)]
+    (tmp_path / ".env").write_text("".join(f"KEY_{index}={key}\n" for index, key in enumerate(keys)))
+    assert list(dotenv_values(".env").values()) == keys
+
+# Test that tokens name their key, older keys verify until retired, and workers follow the file
+def test_key_rotation(tmp_path, monkeypatch):
+    path = str(tmp_path / "keys.json")
+    monkeypatch.setattr(key_management, "SIGNING_KEYS_FILE", path)
+    monkeypatch.setattr(key_management, "_keyring", None)
+    monkeypatch.setattr(key_management, "_keyring_stamp", None)
+
+    old_token = create_access_token({"sub": "someone"})
+    old_kid = jwt.get_unverified_header(old_token)["kid"]
+    assert old_kid == key_management.get_keyring().current
+
+    new_kid = key_management.rotate_signing_key(path)
+    new_token = create_access_token({"sub": "someone"})
+    assert jwt.get_unverified_header(new_token)["kid"] == new_kid != old_kid
+    assert decode_access_token(old_token)["sub"] == "someone"
+    assert decode_access_token(new_token)["sub"] == "someone"
+
+    # Keeping only the newest key retires the old one, even for cached tokens
+    key_management.rotate_signing_key(path, keep=1)
+    with pytest.raises(jwt.PyJWTError):
+        decode_access_token(old_token)
+    with pytest.raises(jwt.PyJWTError):
+        decode_access_token(new_token)
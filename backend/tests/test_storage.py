@@ -0,0 +1,223 @@
+#tests/test_storage.py
+import pytest
+import threading
+from app.storage.base import (
+    DocumentNotFound, MAX_TRANSACTION_ATTEMPTS, MAX_TRANSACTION_BACKOFF, PreconditionFailed, TransactionConflict
+)
+from app.storage import memory
+from app.storage.memory import MemoryStorage
+from app.storage.sqlite import SQLiteStorage
+
+# Run every test against each local backend
+@pytest.fixture(params=["memory", "sqlite"])
+def storage(request, tmp_path):
+    if request.param == "memory":
+        storage = MemoryStorage()
+    else:
+        storage = SQLiteStorage(str(tmp_path / "test.db"))
+    yield storage
+    storage.close()
+
+# Test basic document reads and writes
+def test_get_set_update_delete(storage):
+    items = storage.items
+    assert items.get("a") is None
+
+    items.set("a", {"id": "a", "user_id": "u1", "name": "Jacket", "color": "Blue"})
+    assert items.get("a") == {"id": "a", "user_id": "u1", "name": "Jacket", "color": "Blue"}
+
+    items.update("a", {"color": "Red"})
+    assert items.get("a")["color"] == "Red"
+
+    with pytest.raises(DocumentNotFound):
+        items.update("missing", {"color": "Red"})
+
+    items.delete("a")
+    assert items.get("a") is None
+
+# Test filtered, paged and projected queries
+def test_query(storage):
+    submissions = storage.submissions
+    for i in range(10):
+        submissions.set(f"s{i}", {"id": f"s{i}", "user_id": f"u{i % 2}", "item_id": f"i{i % 3}", "rating": i})
+
+    ids = [document["id"] for document in submissions.query({"user_id": "u0"})]
+    assert ids == ["s0", "s2", "s4", "s6", "s8"]
+
+    ids = [document["id"] for document in submissions.query({"user_id": "u0", "item_id": "i0"})]
+    assert ids == ["s0", "s6"]
+
+    page = list(submissions.query({"user_id": "u1"}, limit=2, start_after="s1"))
+    assert [document["id"] for document in page] == ["s3", "s5"]
+
+    projected = list(submissions.query({"user_id": "u1"}, limit=1, fields=["rating"]))
+    assert projected == [{"id": "s1", "rating": 1}]
+
+# Test multi-document reads and deletes
+def test_get_many_and_delete_many(storage):
+    users = storage.users
+    for name in ["a", "b", "c"]:
+        users.set(name, {"id": name, "username": name})
+
+    assert set(users.get_many(["a", "c", "missing"])) == {"a", "c"}
+
+    users.delete_many(["a", "b"])
+    assert [document["id"] for document in users.query()] == ["c"]
+
+# Test that writes conditional on a version fail once the document has changed
+def test_version_preconditions(storage):
+    items = storage.items
+    assert items.get_with_version("a") == (None, None)
+
+    items.set("a", {"id": "a", "user_id": "u1", "color": "Blue"})
+    document, version = items.get_with_version("a")
+    assert document["color"] == "Blue"
+
+    new_version = items.update("a", {"color": "Red"}, version=version)
+    assert new_version == items.get_with_version("a")[1] != version
+    with pytest.raises(PreconditionFailed):
+        items.update("a", {"color": "Green"}, version=version)
+    with pytest.raises(PreconditionFailed):
+        items.delete("a", version=version)
+    assert items.get("a")["color"] == "Red"
+
+    # A recreated document gets a new version too
+    _, version = items.get_with_version("a")
+    items.delete("a")
+    items.set("a", {"id": "a", "user_id": "u2", "color": "Red"})
+    with pytest.raises(PreconditionFailed):
+        items.delete("a", version=version)
+
+    _, version = items.get_with_version("a")
+    items.delete("a", version=version)
+    assert items.get("a") is None
+    with pytest.raises(PreconditionFailed):
+        items.update("a", {"color": "Red"}, version=version)
+
+# Test counters, created on first use
+def test_increment(storage):
+    versions = storage.versions
+    versions.increment("u1", "items")
+    versions.increment("u1", "items")
+    versions.increment("u1", "submissions", 5)
+    assert versions.get("u1") == {"id": "u1", "items": 2, "submissions": 5}
+
+# Test that a batch is applied atomically
+def test_batch(storage):
+    items = storage.items
+    items.set("a", {"id": "a", "color": "Blue"})
+
+    batch = storage.batch()
+    batch.set(items, "b", {"id": "b", "color": "Red"})
+    batch.update(items, "a", {"color": "Green"})
+    batch.commit()
+    assert items.get("a")["color"] == "Green"
+    assert items.get("b")["color"] == "Red"
+
+    # An update of a missing document fails the whole batch
+    batch = storage.batch()
+    batch.delete(items, "a")
+    batch.update(items, "missing", {"color": "Red"})
+    with pytest.raises(DocumentNotFound):
+        batch.commit()
+    assert items.get("a") is not None
+
+# Test that a transaction commits its writes, or none of them if it fails
+def test_transaction(storage):
+    items = storage.items
+    items.set("a", {"id": "a", "count": 1})
+
+    def increment(transaction):
+        document = transaction.get(items, "a")
+        transaction.update(items, "a", {"count": document["count"] + 1})
+        transaction.set(items, "b", {"id": "b"})
+        return document["count"]
+
+    assert storage.run_transaction(increment) == 1
+    assert items.get("a")["count"] == 2
+    assert items.get("b") is not None
+
+    def fail(transaction):
+        transaction.delete(items, "a")
+        raise ValueError("rolled back")
+
+    with pytest.raises(ValueError):
+        storage.run_transaction(fail)
+    assert items.get("a") is not None
+
+# Test that concurrent read-modify-write transactions do not lose updates
+def test_transaction_contention(storage):
+    counters = storage.repository("jobs")
+    counters.set("counter", {"id": "counter", "value": 0})
+
+    def increment(transaction):
+        document = transaction.get(counters, "counter")
+        transaction.update(counters, "counter", {"value": document["value"] + 1})
+
+    def worker():
+        for _ in range(10):
+            storage.run_transaction(increment)
+
+    threads = [threading.Thread(target=worker) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert counters.get("counter")["value"] == 20
+
+# Test that a transaction that keeps conflicting backs off between attempts, then gives up
+def test_transaction_conflict(monkeypatch):
+    storage = MemoryStorage()
+    items = storage.items
+    items.set("a", {"id": "a", "count": 0})
+    sleeps = []
+    monkeypatch.setattr(memory.time, "sleep", sleeps.append)
+
+    def conflicting(transaction):
+        document = transaction.get(items, "a")
+        items.update("a", {"count": document["count"] + 1})  # A concurrent write
+        transaction.update(items, "a", {"count": -1})
+
+    with pytest.raises(TransactionConflict):
+        storage.run_transaction(conflicting)
+    assert items.get("a")["count"] == MAX_TRANSACTION_ATTEMPTS
+    assert len(sleeps) == MAX_TRANSACTION_ATTEMPTS - 1
+    assert all(0 <= delay <= MAX_TRANSACTION_BACKOFF for delay in sleeps)
+
+# Test that each user's owned collection only holds that user's documents
+def test_owned_collections(storage):
+    u1, u2 = storage.owned("submissions", "u1"), storage.owned("submissions", "u2")
+    u1.set("s1", {"id": "s1", "item_id": "i1", "rating": 10})
+    u1.set("s2", {"id": "s2", "item_id": "i2", "rating": 20})
+    u2.set("s1", {"id": "s1", "item_id": "i1", "rating": 30})
+
+    assert u1.get("s1")["rating"] == 10
+    assert u2.get("s1")["rating"] == 30
+    assert u2.get("s2") is None
+    assert storage.submissions.get("s1") is None
+    assert [document["id"] for document in u1.query({"item_id": "i2"})] == ["s2"]
+    assert set(u1.get_many(["s1", "s2"])) == {"s1", "s2"}
+    assert set(storage.owners("submissions")) == {"u1", "u2"}
+
+    # Repositories are views: a new one sees the same documents
+    _, version = storage.owned("submissions", "u1").get_with_version("s2")
+    assert u1.update("s2", {"rating": 25}, version=version) != version
+    with pytest.raises(PreconditionFailed):
+        u1.delete("s2", version=version)
+
+    def move(transaction):
+        document = transaction.get(u1, "s2")
+        transaction.set(u2, "s2", document)
+        transaction.delete(u1, "s2")
+
+    storage.run_transaction(move)
+    assert u1.get("s2") is None
+    assert u2.get("s2")["rating"] == 25
+
+    batch = storage.batch()
+    batch.update(u2, "s2", {"rating": 5})
+    batch.delete(u1, "s1")
+    batch.commit()
+    assert [document["rating"] for document in u2.query()] == [30, 5]
+    assert list(u1.query()) == []
@@ -2,9 +2,10 @@ import uuid
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
-from app.database import db
+from app.database import get_storage
+from app.models import MAX_BATCH_OPERATIONS, MAX_SUBMISSION_BATCH_OPERATIONS
+from app.storage.base import TransactionConflict
 from typing import Optional
-import time
 
 client = TestClient(app)
 
@@ -57,29 +58,20 @@ def cleanup_user_and_items():
     # Cleanup after tests: Delete all items for the user
     for item_id in item_ids:
         client.delete(f"/items/{item_id}/", headers=headers)
-    
-    # Wait for Firestore to process the deletions (retry logic)
-    time.sleep(2)  # Increase delay to ensure Firestore processes the deletions
-
-    # Retry checking if no items remain
-    for _ in range(5):  # Retry up to 5 times
-        response = client.get("/items/", headers=headers)
-        if len(response.json()["items"]) == 0:
-            break
-        time.sleep(1)  # Wait for a second before retrying
 
     # Ensure no items remain
+    response = client.get("/items/", headers=headers)
     assert len(response.json()["items"]) == 0, "There are still items after cleanup."
 
     # Finally, delete the user
-    user_ref = db.collection("users").where("username", "==", user_data["username"]).stream()
-    user = next(user_ref, None)
+    storage = get_storage()
+    user = next(storage.users.query({"username": user_data["username"]}, limit=1), None)
     if user:
-        db.collection("users").document(user.id).delete()
+        storage.users.delete(user["id"])
 
     # Verify the user is deleted
-    user_ref_after_cleanup = db.collection("users").where("username", "==", user_data["username"]).stream()
-    assert next(user_ref_after_cleanup, None) is None, "The user was not deleted."
+    user_after_cleanup = storage.users.query({"username": user_data["username"]}, limit=1)
+    assert next(user_after_cleanup, None) is None, "The user was not deleted."
 
 # Test adding a submission
 def test_add_submission(cleanup_user_and_items):
@@ -99,6 +91,66 @@ def test_add_submission(cleanup_user_and_items):
     assert response.status_code == 200
     assert "id" in response.json()
 
+# Test that a user cannot rate another user's item, alone or in a batch
+def test_rate_other_users_item(cleanup_user_and_items):
+    user_data, headers, item_ids = cleanup_user_and_items
+    _, other_token = create_user_and_login()
+    other_headers = {"Authorization": f"Bearer {other_token}"}
+    count_before = client.get(f"/items/{item_ids[1]}/ratings", headers=headers).json()["count"]
+
+    submission_data = {"item_id": item_ids[1], "comment": "", "city": "Oslo", "country": "NO", "rating": 1}
+    response = client.post("/submissions/", json=submission_data, headers=other_headers)
+    assert response.status_code == 404
+
+    response = client.post("/submissions:batch", json={"operations": [
+        {"op": "create", "data": submission_data},
+        {"op": "create", "data": {**submission_data, "item_id": str(uuid.uuid4())}},
+    ]}, headers=other_headers)
+    assert [result["status"] for result in response.json()["results"]] == [404, 404]
+
+    assert client.get(f"/items/{item_ids[1]}/ratings", headers=headers).json()["count"] == count_before
+    assert client.get("/submissions/", headers=other_headers).json()["submissions"] == []
+
+# Test that a write still conflicting after every attempt is refused with 503 and Retry-After
+def test_transaction_conflict(cleanup_user_and_items, monkeypatch):
+    user_data, headers, item_ids = cleanup_user_and_items
+
+    def conflict(fn):
+        raise TransactionConflict("Transaction failed after 5 attempts")
+
+    monkeypatch.setattr(get_storage(), "run_transaction", conflict)
+    submission_data = {"item_id": item_ids[2], "comment": "", "city": "Oslo", "country": "NO", "rating": 50}
+    response = client.post("/submissions/", json=submission_data, headers=headers)
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+# Test that full batches fit in one commit with their rating writes, and larger ones are refused
+def test_full_batches():
+    _, token = create_user_and_login()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.post("/items:batch", json={"operations": [
+        {"op": "create", "data": generate_random_item()} for _ in range(MAX_BATCH_OPERATIONS)
+    ]}, headers=headers)
+    item_ids = [result["id"] for result in response.json()["results"]]
+    assert len(item_ids) == MAX_BATCH_OPERATIONS
+
+    # One submission per item: every one also writes a different rating shard
+    operations = [
+        {"op": "create", "data": {"item_id": item_id, "comment": "", "city": "Oslo", "country": "NO", "rating": 50}}
+        for item_id in item_ids[:MAX_SUBMISSION_BATCH_OPERATIONS]
+    ]
+    response = client.post("/submissions:batch", json={"operations": operations}, headers=headers)
+    assert [result["status"] for result in response.json()["results"]] == [201] * MAX_SUBMISSION_BATCH_OPERATIONS
+    operations.append(operations[0])
+    assert client.post("/submissions:batch", json={"operations": operations}, headers=headers).status_code == 422
+
+    # The deletion job removes them in pages that fit in one commit too
+    job_id = client.delete("/users/me/", headers=headers).json()["job_id"]
+    job = get_storage().jobs.get(job_id)
+    assert job["status"] == "done"
+    assert job["deleted"] == {"submissions": MAX_SUBMISSION_BATCH_OPERATIONS, "items": MAX_BATCH_OPERATIONS}
+
 # Test getting all submissions
 def test_get_submissions(cleanup_user_and_items):
     user_data, headers, item_ids = cleanup_user_and_items
@@ -156,6 +208,30 @@ def test_update_submission(cleanup_user_and_items):
     assert updated_submission["rating"] == 50
 
 
+# Test If-Match on submission updates, with and without a rating change
+def test_conditional_submission_update(cleanup_user_and_items):
+    user_data, headers, item_ids = cleanup_user_and_items
+
+    submission = {"item_id": item_ids[0], "comment": "abc", "city": "Oslo", "country": "NO", "rating": 40}
+    submission_id = client.post("/submissions/", json=submission, headers=headers).json()["id"]
+    etag = client.get(f"/submissions/{submission_id}", headers=headers).headers["etag"]
+
+    response = client.put(f"/submissions/{submission_id}/", json={"comment": "new"}, headers={**headers, "If-Match": etag})
+    assert response.status_code == 200
+    new_etag = response.headers["etag"]
+
+    # Both the plain and the rating (transactional) paths refuse the old version
+    for update in ({"comment": "stale"}, {"rating": 90}):
+        response = client.put(f"/submissions/{submission_id}/", json=update, headers={**headers, "If-Match": etag})
+        assert response.status_code == 412
+    assert client.delete(f"/submissions/{submission_id}/", headers={**headers, "If-Match": etag}).status_code == 412
+    stored = client.get(f"/submissions/{submission_id}", headers=headers).json()["submission"]
+    assert (stored["comment"], stored["rating"]) == ("new", 40)
+
+    response = client.put(f"/submissions/{submission_id}/", json={"rating": 90}, headers={**headers, "If-Match": new_etag})
+    assert response.status_code == 200
+    assert client.get(f"/items/{item_ids[0]}/ratings", headers=headers).json()["count"] >= 1
+
 # Test retrieving a specific submission
 def test_get_submission(cleanup_user_and_items):
     user_data, headers, item_ids = cleanup_user_and_items  # Fixture provides this automatically
@@ -186,6 +262,27 @@ def test_get_submission(cleanup_user_and_items):
     assert submission["country"] == submission_data["country"]
     assert submission["rating"] == submission_data["rating"]
 
+# Test reading several submissions by ID in one request
+def test_get_submissions_by_id(cleanup_user_and_items):
+    user_data, headers, item_ids = cleanup_user_and_items  # Fixture provides this automatically
+
+    submission_ids = []
+    for rating in (10, 20):
+        submission_data = {"item_id": item_ids[0], "comment": "", "city": "Oslo", "country": "NO", "rating": rating}
+        submission_ids.append(client.post("/submissions/", json=submission_data, headers=headers).json()["id"])
+
+    response = client.get("/submissions/", params={"ids": f"{submission_ids[0]},missing,{submission_ids[1]}"}, headers=headers)
+    assert response.status_code == 200
+    assert [submission["rating"] for submission in response.json()["submissions"]] == [10, 20]
+    assert response.json()["missing"] == ["missing"]
+
+    # An update that leaves the rating alone is a conditional write; it is still validated
+    response = client.put(f"/submissions/{submission_ids[0]}/", json={"comment": "Too warm"}, headers=headers)
+    assert response.status_code == 200
+    response = client.put(f"/submissions/{submission_ids[0]}/", json={"temperature": "hot"}, headers=headers)
+    assert response.status_code == 400
+    assert client.get(f"/submissions/{submission_ids[0]}", headers=headers).json()["submission"]["comment"] == "Too warm"
+
 
 
 # Test deleting a submission
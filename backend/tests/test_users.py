@@ -4,8 +4,10 @@ import pytest
 from fastapi.testclient import TestClient
 from app.main import app
 from app.users import delete_user
+from app.jobs import create_user_data_deletion_job, run_user_data_deletion_job
 from typing import Optional
-from app.database import db
+from app.database import get_storage
+import jwt
 
 client = TestClient(app)
 
@@ -23,10 +25,10 @@ invalid_user = {
 
 # Helper function to delete an existing user before registration
 def cleanup_existing_user(username: str):
-    user_ref = db.collection("users").where("username", "==", username).stream()
-    user = next(user_ref, None)
+    storage = get_storage()
+    user = next(storage.users.query({"username": username}, limit=1), None)
     if user:
-        db.collection("users").document(user.id).delete()
+        storage.users.delete(user["id"])
 
 # Cleanup function to delete valid user after tests
 @pytest.fixture(scope="module", autouse=True)
@@ -84,3 +86,159 @@ def test_delete_user():
     # Verify user is deleted
     response = client.get("/users/me/", headers=headers)
     assert response.status_code == 404  # User not found
+
+# Test that the token carries the user ID
+def test_token_contains_user_id():
+    response = client.post("/users/", json=valid_user)
+    user_id = response.json()["user_id"]
+    response = client.post("/tokens/", json=valid_user)  # Login
+    token = response.json()["access_token"]
+
+    payload = jwt.decode(token, options={"verify_signature": False})
+    assert payload["sub"] == valid_user["username"]
+    assert payload["uid"] == user_id
+
+    # Clean up the user
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.delete("/users/me/", headers=headers)
+    assert response.status_code == 200
+
+# Test that deleting a user removes their items and submissions
+def test_delete_user_removes_data():
+    user_data = {
+        "username": f"test_{uuid.uuid4().hex}",
+        "email": f"user_{uuid.uuid4().hex}@example.com",
+        "password": "TestPassword123"
+    }
+    user_id = client.post("/users/", json=user_data).json()["user_id"]
+    token = client.post("/tokens/", json=user_data).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    item_id = client.post("/items/", json={"name": "Jacket", "color": "Blue"}, headers=headers).json()["id"]
+    submission = {"item_id": item_id, "comment": "abc", "city": "London", "country": "UK", "rating": 90}
+    client.post("/submissions/", json=submission, headers=headers)
+
+    # The deletion job runs as a background task once the response is sent
+    response = client.delete("/users/me/", headers=headers)
+    assert response.status_code == 200
+    job_id = response.json()["job_id"]
+
+    storage = get_storage()
+    job = storage.jobs.get(job_id)
+    assert job["status"] == "done"
+    assert job["deleted"] == {"items": 1, "submissions": 1}
+    assert next(storage.items.query({"user_id": user_id}), None) is None
+    assert next(storage.submissions.query({"user_id": user_id}), None) is None
+
+# Test that a deletion job never deletes the data of a user that still exists
+def test_deletion_job_spares_existing_user():
+    user_data = {
+        "username": f"test_{uuid.uuid4().hex}",
+        "email": f"user_{uuid.uuid4().hex}@example.com",
+        "password": "TestPassword123"
+    }
+    user_id = client.post("/users/", json=user_data).json()["user_id"]
+    token = client.post("/tokens/", json=user_data).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    item_id = client.post("/items/", json={"name": "Jacket", "color": "Blue"}, headers=headers).json()["id"]
+
+    storage = get_storage()
+    job_id = storage.run_transaction(lambda transaction: create_user_data_deletion_job(transaction, user_id))
+    run_user_data_deletion_job(job_id)
+    assert storage.jobs.get(job_id)["status"] == "cancelled"
+    assert client.get(f"/items/{item_id}", headers=headers).status_code == 200
+
+    assert client.delete("/users/me/", headers=headers).status_code == 200
+
+# Test that refresh tokens renew the access token without a password hash, and rotate on use
+def test_refresh_token():
+    user_data = {
+        "username": f"test_{uuid.uuid4().hex}",
+        "email": f"user_{uuid.uuid4().hex}@example.com",
+        "password": "TestPassword123"
+    }
+    client.post("/users/", json=user_data)
+    tokens = client.post("/tokens/", json=user_data).json()
+    assert tokens["expires_in"] == 3600
+
+    response = client.post("/tokens/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 200
+    assert "hash" not in response.headers["server-timing"]
+    refreshed = response.json()
+    assert refreshed["refresh_token"] != tokens["refresh_token"]
+    headers = {"Authorization": f"Bearer {refreshed['access_token']}"}
+    assert client.get("/users/me/", headers=headers).json()["username"] == user_data["username"]
+
+    # Reusing a replaced token ends the session, so its successor stops working too
+    assert client.post("/tokens/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 403
+    assert client.post("/tokens/refresh", json={"refresh_token": refreshed["refresh_token"]}).status_code == 403
+    assert client.post("/tokens/refresh", json={"refresh_token": "not-a-token"}).status_code == 403
+
+    # Editing the profile with the same password keeps the sessions
+    refresh_token = client.post("/tokens/", json=user_data).json()["refresh_token"]
+    user_data["email"] = f"user_{uuid.uuid4().hex}@example.com"
+    assert client.put("/users/me/", json=user_data, headers=headers).status_code == 200
+    assert client.get("/users/me/", headers=headers).json()["email"] == user_data["email"]
+    refresh_token = client.post("/tokens/refresh", json={"refresh_token": refresh_token}).json()["refresh_token"]
+
+    # Changing the password ends every session
+    client.put("/users/me/", json={**user_data, "password": "NewPassword456"}, headers=headers)
+    assert client.post("/tokens/refresh", json={"refresh_token": refresh_token}).status_code == 403
+
+    client.delete("/users/me/", headers=headers)
+
+# Test that concurrent registrations of one username create a single user
+def test_concurrent_registration():
+    from concurrent.futures import ThreadPoolExecutor
+    user_data = {
+        "username": f"test_{uuid.uuid4().hex}",
+        "email": f"user_{uuid.uuid4().hex}@example.com",
+        "password": "TestPassword123"
+    }
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        statuses = sorted(pool.map(lambda _: client.post("/users/", json=user_data).status_code, range(4)))
+    assert statuses == [200, 400, 400, 400]
+    assert len(list(get_storage().users.query({"username": user_data["username"]}))) == 1
+
+    # Renaming releases the old username and claims the new one
+    token = client.post("/tokens/", json=user_data).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    renamed = {**user_data, "username": f"test_{uuid.uuid4().hex}"}
+    assert client.put("/users/me/", json=renamed, headers=headers).status_code == 200
+    assert client.post("/tokens/", json=user_data).status_code == 400
+    assert client.post("/tokens/", json=renamed).status_code == 200
+
+    client.delete("/users/me/", headers=headers)
+    assert get_storage().usernames.get(renamed["username"]) is None
+
+# Test that the backfill indexes users created before the username index
+def test_backfill_username_index(monkeypatch):
+    from app import usernames
+    from app.usernames import backfill_username_index
+    from app.user_cache import invalidate_user
+    storage = get_storage()
+    user_data = {
+        "username": f"test_{uuid.uuid4().hex}",
+        "email": f"user_{uuid.uuid4().hex}@example.com",
+        "password": "TestPassword123"
+    }
+    user_id = client.post("/users/", json=user_data).json()["user_id"]
+
+    # Before the backfill, a query finds the user, and indexes the name for the next lookup
+    storage.usernames.delete(user_data["username"])
+    assert client.post("/tokens/", json=user_data).status_code == 200
+    assert storage.usernames.get(user_data["username"]) == {"id": user_data["username"], "user_id": user_id}
+    storage.usernames.delete(user_data["username"])
+    assert client.post("/users/", json=user_data).status_code == 400
+
+    # Without the fallback, only indexed users are found
+    storage.usernames.delete(user_data["username"])
+    monkeypatch.setattr(usernames, "USERNAME_QUERY_FALLBACK", False)
+    invalidate_user(user_id)
+    assert client.post("/tokens/", json=user_data).status_code == 400
+
+    counts = backfill_username_index()
+    assert counts["created"] >= 1
+    assert backfill_username_index()["created"] == 0
+    token = client.post("/tokens/", json=user_data).json()["access_token"]
+    client.delete("/users/me/", headers={"Authorization": f"Bearer {token}"})
@@ -0,0 +1,72 @@
+#tests/test_versions.py
+import uuid
+from fastapi.testclient import TestClient
+from app.main import app
+from app.versions import etag_matches
+
+client = TestClient(app)
+
+
+def create_user_and_login():
+    user_data = {
+        "username": f"test_user_{uuid.uuid4().hex}",
+        "email": f"user_{uuid.uuid4().hex}@example.com",
+        "password": "TestPassword123"
+    }
+    client.post("/users/", json=user_data)
+    response = client.post("/tokens/", json={"username": user_data["username"], "password": user_data["password"]})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+# Test that list responses are revalidated with ETags and every write changes them
+def test_conditional_list_requests():
+    headers = create_user_and_login()
+    item_id = client.post("/items/", json={"name": "Jacket", "color": "Blue"}, headers=headers).json()["id"]
+
+    response = client.get("/items/", headers=headers)
+    etag = response.headers["etag"]
+    assert etag.startswith('W/"')
+    assert response.headers["cache-control"] == "private, no-cache"
+
+    # An unchanged collection is answered with an empty 304
+    response = client.get("/items/", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+    # Other pages and other users have their own tags
+    assert client.get("/items/", params={"fields": "name"}, headers=headers).headers["etag"] != etag
+    other_headers = create_user_and_login()
+    assert client.get("/items/", headers={**other_headers, "If-None-Match": etag}).status_code == 200
+
+    # Every write path moves the version on
+    writes = [
+        lambda: client.put(f"/items/{item_id}/", json={"color": "Red"}, headers=headers),
+        lambda: client.post("/items:batch", json={"operations": [{"op": "create", "data": {"name": "Hat", "color": "Red"}}]}, headers=headers),
+        lambda: client.delete(f"/items/{item_id}/", headers=headers),
+    ]
+    for write in writes:
+        assert write().status_code == 200
+        response = client.get("/items/", headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 200
+        etag = response.headers["etag"]
+
+    # Submissions are versioned separately from items
+    response = client.get("/submissions/", headers=headers)
+    submissions_etag = response.headers["etag"]
+    item_id = client.post("/items/", json={"name": "Scarf", "color": "Grey"}, headers=headers).json()["id"]
+    assert client.get("/submissions/", headers={**headers, "If-None-Match": submissions_etag}).status_code == 304
+    submission = {"item_id": item_id, "comment": "", "city": "Oslo", "country": "NO", "rating": 50}
+    client.post("/submissions/", json=submission, headers=headers)
+    assert client.get("/submissions/", headers={**headers, "If-None-Match": submissions_etag}).status_code == 200
+
+    client.delete("/users/me/", headers=headers)
+    client.delete("/users/me/", headers=other_headers)
+
+# Test If-None-Match parsing
+def test_etag_matches():
+    assert etag_matches('W/"abc"', 'W/"abc"')
+    assert etag_matches('"abc"', 'W/"abc"')
+    assert etag_matches('"x", W/"abc"', 'W/"abc"')
+    assert etag_matches("*", 'W/"abc"')
+    assert not etag_matches('W/"abd"', 'W/"abc"')
+    assert not etag_matches(None, 'W/"abc"')
@@ -0,0 +1,88 @@
+#tests/test_weather.py
+import threading
+import uuid
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.weather import FileWeatherProvider, WeatherProvider, WeatherUnavailable, get_weather, set_provider
+
+client = TestClient(app)
+
+WEATHER = {
+    "London,UK": {"condition": "rain", "temperature": 11.5},
+    "Lisbon,PT": {"condition": "clear", "temperature": 24.0},
+}
+
+
+@pytest.fixture
+def provider():
+    provider = FileWeatherProvider(data=WEATHER, latency=0.05)
+    set_provider(provider)
+    yield provider
+    set_provider(None)
+
+# Test that places are cached under their normalized name
+def test_weather_cache(provider):
+    assert get_weather("London", "UK") == {"condition": "rain", "temperature": 11.5}
+    assert get_weather(" london", "uk ") == {"condition": "rain", "temperature": 11.5}
+    assert get_weather("Atlantis", "XX") is None
+    assert get_weather("Atlantis", "XX") is None
+    assert provider.fetches == 2
+
+# Test that concurrent requests for a place share one upstream fetch
+def test_weather_request_coalescing(provider):
+    results = []
+
+    def request(city, country):
+        results.append(get_weather(city, country))
+
+    threads = [threading.Thread(target=request, args=place) for place in [("London", "UK"), ("Lisbon", "PT")] * 20]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 40
+    assert provider.fetches == 2
+
+# Test that a failed fetch is reported to every waiter and not cached
+def test_weather_errors_not_cached():
+    class FlakyProvider(WeatherProvider):
+        def __init__(self):
+            self.calls = 0
+
+        def fetch(self, city, country):
+            self.calls += 1
+            if self.calls == 1:
+                raise WeatherUnavailable("upstream timeout")
+            return {"condition": "clear", "temperature": 20.0}
+
+    set_provider(FlakyProvider())
+    try:
+        with pytest.raises(WeatherUnavailable):
+            get_weather("Paris", "FR")
+        assert get_weather("Paris", "FR")["condition"] == "clear"
+    finally:
+        set_provider(None)
+
+# Test the weather endpoint and that recommendations default to the current weather
+def test_weather_endpoints(provider):
+    user_data = {
+        "username": f"test_user_{uuid.uuid4().hex}",
+        "email": f"user_{uuid.uuid4().hex}@example.com",
+        "password": "TestPassword123"
+    }
+    client.post("/users/", json=user_data)
+    token = client.post("/tokens/", json={"username": user_data["username"], "password": user_data["password"]}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.get("/weather/", params={"city": "Lisbon", "country": "PT"}, headers=headers)
+    assert response.json() == {"condition": "clear", "temperature": 24.0}
+    response = client.get("/weather/", params={"city": "Atlantis", "country": "XX"}, headers=headers)
+    assert response.status_code == 404
+
+    response = client.get("/recommendations/", params={"city": "London", "country": "UK"}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["weather"] == {"condition": "rain", "temperature": 11.5}
+
+    client.delete("/users/me/", headers=headers)